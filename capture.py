@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Capture of the raw UDP frames between the plugin and the inverters, and replay of a capture without any network.
+#
+# With the capture option the poller records every frame the goodwe protocol layer sends or receives, including the
+# retries, invalid and rejected responses and the frames of the connect and family detection, plus a mark at the
+# start of every poll. The capture file is append-only, a restart of the plugin adds a new session to it:
+#   MAGIC, then records of RECORD (Unix time, kind, host index, payload length) and the payload:
+#   - START: a new session, the payload is JSON with the plugin parameters (Address, Mode2, Mode3, Mode6) and the
+#            inverter_cache.json entries of the inverters at the start (cache)
+#   - HOST:  the host of the next host index of the session, the payload is its name as configured in the plugin
+#   - POLL:  the start of a poll of the host, no payload
+#   - SEND:  a frame sent to the host
+#   - RECV:  a frame received from the host
+#
+# Replayer puts a capture back in place of the network: a request answers with the frames that followed the same
+# request in the capture, after the same delay, or not at all when the inverter did not answer then. The goodwe
+# protocol code itself (validation, retries, decoding) runs as it did. tester/replay_plugin.py drives BasePlugin with
+# it, at the recorded pace or as fast as possible.
+#
+# Usage: python capture.py info FILE
+
+import argparse
+import asyncio
+import collections
+import contextvars
+import json
+import os
+import struct
+import sys
+import time
+import weakref
+
+import goodwe.exceptions
+import goodwe.protocol
+
+MAGIC = b"GWCAP001"
+RECORD = struct.Struct("<dBBH") # Unix time, kind, host index, payload length
+START, HOST, POLL, SEND, RECV = range(5)
+KINDS = ("start", "host", "poll", "send", "recv")
+
+class CaptureError(Exception):
+    pass
+
+class CaptureWriter:
+    # Appends the records of one session to a capture file. Only used from the poller thread.
+
+    def __init__(self, path, parameters):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    raise CaptureError(f"{path} is not a capture file")
+        self.path = path
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(MAGIC)
+        self.hosts = {} # host -> index in this session
+        self.records = 0
+        self.write(START, None, json.dumps(parameters).encode("utf-8"))
+
+    def write(self, kind, host, payload=b""):
+        index = 0
+        if host != None:
+            index = self.hosts.get(host)
+            if index == None:
+                if len(self.hosts) > 255:
+                    return
+                index = self.hosts[host] = len(self.hosts)
+                self.file.write(RECORD.pack(time.time(), HOST, index, len(host.encode("utf-8"))) + host.encode("utf-8"))
+        self.file.write(RECORD.pack(time.time(), kind, index, len(payload)) + payload)
+        self.records += 1
+
+    # The start of a poll, the frames so far are written to the file.
+    def poll(self, host):
+        self.write(POLL, host)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class CaptureRecorder:
+    # Records the frames of all goodwe requests of the process with a CaptureWriter, by wrapping the methods of
+    # goodwe.protocol.UdpInverterProtocol which send and receive them. The frames are recorded under the host the
+    # request was made to, not the address it resolved to, so a replay finds them under the configured host.
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.installed = None
+
+    def install(self):
+        protocolClass = goodwe.protocol.UdpInverterProtocol
+        execute, send, receive = goodwe.protocol.ProtocolCommand.execute, protocolClass._send_request, protocolClass.datagram_received
+        writer = self.writer
+        requestHost = contextvars.ContextVar("requestHost", default=None) # host of the running ProtocolCommand.execute()
+        hosts = weakref.WeakKeyDictionary() # UdpInverterProtocol -> host of its request
+
+        async def recordingExecute(command, host, timeout, retries):
+            token = requestHost.set(host)
+            try:
+                return await execute(command, host, timeout, retries)
+            finally:
+                requestHost.reset(token)
+
+        # The host of the request of protocol, as passed to execute(). The peer address when it was not seen.
+        def protocolHost(protocol, addr=None):
+            host = hosts.get(protocol)
+            if host == None:
+                host = requestHost.get()
+                if host == None:
+                    peer = addr or (protocol._transport.get_extra_info("peername") if protocol._transport else None)
+                    host = peer[0] if peer else ""
+                hosts[protocol] = host
+            return host
+
+        def recordingSend(protocol):
+            writer.write(SEND, protocolHost(protocol), protocol.command.request)
+            send(protocol)
+
+        def recordingReceive(protocol, data, addr):
+            writer.write(RECV, protocolHost(protocol, addr), data)
+            receive(protocol, data, addr)
+
+        goodwe.protocol.ProtocolCommand.execute = recordingExecute
+        protocolClass._send_request, protocolClass.datagram_received = recordingSend, recordingReceive
+        self.installed = (execute, send, receive)
+
+    def close(self):
+        if self.installed:
+            goodwe.protocol.ProtocolCommand.execute, goodwe.protocol.UdpInverterProtocol._send_request, goodwe.protocol.UdpInverterProtocol.datagram_received = self.installed
+            self.installed = None
+        self.writer.close()
+
+# The records of a capture file: (Unix time, kind, host, payload) tuples, with the host name instead of its index.
+def readCapture(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise CaptureError(f"{path} is not a capture file")
+    records = []
+    hosts = {}
+    position = len(MAGIC)
+    while position + RECORD.size <= len(data):
+        timestamp, kind, index, length = RECORD.unpack_from(data, position)
+        position += RECORD.size
+        payload = data[position:position + length]
+        position += length
+        if len(payload) < length:
+            break # the last record of a session which was cut off
+        if kind == START:
+            hosts = {}
+        elif kind == HOST:
+            hosts[index] = payload.decode("utf-8")
+            continue
+        records.append((timestamp, kind, hosts.get(index, "") if kind != START else None, payload))
+    return records
+
+# The sessions of a capture: lists of records, each starting with its START record.
+def captureSessions(records):
+    sessions = []
+    for record in records:
+        if record[1] == START or not sessions:
+            sessions.append([])
+        sessions[-1].append(record)
+    return sessions
+
+class ReplayTransport:
+    # Takes the place of the datagram transport of goodwe.protocol.UdpInverterProtocol: the answer to a sent request
+    # is the next recorded answer to the same request.
+
+    def __init__(self, replayer, host, protocol):
+        self.replayer = replayer
+        self.host = host
+        self.protocol = protocol
+        self.closed = False
+
+    def sendto(self, data, addr=None):
+        self.replayer.sent += 1
+        loop = asyncio.get_running_loop()
+        for delay, frame in self.replayer.answer(self.host, bytes(data)):
+            loop.call_later(delay, self.receive, frame)
+
+    def receive(self, frame):
+        if not self.closed and not self.protocol.response_future.done():
+            self.replayer.received += 1
+            self.protocol.datagram_received(frame, (self.host, goodwe.protocol.GOODWE_UDP_PORT))
+
+    def get_extra_info(self, name, default=None):
+        return (self.host, goodwe.protocol.GOODWE_UDP_PORT) if name == "peername" else default
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+class Replayer:
+    # Replays the frames of capture records through goodwe, see the top of this module. speed divides the recorded
+    # delays and the timeouts of goodwe, 0 answers at once and does not wait for a timeout.
+
+    def __init__(self, records, speed=1.0):
+        self.speed = speed
+        self.answers = collections.defaultdict(collections.deque) # (host, request) -> deque of [(delay, frame)] per send
+        self.polls = collections.defaultdict(list) # host -> Unix times of the polls
+        self.sent = 0
+        self.received = 0
+        self.unanswered = 0 # requests that were not sent in the capture, or more often than in the capture
+        self.installed = None
+        last = {} # host -> (time, list of the frames) of the last sent request
+        for timestamp, kind, host, payload in records:
+            if kind == SEND:
+                frames = []
+                self.answers[(host, payload)].append(frames)
+                last[host] = (timestamp, frames)
+            elif kind == RECV and host in last:
+                sentAt, frames = last[host]
+                frames.append((timestamp - sentAt, payload))
+            elif kind == POLL:
+                self.polls[host].append(timestamp)
+            elif kind == START:
+                last = {}
+
+    # The (delay, frame) answers to a request, with the delays at the replay speed.
+    def answer(self, host, request):
+        answers = self.answers.get((host, request))
+        if not answers:
+            self.unanswered += 1
+            return []
+        frames = answers.popleft()
+        return [(delay / self.speed if self.speed else 0, frame) for delay, frame in frames]
+
+    # Replace the UDP requests of goodwe by the replay.
+    def install(self):
+        replayer = self
+        async def execute(command, host, timeout, retries):
+            # As goodwe.protocol.ProtocolCommand.execute(), with a ReplayTransport instead of a datagram endpoint.
+            future = asyncio.get_running_loop().create_future()
+            protocol = goodwe.protocol.UdpInverterProtocol(future, command, timeout / replayer.speed if replayer.speed else 0, retries)
+            transport = ReplayTransport(replayer, host, protocol)
+            protocol.connection_made(transport)
+            try:
+                await future
+                result = future.result()
+                if result is not None:
+                    return result
+                raise goodwe.exceptions.RequestFailedException(f"No response received to '{command.request.hex()}' request.")
+            except asyncio.CancelledError:
+                raise goodwe.exceptions.RequestFailedException(f"No valid response received to '{command.request.hex()}' request.") from None
+            finally:
+                transport.close()
+        self.installed = goodwe.protocol.ProtocolCommand.execute
+        goodwe.protocol.ProtocolCommand.execute = execute
+
+    def close(self):
+        if self.installed:
+            goodwe.protocol.ProtocolCommand.execute = self.installed
+            self.installed = None
+
+def info(path):
+    records = readCapture(path)
+    print(f"{path}: {os.path.getsize(path)} bytes, {len(records)} records")
+    for number, session in enumerate(captureSessions(records), 1):
+        start = session[0]
+        parameters = json.loads(start[3]) if start[1] == START else {}
+        cache = parameters.pop("cache", {})
+        counts = collections.Counter((host, KINDS[kind]) for _, kind, host, _ in session if kind != START)
+        print(f"session {number}: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start[0]))} - "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(session[-1][0]))}, parameters {parameters}")
+        for host in sorted({host for host, _ in counts}):
+            family = cache.get(host, {}).get("family") or "detected"
+            print(f"  {host}: family {family}, {counts[(host, 'poll')]} polls, {counts[(host, 'send')]} frames sent, {counts[(host, 'recv')]} received")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a capture file of the plugin.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    infoParser = subparsers.add_parser("info", help="show the sessions, hosts and frame counts")
+    infoParser.add_argument("file")
+    args = parser.parse_args()
+    try:
+        info(args.file)
+    except (OSError, CaptureError) as e:
+        sys.exit(str(e))
+
+if __name__ == "__main__":
+    main()
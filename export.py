@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Export of the inverter values to a time series database, in the InfluxDB line protocol.
+#
+# The poller thread hands every poll to LineProtocolExporter.add(), which formats one line and puts it in a bounded
+# queue. A thread of the exporter sends the lines in batches, when batchSize lines are waiting or flushInterval seconds
+# have passed, to one of the sinks:
+# - file:///var/log/goodwe.lp or file:goodwe.lp          appended to a file, relative to the Domoticz home folder
+# - unix:///run/telegraf.sock                            a Unix stream socket, e.g. the socket_listener of Telegraf
+# - unixgram:///run/telegraf.sock                        a Unix datagram socket
+# - http://127.0.0.1:8086/write?db=solar                 POSTed to an HTTP endpoint, e.g. InfluxDB or Telegraf http_listener_v2
+# When the sink is slow or down the queue fills up and the oldest lines are dropped, add() never waits for the sink.
+#
+# tester/export_listener.py is a stand-in listener for all sinks.
+
+import collections
+import http.client
+import os
+import socket
+import threading
+import time
+import urllib.parse
+
+# Largest datagram sent to a unixgram sink, a batch is split over several datagrams.
+DATAGRAM_SIZE = 16384
+
+def escapeKey(text):
+    return str(text).replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def escapeString(text):
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+# One line of line protocol: measurement,tags fields timestamp. Numbers are always written as floats, so a field has
+# the same type whether the inverter reports 5 or 5.1. None when there are no fields.
+def formatLine(measurement, tags, values, timestamp):
+    fields = []
+    for name, value in values.items():
+        if isinstance(value, bool):
+            fields.append(f"{escapeKey(name)}={'true' if value else 'false'}")
+        elif isinstance(value, (int, float)):
+            if value == value and abs(value) != float("inf"):
+                fields.append(f"{escapeKey(name)}={float(value)!r}")
+        elif isinstance(value, str):
+            fields.append(f"{escapeKey(name)}={escapeString(value)}")
+    if not fields:
+        return None
+    key = escapeKey(measurement) + "".join(f",{escapeKey(tag)}={escapeKey(value)}" for tag, value in sorted(tags.items()) if value not in (None, ""))
+    return f"{key} {','.join(fields)} {timestamp}"
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, data):
+        with open(self.path, "ab") as file:
+            file.write(data)
+
+    def close(self):
+        pass
+
+class UnixSink:
+    def __init__(self, path, datagram=False):
+        self.path = path
+        self.datagram = datagram
+        self.socket = None
+
+    def send(self, data):
+        if self.socket == None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM if self.datagram else socket.SOCK_STREAM)
+            self.socket.settimeout(5)
+            try:
+                self.socket.connect(self.path)
+            except OSError:
+                self.close()
+                raise
+        try:
+            if self.datagram:
+                # Split on line ends, a line is never split over two datagrams.
+                while data:
+                    end = len(data)
+                    if end > DATAGRAM_SIZE:
+                        end = data.rfind(b"\n", 0, DATAGRAM_SIZE) + 1 or end
+                    self.socket.send(data[:end])
+                    data = data[end:]
+            else:
+                self.socket.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+class HttpSink:
+    def __init__(self, url):
+        self.url = url
+        self.connection = None
+
+    def send(self, data):
+        if self.connection == None:
+            self.connection = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=5)
+        try:
+            self.connection.request("POST", (self.url.path or "/") + ("?" + self.url.query if self.url.query else ""), body=data,
+                headers={"Content-Type": "text/plain; charset=utf-8"})
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.status >= 300:
+            raise OSError(f"HTTP {response.status} {response.reason}")
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+# The sink for a target URL, see the top of this module. Relative file names are relative to folder.
+def openSink(target, folder=""):
+    url = urllib.parse.urlsplit(target)
+    if url.scheme == "file" or url.scheme == "":
+        return FileSink(os.path.join(folder, url.netloc + url.path))
+    if url.scheme in ("unix", "unixgram"):
+        return UnixSink(url.netloc + url.path, datagram=url.scheme == "unixgram")
+    if url.scheme == "http":
+        return HttpSink(url)
+    raise ValueError(f"Unknown export target {target}, use file:, unix:, unixgram: or http:")
+
+class LineProtocolExporter:
+    # Batches lines in a bounded queue and sends them to the sink from its own thread.
+
+    def __init__(self, sink, measurement="goodwe", batchSize=500, flushInterval=10, queueSize=10000, retryDelay=30, log=print, error=print):
+        self.sink = sink
+        self.measurement = measurement
+        self.batchSize = max(1, batchSize)
+        self.flushInterval = flushInterval
+        self.retryDelay = retryDelay
+        self.log = log # function to report a recovery with, called from the exporter thread
+        self.error = error # function to report errors with, called from the exporter thread
+        self.lines = collections.deque(maxlen=max(1, queueSize))
+        self.condition = threading.Condition()
+        self.sent = 0 # lines sent
+        self.dropped = 0 # lines dropped because the queue was full
+        self.failing = False # the last send failed
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="GoodWeExporter", daemon=True)
+        self._thread.start()
+
+    # Queue the values of one poll, timestamp is a Unix time in seconds. Never blocks on the sink.
+    def add(self, tags, values, timestamp):
+        line = formatLine(self.measurement, tags, values, int(timestamp * 1e9))
+        if line == None:
+            return
+        with self.condition:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1 # the deque drops the oldest line
+            self.lines.append(line)
+            if len(self.lines) >= self.batchSize:
+                self.condition.notify()
+
+    # Stop the thread after sending what is queued, waiting at most timeout seconds for the sink.
+    def close(self, timeout=5):
+        with self.condition:
+            self._stopping = True
+            self.condition.notify()
+        self._thread.join(timeout)
+        self.sink.close()
+
+    def _take(self):
+        count = min(self.batchSize, len(self.lines))
+        return [self.lines.popleft() for _ in range(count)]
+
+    # Put a batch that could not be sent back in front of the queue, without pushing out newer lines.
+    def _putBack(self, batch):
+        room = self.lines.maxlen - len(self.lines)
+        if room < len(batch):
+            self.dropped += len(batch) - room
+            batch = batch[len(batch) - room:]
+        self.lines.extendleft(reversed(batch))
+
+    def _run(self):
+        flushAt = time.monotonic() + self.flushInterval
+        retryAt = None # time.monotonic() of the next attempt after a failed send
+        while True:
+            with self.condition:
+                if retryAt != None:
+                    # However many lines are waiting, only close() ends the wait for the retry early.
+                    while not self._stopping and time.monotonic() < retryAt:
+                        self.condition.wait(retryAt - time.monotonic())
+                else:
+                    while not self._stopping and len(self.lines) < self.batchSize and time.monotonic() < flushAt:
+                        self.condition.wait(flushAt - time.monotonic())
+                stopping = self._stopping
+                batch = self._take()
+            if batch:
+                try:
+                    self.sink.send(("\n".join(batch) + "\n").encode("utf-8"))
+                except Exception as e:
+                    with self.condition:
+                        self._putBack(batch)
+                    if not self.failing:
+                        self.error(f"Cannot export to {self.describe()}, retrying every {self.retryDelay} sec.: {e}")
+                        self.failing = True
+                    if stopping:
+                        return
+                    retryAt = time.monotonic() + self.retryDelay
+                    continue
+                retryAt = None
+                self.sent += len(batch)
+                if self.failing:
+                    self.log(f"Exporting to {self.describe()} again, {self.dropped} lines dropped so far")
+                    self.failing = False
+            if stopping and not self.lines:
+                return
+            if len(self.lines) < self.batchSize:
+                flushAt = time.monotonic() + self.flushInterval
+
+    def describe(self):
+        sink = self.sink
+        if isinstance(sink, HttpSink):
+            return urllib.parse.urlunsplit(sink.url)
+        return sink.path
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# High resolution history of the inverter values, next to the 5 minute short log of Domoticz.
+#
+# The history file holds fixed size rings of rows, one ring per tier:
+# - "1s":    the values of every poll, one float32 per column
+# - "1min":  min, avg and max of every column per minute
+# - "15min": min, avg and max of every column per 15 minutes
+# Every row starts with the Unix time (uint32) of the poll or the start of the minute or quarter. Missing and
+# non-numeric values are stored as NaN, as are the values a poll did not read (the Normal and Slow values on the polls
+# of the Fast values only): they do not count in the min, avg and max.
+# The file is memory mapped and created at its full size, so an append is a struct.pack_into() in the ring of every tier
+# that completed a row, and the memory use and write cost per poll do not depend on the retention.
+#
+# A downsampled row is written when the first poll of the next minute or quarter comes in.
+#
+# The file starts with a header: the format, the column names and per tier its ring position. Only the header and the
+# rows of the requested time range are read by a query, never the whole file.
+#
+# Usage: python history.py info FILE
+#        python history.py export FILE [--tier 1min] [--start "2026-06-21 10:00"] [--end ...] [--columns ppv,...]
+#                                      [--format csv|npy] [--output FILE]
+
+import argparse
+import datetime
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"GWHIST01"
+HEADER = struct.Struct("<8sIII") # magic, column count, tier count, size of the header
+TIER = struct.Struct("<8sIIIQII") # name, seconds per row (0 for every poll), capacity, row size, offset, head, count
+TIER_HEAD = struct.Struct("<II") # head, count: the part of TIER which changes
+PAGE = 4096
+
+# The tiers: (name, seconds per row). Rows of the "1s" tier are the polls themselves.
+TIERS = (("1s", 0), ("1min", 60), ("15min", 900))
+
+# Default retention of each tier in seconds.
+RETENTION = {"1s": 86400, "1min": 7 * 86400, "15min": 366 * 86400}
+
+NAN = float("nan")
+
+class HistoryError(Exception):
+    pass
+
+class Tier:
+    # The position of one tier in the file and its row format.
+    __slots__ = ("index", "name", "seconds", "capacity", "rowSize", "offset", "head", "count", "row", "columns")
+
+    def __init__(self, index, name, seconds, capacity, columnCount, offset=0, head=0, count=0):
+        self.index = index
+        self.name = name
+        self.seconds = seconds
+        self.capacity = capacity
+        # min, avg and max per column for the downsampled tiers
+        self.columns = columnCount if seconds == 0 else 3 * columnCount
+        self.row = struct.Struct(f"<I{self.columns}f")
+        self.rowSize = self.row.size
+        self.offset = offset
+        self.head = head # physical index of the next row to write
+        self.count = count # number of rows in the ring
+
+    # Physical index of logical row i, 0 is the oldest row in the ring.
+    def physical(self, i):
+        return (self.head - self.count + i) % self.capacity
+
+    def position(self, i):
+        return self.offset + self.physical(i) * self.rowSize
+
+class Accumulator:
+    # min, sum, max and the number of values per column of the row in progress of a downsampled tier.
+    __slots__ = ("start", "mins", "maxs", "sums", "counts")
+
+    def __init__(self, columnCount):
+        self.start = None
+        self.mins = [math.inf] * columnCount
+        self.maxs = [-math.inf] * columnCount
+        self.sums = [0.0] * columnCount
+        self.counts = [0] * columnCount
+
+    def add(self, values):
+        mins, maxs, sums, counts = self.mins, self.maxs, self.sums, self.counts
+        for i, value in enumerate(values):
+            if value == value: # not NaN
+                if value < mins[i]:
+                    mins[i] = value
+                if value > maxs[i]:
+                    maxs[i] = value
+                sums[i] += value
+                counts[i] += 1
+
+    # The min, avg and max per column, then start over.
+    def take(self):
+        row = []
+        for i, count in enumerate(self.counts):
+            if count:
+                row += (self.mins[i], self.sums[i] / count, self.maxs[i])
+            else:
+                row += (NAN, NAN, NAN)
+            self.mins[i] = math.inf
+            self.maxs[i] = -math.inf
+            self.sums[i] = 0.0
+            self.counts[i] = 0
+        return row
+
+class HistoryFile:
+    # The memory mapped history file, see the top of this module.
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self.file = open(path, "r+b" if writable else "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise HistoryError(f"{path} is empty")
+        magic, columnCount, tierCount, headerSize = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise HistoryError(f"{path} is not a history file")
+        self.tiers = []
+        for index in range(tierCount):
+            name, seconds, capacity, rowSize, offset, head, count = TIER.unpack_from(self.map, HEADER.size + index * TIER.size)
+            self.tiers.append(Tier(index, name.rstrip(b"\0").decode("ascii"), seconds, capacity, columnCount, offset, head, count))
+        namesOffset = HEADER.size + tierCount * TIER.size
+        namesLength = struct.unpack_from("<I", self.map, namesOffset)[0]
+        self.columns = json.loads(bytes(self.map[namesOffset + 4:namesOffset + 4 + namesLength]))
+
+    # Create a new history file for columns, with capacities in rows per tier name.
+    @staticmethod
+    def create(path, columns, capacities):
+        tiers = [Tier(index, name, seconds, max(1, capacities[name]), len(columns)) for index, (name, seconds) in enumerate(TIERS)]
+        names = json.dumps(list(columns)).encode("utf-8")
+        headerSize = HEADER.size + len(tiers) * TIER.size + 4 + len(names)
+        offset = (headerSize + PAGE - 1) // PAGE * PAGE
+        for tier in tiers:
+            tier.offset = offset
+            offset += (tier.capacity * tier.rowSize + PAGE - 1) // PAGE * PAGE
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(columns), len(tiers), headerSize))
+            for tier in tiers:
+                file.write(TIER.pack(tier.name.encode("ascii"), tier.seconds, tier.capacity, tier.rowSize, tier.offset, 0, 0))
+            file.write(struct.pack("<I", len(names)) + names)
+            # A sparse file, the disk space is used as the rings fill up.
+            file.truncate(offset)
+        os.replace(tmpPath, path)
+
+    def tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise HistoryError(f"Unknown tier {name}, the tiers are: {', '.join(tier.name for tier in self.tiers)}")
+
+    # Reread the ring positions, which the writer changes.
+    def refresh(self):
+        for tier in self.tiers:
+            tier.head, tier.count = TIER_HEAD.unpack_from(self.map, HEADER.size + tier.index * TIER.size + TIER.size - TIER_HEAD.size)
+
+    def writeRow(self, tier, values):
+        tier.row.pack_into(self.map, tier.offset + tier.head * tier.rowSize, *values)
+        tier.head = (tier.head + 1) % tier.capacity
+        tier.count = min(tier.count + 1, tier.capacity)
+        TIER_HEAD.pack_into(self.map, HEADER.size + tier.index * TIER.size + TIER.size - TIER_HEAD.size, tier.head, tier.count)
+
+    def timestamp(self, tier, i):
+        return struct.unpack_from("<I", self.map, tier.position(i))[0]
+
+    # The logical index of the first row at or after timestamp. The rows are in time order.
+    def search(self, tier, timestamp):
+        low, high = 0, tier.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(tier, middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # The (timestamp, values) rows of tier in [start, end), Unix times, None for no limit.
+    def rows(self, tier, start=None, end=None):
+        self.refresh()
+        first = self.search(tier, start) if start != None else 0
+        last = self.search(tier, end) if end != None else tier.count
+        for i in range(first, last):
+            row = tier.row.unpack_from(self.map, tier.position(i))
+            yield row[0], row[1:]
+
+    # The names of the values of a row of tier.
+    def valueNames(self, tier):
+        if tier.seconds == 0:
+            return list(self.columns)
+        return [f"{column}_{statistic}" for column in self.columns for statistic in ("min", "avg", "max")]
+
+    def close(self):
+        if getattr(self, "map", None) != None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+class HistoryStore:
+    # Appends the values of every poll of one inverter to a history file. Only used from the poller thread.
+
+    def __init__(self, path, columns, interval=1, retention=None):
+        self.columns = tuple(columns)
+        retention = dict(RETENTION, **(retention or {}))
+        capacities = {name: retention[name] // max(1, seconds or interval) for name, seconds in TIERS}
+        self.history = None
+        try:
+            self.history = HistoryFile(path, writable=True)
+            if self.history.columns != list(self.columns) or any(tier.capacity != capacities[tier.name] for tier in self.history.tiers):
+                # Other columns or retention: keep the old history aside and start a new file.
+                self.history.close()
+                self.history = None
+                os.replace(path, path + ".old")
+        except (OSError, HistoryError, struct.error, ValueError):
+            if self.history:
+                self.history.close()
+            self.history = None
+        if self.history == None:
+            HistoryFile.create(path, self.columns, capacities)
+            self.history = HistoryFile(path, writable=True)
+        self.raw = self.history.tiers[0]
+        self.downsampled = [(tier, Accumulator(len(self.columns))) for tier in self.history.tiers[1:]]
+        self.resume()
+
+    # After a restart: refill the rows in progress of the downsampled tiers from the polls in the "1s" tier.
+    def resume(self):
+        if self.raw.count == 0:
+            return
+        last = self.history.timestamp(self.raw, self.raw.count - 1)
+        for tier, accumulator in self.downsampled:
+            start = last - last % tier.seconds
+            if tier.count and self.history.timestamp(tier, tier.count - 1) >= start:
+                continue
+            accumulator.start = start
+            for timestamp, row in self.history.rows(self.raw, start):
+                accumulator.add(row)
+
+    # Append the values of one poll, timestamp is a Unix time. Only pass the values the poll read, the columns without
+    # a value get NaN.
+    def append(self, timestamp, values):
+        row = []
+        for column in self.columns:
+            value = values.get(column)
+            row.append(float(value) if isinstance(value, (int, float)) else NAN)
+        second = int(timestamp)
+        self.history.writeRow(self.raw, [second] + row)
+        for tier, accumulator in self.downsampled:
+            start = second - second % tier.seconds
+            if accumulator.start != start:
+                if accumulator.start != None:
+                    self.history.writeRow(tier, [accumulator.start] + accumulator.take())
+                accumulator.start = start
+            accumulator.add(row)
+
+    # The rows in progress of the downsampled tiers are not written, resume() picks them up again.
+    def close(self):
+        self.history.map.flush()
+        self.history.close()
+
+# The (timestamps, values) of a time range as NumPy arrays, values has a column per name of names.
+def toNumpy(history, tier, start=None, end=None, names=None):
+    import numpy
+    valueNames = history.valueNames(tier)
+    indexes = [valueNames.index(name) for name in names] if names else range(len(valueNames))
+    timestamps = []
+    values = []
+    for timestamp, row in history.rows(tier, start, end):
+        timestamps.append(timestamp)
+        values.append([row[i] for i in indexes])
+    return numpy.array(timestamps, dtype=numpy.uint32), numpy.array(values, dtype=numpy.float32).reshape(len(timestamps), len(indexes))
+
+def writeCsv(file, history, tier, start, end, names):
+    valueNames = history.valueNames(tier)
+    indexes = [valueNames.index(name) for name in names]
+    file.write(",".join(["time"] + names) + "\n")
+    for timestamp, row in history.rows(tier, start, end):
+        fields = [datetime.datetime.fromtimestamp(timestamp).isoformat()]
+        fields += ("" if row[i] != row[i] else f"{row[i]:.6g}" for i in indexes)
+        file.write(",".join(fields) + "\n")
+
+# A .npy file with a float64 matrix of the time and the values, written without NumPy. Load it with numpy.load().
+def writeNpy(file, history, tier, start, end, names):
+    valueNames = history.valueNames(tier)
+    indexes = [valueNames.index(name) for name in names]
+    rowFormat = struct.Struct(f"<{len(indexes) + 1}d")
+    # The row count is only known at the end: the header has a fixed size of 128 bytes and is written again.
+    def header(rowCount):
+        text = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, %d), }" % (rowCount, len(indexes) + 1)
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", 118) + text.ljust(117).encode("latin1") + b"\n"
+    file.write(header(0))
+    rows = 0
+    for timestamp, row in history.rows(tier, start, end):
+        file.write(rowFormat.pack(timestamp, *(row[i] for i in indexes)))
+        rows += 1
+    file.seek(0)
+    file.write(header(rows))
+
+def parseTime(text):
+    if text == None:
+        return None
+    try:
+        return int(float(text))
+    except ValueError:
+        return int(datetime.datetime.fromisoformat(text).timestamp())
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the history file of the GoodWe plugin.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="show the columns, tiers and time ranges")
+    info.add_argument("file")
+    export = commands.add_parser("export", help="export a time range as CSV or .npy")
+    export.add_argument("file")
+    export.add_argument("--tier", default="1s")
+    export.add_argument("--start", help="Unix time or ISO date and time, default the oldest row")
+    export.add_argument("--end", help="Unix time or ISO date and time (exclusive), default the newest row")
+    export.add_argument("--columns", help="comma separated column names, min/avg/max are selected with a _min, _avg or _max suffix")
+    export.add_argument("--format", choices=("csv", "npy"), default="csv")
+    export.add_argument("--output", help="output file, default standard output for CSV")
+    args = parser.parse_args()
+
+    try:
+        history = HistoryFile(args.file)
+    except (OSError, HistoryError) as e:
+        sys.exit(str(e))
+    try:
+        if args.command == "info":
+            print(f"{len(history.columns)} columns: {', '.join(history.columns)}")
+            for tier in history.tiers:
+                span = ""
+                if tier.count:
+                    first = datetime.datetime.fromtimestamp(history.timestamp(tier, 0))
+                    last = datetime.datetime.fromtimestamp(history.timestamp(tier, tier.count - 1))
+                    span = f", {first} - {last}"
+                print(f"tier {tier.name:<6} {tier.count}/{tier.capacity} rows of {tier.rowSize} bytes{span}")
+            return
+
+        try:
+            tier = history.tier(args.tier)
+        except HistoryError as e:
+            sys.exit(str(e))
+        valueNames = history.valueNames(tier)
+        names = args.columns.split(",") if args.columns else valueNames
+        if tier.seconds:
+            # A plain column name selects its min, avg and max.
+            names = [name for column in names for name in ([column] if column in valueNames else [f"{column}_min", f"{column}_avg", f"{column}_max"])]
+        unknown = [name for name in names if name not in valueNames]
+        if unknown:
+            sys.exit(f"Unknown columns: {', '.join(unknown)}")
+        start, end = parseTime(args.start), parseTime(args.end)
+        if args.format == "npy":
+            if not args.output:
+                sys.exit("--output is required for the npy format")
+            with open(args.output, "wb") as file:
+                writeNpy(file, history, tier, start, end, names)
+        elif args.output:
+            with open(args.output, "w") as file:
+                writeCsv(file, history, tier, start, end, names)
+        else:
+            writeCsv(sys.stdout, history, tier, start, end, names)
+    finally:
+        history.close()
+
+if __name__ == "__main__":
+    main()
@@ -16,13 +16,16 @@
             <li>Auto detect singlephase or 3 phase model</li>
             <li>Port number is fixed at 8899</li>
             <li>Supports inverter shutdown and (temporary) disconnect</li>
+            <li>Retries less often at night and more often around sunrise when the location is known</li>
             <li>Reset power sensors to 0 if state is wait mode</li>
             <li>Auto detects the inverter family</li>
             <li>Setting the inverter family manually speeds up the connection time</li>
+            <li>Remembers the detected inverter family, so reconnects skip the auto detection</li>
+            <li>Polls several inverters concurrently, enter their addresses separated by commas (optionally address:family). Their devices share the 255 Unit numbers of the hardware: 3 to 4 inverters fit, depending on their families</li>
         </ul>
     </description>
     <params>
-        <param field="Address" label="Inverter IP Address" width="150px" required="true" />
+        <param field="Address" label="Inverter IP Address(es)" width="300px" required="true" />
         <param field="Mode3" label="Inverter Family" width="100px" required="true" default="Auto" >
             <options>
                 <option label="Auto" value="" default="true" />
@@ -64,21 +67,41 @@
                 <option label="Debug" value="Debug"/>
             </options>
         </param>
+        <param field="Mode6" label="Options" width="400px" required="false" default="" />
     </params>
 </plugin>
 """
 
 if __name__ == '__main__': # for local debugging purposes without the Domoticz framework, this gets emulated in a very simple fashion.
-    import sys
-    sys.path.append('../domoticz-goodwe-modbusudp-plugin-tester/')    
+    import sys, os
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tester'))
     from Domoticz import * 
 else:
     import Domoticz
-import goodwe
-from enum import IntEnum
-from pymodbus.exceptions import ConnectionException
+from enum import IntEnum, IntFlag
 import time
-import asyncio
+import io
+import threading
+import queue
+import json
+import os
+import math
+import random
+import logging.handlers
+
+# goodwe (with asyncio) and pymodbus take a good part of a second to import on a small system, and they are only used by
+# the poller thread. They are imported by importInverterLibraries() when the poller starts, so loading the plugin and
+# onStart() do not wait for them.
+goodwe = None
+asyncio = None
+ConnectionException = None
+
+def importInverterLibraries():
+    global goodwe, asyncio, ConnectionException
+    import asyncio
+    import goodwe
+    import goodwe.protocol
+    from pymodbus.exceptions import ConnectionException
 
 class Column(IntEnum):
     MODBUSNAME      = 0
@@ -92,6 +115,25 @@ class Column(IntEnum):
     RST0WAIT        = 8 
     FOR3PHASEMODEL  = 9
     IDNUM = 10
+    POLLCLASS = 11
+    UPDATEPOLICY = 12
+
+# How often a value is read and applied, see InverterConnection.pollClasses().
+# Fast values are updated on every poll, Normal and Slow values every normal_interval and slow_interval seconds,
+# Static values only once after (re)connecting to the inverter.
+class PollClass(IntFlag):
+    Fast   = 1
+    Normal = 2
+    Slow   = 4
+    Static = 8
+    All    = 15
+
+# The order in which BasePlugin.flushUpdates() writes the pending device updates when its budget runs out:
+# power rows first, the diagnostic devices of the plugin itself last.
+class UpdatePriority(IntEnum):
+    Power      = 0
+    Normal     = 1
+    Diagnostic = 2
 
 class DType(IntEnum): 
     General=243 #F3
@@ -113,343 +155,2219 @@ class DSwitchType:
     General=0 
     EnergyGenerated=4
 
+# When a changed value is written to its Domoticz device, see BasePlugin.updateDevice().
+# A change within the deadband (the largest of absolute and relative * last written value) is not written,
+# unless the last write is more than maxInterval seconds ago. No value is written within minInterval seconds of the last write.
+# Values are always written when they become 0 or leave 0, so wait mode and sunset show up right away.
+class UpdatePolicy:
+    __slots__ = ("absolute", "relative", "minInterval", "maxInterval")
+
+    def __init__(self, absolute=0.0, relative=0.0, minInterval=0, maxInterval=300):
+        self.absolute = absolute
+        self.relative = relative
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+
+# The update policies used in INVERTER_PARAMS.
+class Policy:
+    Always      = UpdatePolicy() # Every change is written, for codes, texts and other values without noise
+    Counter     = UpdatePolicy() # Cumulative counters, every change is written so the totals stay correct
+    Power       = UpdatePolicy(absolute=5.0, relative=0.01) # W
+    Voltage     = UpdatePolicy(absolute=0.5) # V
+    Current     = UpdatePolicy(absolute=0.1) # A
+    Frequency   = UpdatePolicy(absolute=0.05) # Hz
+    PowerFactor = UpdatePolicy(absolute=0.01)
+    Temperature = UpdatePolicy(absolute=0.5) # C
+    Percentage  = UpdatePolicy(absolute=0.5) # %
+    Energy      = UpdatePolicy(absolute=0.01) # kWh
+
 THREEPHASE_SERIES = [ "ET","BT","DT" ] # All models in these series are 3-phase models, so we can skip our 3 phase model detection.
 
 INVERTER_PARAMS = [
-#   MODBUSNAME,     DISPLAY_NAME,         TYPE,           SUBTYPE,                      SWITCHTYPE,                  OPTIONS,              FORMAT,        PREPEND_IDNUM, RST0WAIT FOR3PHASEMODEL, IDNUM
-    ["vpv1",        "PV1 Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           1 ], # PV1 Voltage = 127.1 V
-    ["ppv1",        "PV1 Power",          DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           2 ], # PV1 Power = 407 W
-    ["ppv",         "PV Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           4 ], # PV Power = 389 W
-    ["work_mode",   "Status code",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           5 ], # Work Mode Code = 1
-    ["e_total",     "Total Generation",   DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{};{}",       4,              False,  False,           6 ], # Total PV Generation = 7.8 kWh
-    ["ipv1",        "PV1 Current",        DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           7 ], # PV1 Current = 3.2 A
-    ["vpv2",        "PV2 Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           8 ], # PV2 Voltage = 127.1 V
-    ["ipv2",        "PV2 Current",        DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           9 ], # PV2 Current = 3.2 A
-    ["ppv2",        "PV2 Power",          DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           10 ],# PV2 Power = 407 W
-    ["vline1",      "Grid L1-L2 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            11 ], # On-grid L1-L2 Voltage = -0.1 V
-    ["vline2",      "Grid L2-L3 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            12 ], # On-grid L2-L3 Voltage = -0.1 V
-    ["vline3",      "Grid L3-L1 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            13 ], # On-grid L3-L1 Voltage = -0.1 V
-    ["vgrid1",      "Grid L1 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           14 ], # On-grid L1 Voltage = 236.7 V
-    ["vgrid2",      "Grid L2 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            15 ], # On-grid L2 Voltage = -0.1 V
-    ["vgrid3",      "Grid L3 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            16 ], # On-grid L3 Voltage = -0.1 V
-    ["work_mode_label","Status",          DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           17 ], # Work Mode = Normal
-    ["igrid1",      "L1 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           18 ], # L1 Current = 1.7 A
-    ["igrid2",      "L2 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            19 ], # L2 Current = 0 A
-    ["igrid3",      "L3 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            20 ], # L3 Current = 0 A
-    ["fgrid1",      "L1 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  False,           21 ], # L1 Frequency = 49.99 Hz
-    ["fgrid2",      "L2 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  True,            22 ], # L2 Frequency = 0 Hz
-    ["fgrid3",      "L3 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  True,            23 ], # L3 Frequency = 0 Hz
-    ["pgrid1",      "L1 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           24 ], # L1 Power = 402 W
-    ["pgrid2",      "L2 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            25 ], # L2 Power = 0 W
-    ["pgrid3",      "L3 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            26 ], # L3 Power = 0 W
-    ["error_codes", "Error code",         DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           27 ], # Error code
-    ["warning_code", "Warning code",      DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           28 ], # Warning code
-    ["temperature", "Temperature",        DType.General,  DGeneralSubType.Temperature,  DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           29 ], # Temperature
-    ["vbus",        "Bus Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           30 ], # Bus Voltage = 377.8 V
-    ["vnbus",       "NBus Voltage",       DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            31 ], # NBus Voltage = -0.1 V
-    ["e_day",       "Today's Generation", DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{};{}",       4,              False,  False,           32 ], # Today's PV Generation = 0.9 kWh
-    ["h_total",     "Total hours",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;h"},    "{:.2f}",      None,           False,  False,           33 ], # Hours Total = 29 h
-    ["funbit",      "FunBit",             DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           34 ], # FunBit=336
-    ["timestamp",   "Time",               DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           3  ], # Timestamp = 2022-06-06 11:23:49 
+#   MODBUSNAME,     DISPLAY_NAME,         TYPE,           SUBTYPE,                      SWITCHTYPE,                  OPTIONS,              FORMAT,        PREPEND_IDNUM, RST0WAIT FOR3PHASEMODEL, IDNUM, POLLCLASS, UPDATEPOLICY
+    ["vpv1",        "PV1 Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           1, PollClass.Normal, Policy.Voltage    ], # PV1 Voltage = 127.1 V
+    ["ppv1",        "PV1 Power",          DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           2, PollClass.Normal, Policy.Power      ], # PV1 Power = 407 W
+    ["ppv",         "PV Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           4, PollClass.Fast,   Policy.Power      ], # PV Power = 389 W
+    ["work_mode",   "Status code",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           5, PollClass.Fast,   Policy.Always     ], # Work Mode Code = 1
+    ["e_total",     "Total Generation",   DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{};{}",       4,              False,  False,           6, PollClass.Normal, Policy.Counter    ], # Total PV Generation = 7.8 kWh
+    ["ipv1",        "PV1 Current",        DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           7, PollClass.Normal, Policy.Current    ], # PV1 Current = 3.2 A
+    ["vpv2",        "PV2 Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           8, PollClass.Normal, Policy.Voltage    ], # PV2 Voltage = 127.1 V
+    ["ipv2",        "PV2 Current",        DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           9, PollClass.Normal, Policy.Current    ], # PV2 Current = 3.2 A
+    ["ppv2",        "PV2 Power",          DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           10, PollClass.Normal, Policy.Power      ],# PV2 Power = 407 W
+    ["vline1",      "Grid L1-L2 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            11, PollClass.Normal, Policy.Voltage    ], # On-grid L1-L2 Voltage = -0.1 V
+    ["vline2",      "Grid L2-L3 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            12, PollClass.Normal, Policy.Voltage    ], # On-grid L2-L3 Voltage = -0.1 V
+    ["vline3",      "Grid L3-L1 Voltage", DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            13, PollClass.Normal, Policy.Voltage    ], # On-grid L3-L1 Voltage = -0.1 V
+    ["vgrid1",      "Grid L1 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           14, PollClass.Normal, Policy.Voltage    ], # On-grid L1 Voltage = 236.7 V
+    ["vgrid2",      "Grid L2 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            15, PollClass.Normal, Policy.Voltage    ], # On-grid L2 Voltage = -0.1 V
+    ["vgrid3",      "Grid L3 Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,            16, PollClass.Normal, Policy.Voltage    ], # On-grid L3 Voltage = -0.1 V
+    ["work_mode_label","Status",          DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           17, PollClass.Normal, Policy.Always     ], # Work Mode = Normal
+    ["igrid1",      "L1 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           18, PollClass.Normal, Policy.Current    ], # L1 Current = 1.7 A
+    ["igrid2",      "L2 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            19, PollClass.Normal, Policy.Current    ], # L2 Current = 0 A
+    ["igrid3",      "L3 Current",         DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            20, PollClass.Normal, Policy.Current    ], # L3 Current = 0 A
+    ["fgrid1",      "L1 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  False,           21, PollClass.Normal, Policy.Frequency  ], # L1 Frequency = 49.99 Hz
+    ["fgrid2",      "L2 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  True,            22, PollClass.Normal, Policy.Frequency  ], # L2 Frequency = 0 Hz
+    ["fgrid3",      "L3 Frequency",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  True,            23, PollClass.Normal, Policy.Frequency  ], # L3 Frequency = 0 Hz
+    ["pgrid1",      "L1 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           24, PollClass.Normal, Policy.Power      ], # L1 Power = 402 W
+    ["pgrid2",      "L2 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            25, PollClass.Normal, Policy.Power      ], # L2 Power = 0 W
+    ["pgrid3",      "L3 Power",           DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            26, PollClass.Normal, Policy.Power      ], # L3 Power = 0 W
+    ["error_codes", "Error code",         DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           27, PollClass.Normal, Policy.Always     ], # Error code
+    ["warning_code", "Warning code",      DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           28, PollClass.Normal, Policy.Always     ], # Warning code
+    ["temperature", "Temperature",        DType.General,  DGeneralSubType.Temperature,  DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           29, PollClass.Slow,   Policy.Temperature], # Temperature
+    ["vbus",        "Bus Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           30, PollClass.Normal, Policy.Voltage    ], # Bus Voltage = 377.8 V
+    ["vnbus",       "NBus Voltage",       DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   True,            31, PollClass.Normal, Policy.Voltage    ], # NBus Voltage = -0.1 V
+    ["e_day",       "Today's Generation", DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{};{}",       4,              False,  False,           32, PollClass.Normal, Policy.Counter    ], # Today's PV Generation = 0.9 kWh
+    ["h_total",     "Total hours",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;h"},    "{:.2f}",      None,           False,  False,           33, PollClass.Slow,   Policy.Always     ], # Hours Total = 29 h
+    ["funbit",      "FunBit",             DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           34, PollClass.Static, Policy.Always     ], # FunBit=336
+    ["timestamp",   "Time",               DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           3, PollClass.Normal, Policy.Always     ], # Timestamp = 2022-06-06 11:23:49 
    # Following entries seen on GW10K-ET
-    ["function_bit","Function bit",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           35 ], # Function bit = 16416
-    ["bus_voltage", "Bus Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           36 ], # Bus Voltage = 654.1 V
-    ["nbus_voltage","NBus Voltage",       DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           37 ], # NBus Voltage = 325.4 V
-    ["vbattery1",   "Battery Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           38 ], # Battery Voltage = 396.1 V
-    ["ibattery1",   "Battery Current",    DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           39 ], # Battery Current = 1.9 A
-    ["pbattery1",   "Battery Power",      DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           40 ], # Battery Power = 753 W
-    ["battery_mode","Battery Mode code",  DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           41 ], # Battery Mode code = 2
-    ["battery_mode_label","Battery Mode", DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           42 ], # Battery Mode = Discharge
-    ["safety_country","Safety Country code",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           43 ], # Safety Country code = 6
-    ["safety_country_label","Safety Country",DType.General,DGeneralSubType.Text,        DSwitchType.General,         {},                   "{}",          None,           False,  False,           44 ], # Safety Country = Belgium
-    ["work_mode_label","Work Mode",       DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           45 ], # Work Mode = Normal (On-Grid)
-    ["operation_mode","Operation Mode code",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           46 ], # Operation Mode code = 0
-    ["errors",      "Errors",             DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           47 ], # Errors =
-    ["e_day_exp",   "Today Energy (export)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           49 ], # Today Energy (export) = 3.0 kWh
-    ["e_total_imp", "Total Energy (import)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           51 ], # Total Energy (import) = 56.5 kWh
-    ["e_day_imp",   "Today Energy (import)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           52 ], # Today Energy (import) = 7.6 kWh
-    ["house_consumption","House Consumption",DType.Usage, DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           53 ], # House Consumption = 892 W
-    ["e_load_total","Total Load",         DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           54 ], # Total Load = 122.8 kWh
-    ["e_load_day",  "Today Load",         DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           55 ], # Today Load = 7.9 kWh
-    ["e_bat_charge_total","Total Battery Charge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated, {},                   "{}:{}",       40,             False,  False,           56 ], # Total Battery Charge = 52.2 kWh
-    ["e_bat_charge_day","Today Battery Charge",DType.General,DGeneralSubType.Electric,  DSwitchType.EnergyGenerated, {},                   "{}:{}",       40,             False,  False,           57 ], # Today Battery Charge = 7.1 kWh
-    ["e_bat_discharge_total","Total Battery Discharge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       40,             False,  False,           58 ], # Total Battery Discharge = 52.4 kWh
-    ["e_bat_discharge_day","Today Battery Discharge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},                "{}:{}",       40,             False,  False,           59 ], # Today Battery Discharge = 3.0 kWh
-    ["diagnose_result","Diag Status Code",DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           60 ], # Diag Status Code = 33554880
-    ["diagnose_result_label","Diag Status",DType.General, DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           61 ], # Diag Status = Discharge Driver On, BMS: Discharge current low, APP: Discharge current too low, PF value set
-    ["battery_bms", "Battery BMS",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           62 ], # Battery BMS = 255
-    ["battery_index","Battery Index",     DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           63 ], # Battery Index = 257
-    ["battery_status","Battery Status",   DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           64 ], # Battery Status = 1
-    ["battery_temperature","Battery Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,           65 ], # Battery Temperature = 24.0 C
-    ["battery_charge_limit","Battery Charge Limit",DType.General,DGeneralSubType.Current,DSwitchType.General,        {},                   "{:.2f}",      None,           False,  False,           66 ], # Battery Charge Limit = 18 A
-    ["battery_discharge_limit","Battery Discharge Limit",DType.General,DGeneralSubType.Current,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,           67 ], # Battery Discharge Limit = 18 A
-    ["battery_error_l","Battery Error L", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           68 ], # Battery Error L = 0
-    ["battery_soc", "Battery State of Charge",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,       {"Custom": "1;%"},    "{}",          None,           False,  False,           69 ], # Battery State of Charge = 77 %
-    ["battery_soh", "Battery State of Health",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,       {"Custom": "1;%"},    "{}",          None,           False,  False,           70 ], # Battery State of Health = 100 %
-    ["battery_modules","Battery Modules", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           71 ], # Battery Modules = 8
-    ["battery_warning_l","Battery Warning L",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           72 ], # Battery Warning L = 0
-    ["battery_protocol","Battery Protocol",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           73 ], # Battery Protocol = 257
-    ["battery_error_h","Battery Error H", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           74 ], # Battery Error H = 0
-    ["battery_error", "Battery Error",    DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           75 ], # Battery Error =
-    ["battery_warning_h", "Battery Warning H", DType.General, DGeneralSubType.CustomSensor,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,           76 ], # Battery Warning H = 0
-    ["battery_warning", "Battery Warning",DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           77 ], # Battery Warning =
-    ["battery_sw_version","Battery Software Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,  {},                   "{}",          None,           False,  False,           78 ], # Battery Software Version = 0
-    ["battery_hw_version","Battery Hardware Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,  {},                   "{}",          None,           False,  False,           79 ], # Battery Hardware Version = 0
-    ["battery_max_cell_temp_id","Battery Max Cell Temperature ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},        "{}",          None,           False,  False,           80 ], # Battery Max Cell Temperature ID = 0
-    ["battery_min_cell_temp_id","Battery Min Cell Temperature ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},        "{}",          None,           False,  False,           81 ], # Battery Min Cell Temperature ID = 0
-    ["battery_max_cell_voltage_id","Battery Max Cell Voltage ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},         "{}",          None,           False,  False,           82 ], # Battery Max Cell Voltage ID = 0
-    ["battery_min_cell_voltage_id","Battery Min Cell Voltage ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},         "{}",          None,           False,  False,           83 ], # Battery Min Cell Voltage ID = 0
-    ["battery_max_cell_temp","Battery Max Cell Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,{},              "{:.2f}",      None,           False,  False,           84 ], # Battery Max Cell Temperature = 0.0 C
-    ["battery_min_cell_temp","Battery Min Cell Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,{},              "{:.2f}",      None,           False,  False,           85 ], # Battery Min Cell Temperature = 0.0 C
-    ["battery_max_cell_voltage","Battery Max Cell Voltage",DType.General,DGeneralSubType.Voltage,DSwitchType.General,{},                   "{:.2f}",      None,           False,  False,           86 ], # Battery Max Cell Voltage = 0.0 V
-    ["battery_min_cell_voltage","Battery Min Cell Voltage",DType.General,DGeneralSubType.Voltage,DSwitchType.General,{},                   "{:.2f}",      None,           False,  False,           87 ], # Battery Min Cell Voltage = 0.0 V
-    ["commode",     "Commode",            DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           88 ], # Commode = 1
-    ["rssi",        "RSSI",               DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{}",          None,           False,  False,           89 ], # RSSI = 100
-    ["manufacture_code","Manufacture Code",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{}",          None,           False,  False,           90 ], # Manufacture Code = 10
-    ["meter_test_status","Meter Test Status",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,       {},                   "{}",          None,           False,  False,           91 ], # Meter Test Status = 273
-    ["meter_comm_status","Meter Communication Status",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,{},                 "{}",          None,           False,  False,           92 ], # Meter Communication Status = 1
-    ["active_power1","Active Power L1",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           93 ], # Active Power L1 = 138 W
-    ["active_power2","Active Power L2",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,           94 ], # Active Power L2 = -215 W
-    ["active_power3","Active Power L3",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,           95 ], # Active Power L3 = 42 W
-    ["active_power_total","Active Power Total",DType.Usage,DUsageSubType.Electric,         DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           96 ], # Active Power Total = -35 W
-    ["reactive_power_total","Reactive Power Total",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           97 ], # Reactive Power Total = 382 var
-    ["meter_power_factor1","Meter Power Factor L1",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  False,           98 ], # Meter Power Factor L1 = 0.451
-    ["meter_power_factor2","Meter Power Factor L2",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  True,           99 ], # Meter Power Factor L2 = -0.573
-    ["meter_power_factor3","Meter Power Factor L3",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  True,          100 ], # Meter Power Factor L3 = 0.451
-    ["meter_power_factor","Meter Power Factor",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,       {},                   "{:.3f}",      None,           False,  False,          101 ], # Meter Power Factor = -0.036
-    ["meter_freq",   "Meter Frequency",   DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  False,          102 ], # Meter Frequency = 49.95 Hz
-    ["meter_e_total_exp","Meter Total Energy (export)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       53,             False,  False,          103 ], # Meter Total Energy (export) = 0.728 kWh
-    ["meter_e_total_imp","Meter Total Energy (import)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       53,             False,  False,          104 ], # Meter Total Energy (import) = 116.949 kWh
-    ["meter_active_power1","Meter Active Power L1",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,          105 ], # Meter Active Power L1 = 138 W
-    ["meter_active_power2","Meter Active Power L2",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,          106 ], # Meter Active Power L2 = -215 W
-    ["meter_active_power3","Meter Active Power L3",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,          107 ], # Meter Active Power L3 = 42 W
-    ["meter_active_power_total","Meter Active Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,          108 ], # Meter Active Power Total = -35 W
-    ["meter_reactive_power1","Meter Reactive Power L1",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  False,          109 ], # Meter Reactive Power L1 = 222 var
-    ["meter_reactive_power2","Meter Reactive Power L2",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          110 ], # Meter Reactive Power L2 = 111 var
-    ["meter_reactive_power3","Meter Reactive Power L3",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          111 ], # Meter Reactive Power L3 = 49 var
-    ["meter_reactive_power_total","Meter Reactive Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,          112 ], # Meter Reactive Power Total = 382 var
-    ["meter_apparent_power1","Meter Apparent Power L1",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  False,          113 ], # Meter Apparent Power L1 = 306 VA
-    ["meter_apparent_power2","Meter Apparent Power L2",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          114 ], # Meter Apparent Power L2 = -371 VA
-    ["meter_apparent_power3","Meter Apparent Power L3",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          115 ], # Meter Apparent Power L3 = 188 VA
-    ["meter_apparent_power_total","Meter Apparent Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,          116 ], # Meter Apparent Power Total = -867 VA
-    ["meter_type","Meter Type",          DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,          {},                   "{}",          None,           False,  False,          117 ], # Meter Type = 255
-    ["meter_sw_version","Meter Software Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,     {},                   "{}",          None,           False,  False,          118 ]  # Meter Software Version = 2    
+    ["function_bit","Function bit",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           35, PollClass.Static, Policy.Always     ], # Function bit = 16416
+    ["bus_voltage", "Bus Voltage",        DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           36, PollClass.Normal, Policy.Voltage    ], # Bus Voltage = 654.1 V
+    ["nbus_voltage","NBus Voltage",       DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           37, PollClass.Normal, Policy.Voltage    ], # NBus Voltage = 325.4 V
+    ["vbattery1",   "Battery Voltage",    DType.General,  DGeneralSubType.Voltage,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           38, PollClass.Normal, Policy.Voltage    ], # Battery Voltage = 396.1 V
+    ["ibattery1",   "Battery Current",    DType.General,  DGeneralSubType.Current,      DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           39, PollClass.Normal, Policy.Current    ], # Battery Current = 1.9 A
+    ["pbattery1",   "Battery Power",      DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           True,   False,           40, PollClass.Normal, Policy.Power      ], # Battery Power = 753 W
+    ["battery_mode","Battery Mode code",  DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           41, PollClass.Normal, Policy.Always     ], # Battery Mode code = 2
+    ["battery_mode_label","Battery Mode", DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           42, PollClass.Normal, Policy.Always     ], # Battery Mode = Discharge
+    ["safety_country","Safety Country code",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           43, PollClass.Static, Policy.Always     ], # Safety Country code = 6
+    ["safety_country_label","Safety Country",DType.General,DGeneralSubType.Text,        DSwitchType.General,         {},                   "{}",          None,           False,  False,           44, PollClass.Static, Policy.Always     ], # Safety Country = Belgium
+    ["work_mode_label","Work Mode",       DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           45, PollClass.Normal, Policy.Always     ], # Work Mode = Normal (On-Grid)
+    ["operation_mode","Operation Mode code",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           46, PollClass.Normal, Policy.Always     ], # Operation Mode code = 0
+    ["errors",      "Errors",             DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           47, PollClass.Normal, Policy.Always     ], # Errors =
+    ["e_day_exp",   "Today Energy (export)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           49, PollClass.Normal, Policy.Counter    ], # Today Energy (export) = 3.0 kWh
+    ["e_total_imp", "Total Energy (import)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           51, PollClass.Normal, Policy.Counter    ], # Total Energy (import) = 56.5 kWh
+    ["e_day_imp",   "Today Energy (import)",DType.General,DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           52, PollClass.Normal, Policy.Counter    ], # Today Energy (import) = 7.6 kWh
+    ["house_consumption","House Consumption",DType.Usage, DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           53, PollClass.Normal, Policy.Power      ], # House Consumption = 892 W
+    ["e_load_total","Total Load",         DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           54, PollClass.Normal, Policy.Counter    ], # Total Load = 122.8 kWh
+    ["e_load_day",  "Today Load",         DType.General,  DGeneralSubType.Electric,     DSwitchType.EnergyGenerated, {},                   "{}:{}",       53,             False,  False,           55, PollClass.Normal, Policy.Counter    ], # Today Load = 7.9 kWh
+    ["e_bat_charge_total","Total Battery Charge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated, {},                   "{}:{}",       40,             False,  False,           56, PollClass.Normal, Policy.Counter    ], # Total Battery Charge = 52.2 kWh
+    ["e_bat_charge_day","Today Battery Charge",DType.General,DGeneralSubType.Electric,  DSwitchType.EnergyGenerated, {},                   "{}:{}",       40,             False,  False,           57, PollClass.Normal, Policy.Counter    ], # Today Battery Charge = 7.1 kWh
+    ["e_bat_discharge_total","Total Battery Discharge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       40,             False,  False,           58, PollClass.Normal, Policy.Counter    ], # Total Battery Discharge = 52.4 kWh
+    ["e_bat_discharge_day","Today Battery Discharge",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},                "{}:{}",       40,             False,  False,           59, PollClass.Normal, Policy.Counter    ], # Today Battery Discharge = 3.0 kWh
+    ["diagnose_result","Diag Status Code",DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           60, PollClass.Normal, Policy.Always     ], # Diag Status Code = 33554880
+    ["diagnose_result_label","Diag Status",DType.General, DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           61, PollClass.Normal, Policy.Always     ], # Diag Status = Discharge Driver On, BMS: Discharge current low, APP: Discharge current too low, PF value set
+    ["battery_bms", "Battery BMS",        DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           62, PollClass.Slow,   Policy.Always     ], # Battery BMS = 255
+    ["battery_index","Battery Index",     DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           63, PollClass.Slow,   Policy.Always     ], # Battery Index = 257
+    ["battery_status","Battery Status",   DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           64, PollClass.Normal, Policy.Always     ], # Battery Status = 1
+    ["battery_temperature","Battery Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,           65, PollClass.Slow,   Policy.Temperature], # Battery Temperature = 24.0 C
+    ["battery_charge_limit","Battery Charge Limit",DType.General,DGeneralSubType.Current,DSwitchType.General,        {},                   "{:.2f}",      None,           False,  False,           66, PollClass.Slow,   Policy.Current    ], # Battery Charge Limit = 18 A
+    ["battery_discharge_limit","Battery Discharge Limit",DType.General,DGeneralSubType.Current,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,           67, PollClass.Slow,   Policy.Current    ], # Battery Discharge Limit = 18 A
+    ["battery_error_l","Battery Error L", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           68, PollClass.Normal, Policy.Always     ], # Battery Error L = 0
+    ["battery_soc", "Battery State of Charge",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,       {"Custom": "1;%"},    "{}",          None,           False,  False,           69, PollClass.Normal, Policy.Always     ], # Battery State of Charge = 77 %
+    ["battery_soh", "Battery State of Health",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,       {"Custom": "1;%"},    "{}",          None,           False,  False,           70, PollClass.Slow,   Policy.Always     ], # Battery State of Health = 100 %
+    ["battery_modules","Battery Modules", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           71, PollClass.Static, Policy.Always     ], # Battery Modules = 8
+    ["battery_warning_l","Battery Warning L",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           72, PollClass.Normal, Policy.Always     ], # Battery Warning L = 0
+    ["battery_protocol","Battery Protocol",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           73, PollClass.Static, Policy.Always     ], # Battery Protocol = 257
+    ["battery_error_h","Battery Error H", DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           74, PollClass.Normal, Policy.Always     ], # Battery Error H = 0
+    ["battery_error", "Battery Error",    DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           75, PollClass.Normal, Policy.Always     ], # Battery Error =
+    ["battery_warning_h", "Battery Warning H", DType.General, DGeneralSubType.CustomSensor,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,           76, PollClass.Normal, Policy.Always     ], # Battery Warning H = 0
+    ["battery_warning", "Battery Warning",DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           77, PollClass.Normal, Policy.Always     ], # Battery Warning =
+    ["battery_sw_version","Battery Software Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,  {},                   "{}",          None,           False,  False,           78, PollClass.Static, Policy.Always     ], # Battery Software Version = 0
+    ["battery_hw_version","Battery Hardware Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,  {},                   "{}",          None,           False,  False,           79, PollClass.Static, Policy.Always     ], # Battery Hardware Version = 0
+    ["battery_max_cell_temp_id","Battery Max Cell Temperature ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},        "{}",          None,           False,  False,           80, PollClass.Slow,   Policy.Always     ], # Battery Max Cell Temperature ID = 0
+    ["battery_min_cell_temp_id","Battery Min Cell Temperature ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},        "{}",          None,           False,  False,           81, PollClass.Slow,   Policy.Always     ], # Battery Min Cell Temperature ID = 0
+    ["battery_max_cell_voltage_id","Battery Max Cell Voltage ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},         "{}",          None,           False,  False,           82, PollClass.Slow,   Policy.Always     ], # Battery Max Cell Voltage ID = 0
+    ["battery_min_cell_voltage_id","Battery Min Cell Voltage ID",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,{},         "{}",          None,           False,  False,           83, PollClass.Slow,   Policy.Always     ], # Battery Min Cell Voltage ID = 0
+    ["battery_max_cell_temp","Battery Max Cell Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,{},              "{:.2f}",      None,           False,  False,           84, PollClass.Slow,   Policy.Temperature], # Battery Max Cell Temperature = 0.0 C
+    ["battery_min_cell_temp","Battery Min Cell Temperature",DType.General,DGeneralSubType.Temperature,DSwitchType.General,{},              "{:.2f}",      None,           False,  False,           85, PollClass.Slow,   Policy.Temperature], # Battery Min Cell Temperature = 0.0 C
+    ["battery_max_cell_voltage","Battery Max Cell Voltage",DType.General,DGeneralSubType.Voltage,DSwitchType.General,{},                   "{:.2f}",      None,           False,  False,           86, PollClass.Normal, Policy.Voltage    ], # Battery Max Cell Voltage = 0.0 V
+    ["battery_min_cell_voltage","Battery Min Cell Voltage",DType.General,DGeneralSubType.Voltage,DSwitchType.General,{},                   "{:.2f}",      None,           False,  False,           87, PollClass.Normal, Policy.Voltage    ], # Battery Min Cell Voltage = 0.0 V
+    ["commode",     "Commode",            DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           88, PollClass.Slow,   Policy.Always     ], # Commode = 1
+    ["rssi",        "RSSI",               DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{}",          None,           False,  False,           89, PollClass.Slow,   Policy.Always     ], # RSSI = 100
+    ["manufacture_code","Manufacture Code",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,         {},                   "{}",          None,           False,  False,           90, PollClass.Static, Policy.Always     ], # Manufacture Code = 10
+    ["meter_test_status","Meter Test Status",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,       {},                   "{}",          None,           False,  False,           91, PollClass.Slow,   Policy.Always     ], # Meter Test Status = 273
+    ["meter_comm_status","Meter Communication Status",DType.General, DGeneralSubType.CustomSensor, DSwitchType.General,{},                 "{}",          None,           False,  False,           92, PollClass.Slow,   Policy.Always     ], # Meter Communication Status = 1
+    ["active_power1","Active Power L1",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           93, PollClass.Fast,   Policy.Power      ], # Active Power L1 = 138 W
+    ["active_power2","Active Power L2",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,           94, PollClass.Fast,   Policy.Power      ], # Active Power L2 = -215 W
+    ["active_power3","Active Power L3",   DType.Usage,    DUsageSubType.Electric,          DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,           95, PollClass.Fast,   Policy.Power      ], # Active Power L3 = 42 W
+    ["active_power_total","Active Power Total",DType.Usage,DUsageSubType.Electric,         DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           96, PollClass.Fast,   Policy.Power      ], # Active Power Total = -35 W
+    ["reactive_power_total","Reactive Power Total",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           97, PollClass.Normal, Policy.Power      ], # Reactive Power Total = 382 var
+    ["meter_power_factor1","Meter Power Factor L1",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  False,           98, PollClass.Normal, Policy.PowerFactor], # Meter Power Factor L1 = 0.451
+    ["meter_power_factor2","Meter Power Factor L2",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  True,           99, PollClass.Normal, Policy.PowerFactor], # Meter Power Factor L2 = -0.573
+    ["meter_power_factor3","Meter Power Factor L3",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,   {},                   "{:.3f}",      None,           False,  True,          100, PollClass.Normal, Policy.PowerFactor], # Meter Power Factor L3 = 0.451
+    ["meter_power_factor","Meter Power Factor",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,       {},                   "{:.3f}",      None,           False,  False,          101, PollClass.Normal, Policy.PowerFactor], # Meter Power Factor = -0.036
+    ["meter_freq",   "Meter Frequency",   DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;Hz"},   "{:.2f}",      None,           False,  False,          102, PollClass.Normal, Policy.Frequency  ], # Meter Frequency = 49.95 Hz
+    ["meter_e_total_exp","Meter Total Energy (export)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       53,             False,  False,          103, PollClass.Normal, Policy.Counter    ], # Meter Total Energy (export) = 0.728 kWh
+    ["meter_e_total_imp","Meter Total Energy (import)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{}:{}",       53,             False,  False,          104, PollClass.Normal, Policy.Counter    ], # Meter Total Energy (import) = 116.949 kWh
+    ["meter_active_power1","Meter Active Power L1",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,          105, PollClass.Fast,   Policy.Power      ], # Meter Active Power L1 = 138 W
+    ["meter_active_power2","Meter Active Power L2",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,          106, PollClass.Fast,   Policy.Power      ], # Meter Active Power L2 = -215 W
+    ["meter_active_power3","Meter Active Power L3",DType.Usage,DUsageSubType.Electric,     DSwitchType.General,         {},                   "{:.2f}",      None,           False,  True,          107, PollClass.Fast,   Policy.Power      ], # Meter Active Power L3 = 42 W
+    ["meter_active_power_total","Meter Active Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,      {},                   "{:.2f}",      None,           False,  False,          108, PollClass.Fast,   Policy.Power      ], # Meter Active Power Total = -35 W
+    ["meter_reactive_power1","Meter Reactive Power L1",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  False,          109, PollClass.Normal, Policy.Power      ], # Meter Reactive Power L1 = 222 var
+    ["meter_reactive_power2","Meter Reactive Power L2",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          110, PollClass.Normal, Policy.Power      ], # Meter Reactive Power L2 = 111 var
+    ["meter_reactive_power3","Meter Reactive Power L3",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          111, PollClass.Normal, Policy.Power      ], # Meter Reactive Power L3 = 49 var
+    ["meter_reactive_power_total","Meter Reactive Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,          112, PollClass.Normal, Policy.Power      ], # Meter Reactive Power Total = 382 var
+    ["meter_apparent_power1","Meter Apparent Power L1",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  False,          113, PollClass.Normal, Policy.Power      ], # Meter Apparent Power L1 = 306 VA
+    ["meter_apparent_power2","Meter Apparent Power L2",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          114, PollClass.Normal, Policy.Power      ], # Meter Apparent Power L2 = -371 VA
+    ["meter_apparent_power3","Meter Apparent Power L3",DType.Usage,DUsageSubType.Electric,DSwitchType.General,          {},                   "{:.2f}",      None,           False,  True,          115, PollClass.Normal, Policy.Power      ], # Meter Apparent Power L3 = 188 VA
+    ["meter_apparent_power_total","Meter Apparent Power Total",DType.Usage,DUsageSubType.Electric,DSwitchType.General,  {},                   "{:.2f}",      None,           False,  False,          116, PollClass.Normal, Policy.Power      ], # Meter Apparent Power Total = -867 VA
+    ["meter_type","Meter Type",          DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,          {},                   "{}",          None,           False,  False,          117, PollClass.Static, Policy.Always     ], # Meter Type = 255
+    ["meter_sw_version","Meter Software Version",DType.General,DGeneralSubType.CustomSensor,DSwitchType.General,     {},                   "{}",          None,           False,  False,          118, PollClass.Static, Policy.Always     ]  # Meter Software Version = 2    
 ]
 
-# A time counter in milleconds that is guaranteed to go forward.
-def millis(): 
-    return int(time.monotonic() * 1000)
+# One INVERTER_PARAMS row, compiled against the sensors of the connected inverter and the existing Domoticz devices.
+# The heartbeat only walks these entries, so it does not have to search the lookup table or the sensor list on every poll.
+class DeviceMapping:
+    __slots__ = ("unit", "modbusname", "name", "sensorUnit", "format", "scale", "rst0wait", "prependUnit", "pollClass",
+                 "policy", "priority", "lastValue", "lastUpdate")
 
-class BasePlugin:
+    def __init__(self, sensor, params, units=None, policy=None):
+        self.unit = units[params[Column.IDNUM]] if units != None else params[Column.IDNUM]
+        self.modbusname = params[Column.MODBUSNAME]
+        self.name = sensor.name
+        self.sensorUnit = sensor.unit
+        self.format = params[Column.FORMAT].format # precompiled, bound str.format
+        # The value has been returned by the GoodWe library in kWh, but needs to be Wh for Domoticz
+        self.scale = 1000.0 if params[Column.SWITCHTYPE]==DSwitchType.EnergyGenerated else None
+        self.rst0wait = params[Column.RST0WAIT]
+        self.prependUnit = (units[params[Column.PREPEND_IDNUM]] if units != None else params[Column.PREPEND_IDNUM]) if params[Column.PREPEND_IDNUM] else None
+        self.pollClass = params[Column.POLLCLASS]
+        self.policy = policy # UpdatePolicy, or None to write every change
+        self.priority = UpdatePriority.Power if params[Column.TYPE]==DType.Usage or params[Column.UPDATEPOLICY] is Policy.Power else UpdatePriority.Normal
+        self.lastValue = None # last value written to the device
+        self.lastUpdate = None # time.monotonic() of the last write
 
-    def __init__(self):
+# Build the list of DeviceMapping entries for the devices that exist, in INVERTER_PARAMS (or table) order.
+# Devices that depend on another device (PREPEND_IDNUM) come after it in INVERTER_PARAMS, so they see its updated value.
+# units holds the Unit numbers of the devices of an inverter by IDNUM, see BasePlugin.inverterUnits(), None when the
+# IDNUMs are the Unit numbers. resolvePolicy answers the UpdatePolicy to use for the UPDATEPOLICY of a row.
+# Returns the mapping and the modbus names of the rows which have no Domoticz device.
+def compileDeviceMappings(sensors, devices, inverterIs3PhaseModel, units=None, resolvePolicy=lambda policy: None, table=INVERTER_PARAMS):
+    sensorsById = {}
+    for sensor in sensors:
+        sensorsById.setdefault(sensor.id_, sensor)
+
+    mappings = []
+    missing = []
+    for params in table:
+        sensor = sensorsById.get(params[Column.MODBUSNAME])
+        if sensor == None:
+            continue
+        if (units.get(params[Column.IDNUM]) if units != None else params[Column.IDNUM]) not in devices:
+            # Suppress device not found logs for singlephase model, as these are expected to be not present
+            if params[Column.FOR3PHASEMODEL]==False or inverterIs3PhaseModel==True:
+                missing.append(params[Column.MODBUSNAME])
+            continue
+        if params[Column.PREPEND_IDNUM] and (units.get(params[Column.PREPEND_IDNUM]) if units != None else params[Column.PREPEND_IDNUM]) not in devices:
+            missing.append(params[Column.MODBUSNAME])
+            continue
+        mappings.append(DeviceMapping(sensor, params, units, resolvePolicy(params[Column.UPDATEPOLICY])))
+    return mappings, missing
+
+# Domoticz Unit numbers range from 1 to 255. The first inverter keeps the INVERTER_PARAMS IDNUMs as its Unit numbers,
+# as with a single inverter. The devices of the other inverters are found by their DeviceID, INVERTER_DEVICEID, the
+# address and the IDNUM, see BasePlugin.inverterDeviceID(), and a new one gets the first of the FREE_UNITS. So an
+# inverter only takes the Units of the devices its family has. The Units above PLANT_UNIT_BASE are used for devices
+# of the plant as a whole.
+INVERTER_UNITS = max(params[Column.IDNUM] for params in INVERTER_PARAMS)
+PLANT_UNIT_BASE = 240
+INVERTER_DEVICEID = "inverter:"
+# Before, the second inverter had the IDNUMs plus LEGACY_UNIT_OFFSET as Unit numbers. Its devices keep them.
+LEGACY_UNIT_OFFSET = 120
+# The devices of the extra registers have no fixed Unit number, they are found by their DeviceID: EXTRA_DEVICEID and
+# the id of the register, see BasePlugin.extraDeviceID(). A new one gets the first of the FREE_UNITS.
+EXTRA_DEVICEID = "register:"
+
+# Devices which combine the values of all inverters, only used when more than one inverter is configured.
+# Same columns as INVERTER_PARAMS, but IDNUM is the Unit number itself. The values are the ones written to the inverter devices,
+# so wait mode and kWh to Wh conversion have already been applied.
+AGGREGATE_PARAMS = [
+#   MODBUSNAME,     DISPLAY_NAME,         TYPE,           SUBTYPE,                      SWITCHTYPE,                  OPTIONS,              FORMAT,        PREPEND_IDNUM, RST0WAIT FOR3PHASEMODEL, IDNUM, POLLCLASS, UPDATEPOLICY
+    ["ppv",         "Total PV Power",     DType.Usage,    DUsageSubType.Electric,       DSwitchType.General,         {},                   "{:.2f}",      None,           False,  False,           241, PollClass.Fast,   Policy.Power      ], # Sum of PV Power
+    ["e_total",     "Total Generation (all inverters)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},              "{};{}",       241,            False,  False,           242, PollClass.Normal, Policy.Counter    ], # Sum of Total PV Generation
+    ["e_day",       "Today's Generation (all inverters)",DType.General,DGeneralSubType.Electric,DSwitchType.EnergyGenerated,{},            "{};{}",       241,            False,  False,           243, PollClass.Normal, Policy.Counter    ], # Sum of Today's PV Generation
+]
+
+# Devices with values derived from those of all inverters by DerivedEnergy, added unless the derived option is off.
+# Same columns as INVERTER_PARAMS, IDNUM is the Unit number. The house load and self-consumption need a meter (ET family).
+DERIVED_PARAMS = [
+#   MODBUSNAME,        DISPLAY_NAME,               TYPE,           SUBTYPE,                      SWITCHTYPE,                  OPTIONS,              FORMAT,        PREPEND_IDNUM, RST0WAIT FOR3PHASEMODEL, IDNUM, POLLCLASS, UPDATEPOLICY
+    ["house_load",     "House Load",               DType.General,  DGeneralSubType.Electric,     DSwitchType.General,         {},                   "{0[0]:.0f};{0[1]:.0f}",None,  False,  False,           244, PollClass.Fast,   Policy.Counter    ], # W;Wh since the start
+    ["self_consumption","Self-consumption Today",  DType.General,  DGeneralSubType.Percentage,   DSwitchType.General,         {},                   "{:.1f}",      None,           False,  False,           245, PollClass.Fast,   Policy.Percentage ],
+    ["yield_day",      "PV Yield Today",           DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;kWh"},  "{:.3f}",      None,           False,  False,           246, PollClass.Fast,   Policy.Energy     ],
+    ["yield_hour",     "PV Yield This Hour",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;kWh"},  "{:.3f}",      None,           False,  False,           247, PollClass.Fast,   Policy.Energy     ],
+    ["yield_last_hour","PV Yield Last Hour",       DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;kWh"},  "{:.3f}",      None,           False,  False,           248, PollClass.Fast,   Policy.Always     ],
+]
+
+# Devices with the timings and counters of the plugin itself, added with the diagnostics option. The values are
+# milliseconds, from the summary of PluginStats: "timer.statistic", or "counters" for the text with all counters.
+DIAGNOSTIC_PARAMS = [
+#   MODBUSNAME,        DISPLAY_NAME,               TYPE,           SUBTYPE,                      SWITCHTYPE,                  OPTIONS,              FORMAT,        PREPEND_IDNUM, RST0WAIT FOR3PHASEMODEL, IDNUM, POLLCLASS, UPDATEPOLICY
+    ["connect.p50",    "Plugin Connect Time",      DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;ms"},   "{:.1f}",      None,           False,  False,           250, PollClass.Normal, Policy.Always     ],
+    ["read.p95",       "Plugin Read Time (p95)",   DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;ms"},   "{:.1f}",      None,           False,  False,           251, PollClass.Normal, Policy.Always     ],
+    ["mapping.p95",    "Plugin Mapping Time (p95)",DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;ms"},   "{:.3f}",      None,           False,  False,           252, PollClass.Normal, Policy.Always     ],
+    ["write.p95",      "Plugin Write Time (p95)",  DType.General,  DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;ms"},   "{:.3f}",      None,           False,  False,           253, PollClass.Normal, Policy.Always     ],
+    ["heartbeat.p95",  "Plugin Heartbeat Time (p95)",DType.General,DGeneralSubType.CustomSensor, DSwitchType.General,         {"Custom": "1;ms"},   "{:.3f}",      None,           False,  False,           254, PollClass.Normal, Policy.Always     ],
+    ["counters",       "Plugin Counters",          DType.General,  DGeneralSubType.Text,         DSwitchType.General,         {},                   "{}",          None,           False,  False,           255, PollClass.Normal, Policy.Always     ],
+]
+
+# The Unit numbers no table gives to a device: the ones past the first inverter and between the plant devices.
+RESERVED_UNITS = set(range(1, INVERTER_UNITS + 1))
+RESERVED_UNITS.update(params[Column.IDNUM] for table in (AGGREGATE_PARAMS, DERIVED_PARAMS, DIAGNOSTIC_PARAMS) for params in table)
+FREE_UNITS = tuple(unit for unit in range(1, 256) if unit not in RESERVED_UNITS)
+
+# The Unit number of every device with a DeviceID, by its DeviceID.
+def deviceIDUnits(devices):
+    return {device.DeviceID: unit for unit, device in devices.items() if getattr(device, "DeviceID", "")}
+
+# The first of the FREE_UNITS without a device, None when all are taken.
+def freeUnit(devices):
+    return next((unit for unit in FREE_UNITS if unit not in devices), None)
+
+# Parse the list of inverters from the Address parameter: addresses separated by ',', ';' or spaces,
+# each optionally followed by ':' and the inverter family, e.g. "192.168.1.10, 192.168.1.11:ET".
+# Returns a list of (host, family) tuples, the family is defaultFamily when not given.
+def parseInverterAddresses(text, defaultFamily=""):
+    inverters = []
+    for item in text.replace(";", ",").replace(" ", ",").split(","):
+        if item:
+            host, _, family = item.partition(":")
+            inverters.append((host, family.upper() if family else defaultFamily))
+    return inverters
+
+# Parse the Options parameter: key=value pairs separated by ';', e.g. "aggregates=no;retry_max=900".
+# Keys are case insensitive. Unknown keys are ignored, so options can be added without breaking existing settings.
+class PluginOptions:
+
+    def __init__(self, text=""):
+        self.values = {}
+        for item in (text or "").split(";"):
+            key, _, value = item.partition("=")
+            if key.strip():
+                self.values[key.strip().lower()] = value.strip()
+
+    # Answer the option converted to the type of the default value, or the default when not set or invalid.
+    def get(self, key, default):
+        value = self.values.get(key)
+        if value == None or value == "":
+            return default
+        try:
+            if isinstance(default, bool):
+                return value.lower() in ("1", "yes", "true", "on")
+            if isinstance(default, int):
+                return int(value)
+            if isinstance(default, float):
+                return float(value)
+        except ValueError:
+            return default
+        return value
+
+# Small JSON file next to the plugin which remembers what was detected about each inverter, keyed by host address:
+# the inverter family, model name, serial number and inverterIs3PhaseModel.
+# It is used by the poller thread and the plugin thread, so all access goes through a lock.
+class InverterCache:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(self.path, "r") as file:
+                self._entries = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, host):
+        with self._lock:
+            return dict(self._entries.get(host, {}))
+
+    def update(self, host, **values):
+        with self._lock:
+            entry = self._entries.setdefault(host, {})
+            if all(entry.get(key) == value for key, value in values.items()):
+                return
+            entry.update(values)
+            try:
+                # Write a temporary file and move it in place, so a crash never leaves a half written cache behind.
+                tmpPath = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmpPath, "w") as file:
+                    json.dump(self._entries, file, indent=2)
+                os.replace(tmpPath, self.path)
+            except OSError:
+                pass
+
+# The family name to pass to goodwe.connect() to get the same inverter class again.
+def inverterFamily(inverter):
+    for cls, family in ((goodwe.ET, "ET"), (goodwe.ES, "ES"), (goodwe.DT, "DT")):
+        if isinstance(inverter, cls):
+            return family
+    return None
+
+# The modbus names of the values which are read on every poll.
+# The values kept in the history file by default: the numeric values read by the Fast and Normal polls, in
+# INVERTER_PARAMS order. The history_columns=all option adds the Slow and Static values.
+HISTORY_ALL_COLUMNS = tuple(dict.fromkeys(params[Column.MODBUSNAME] for params in INVERTER_PARAMS if params[Column.SUBTYPE]!=DGeneralSubType.Text))
+HISTORY_COLUMNS = tuple(dict.fromkeys(params[Column.MODBUSNAME] for params in INVERTER_PARAMS
+    if params[Column.SUBTYPE]!=DGeneralSubType.Text and params[Column.POLLCLASS] in (PollClass.Fast, PollClass.Normal)))
+
+# The PollClass of every value in INVERTER_PARAMS, for the export of the values read by a poll.
+EXPORT_POLLCLASSES = {}
+for params in INVERTER_PARAMS:
+    EXPORT_POLLCLASSES.setdefault(params[Column.MODBUSNAME], params[Column.POLLCLASS])
+
+# The values of a poll to export: the values of INVERTER_PARAMS read by the poll, not the ones kept from earlier polls.
+def exportValues(runtime_data, classes):
+    return {name: runtime_data[name] for name, pollClass in EXPORT_POLLCLASSES.items() if pollClass & classes and name in runtime_data}
+
+FAST_MODBUSNAMES = frozenset(params[Column.MODBUSNAME] for params in INVERTER_PARAMS if params[Column.POLLCLASS]==PollClass.Fast)
+
+# A BytesIO which remembers the end of the furthest read, used to find out which bytes of a block the sensors use.
+class ReadTracker(io.BytesIO):
+
+    def __init__(self, length):
+        super().__init__(bytes(length))
+        self.end = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.end = max(self.end, self.tell())
+        return data
+
+# Reads only the registers which hold the Fast values, instead of the complete runtime data block(s).
+# goodwe has no API for partial reads, so this uses the read commands and sensor lists of the goodwe 0.2.x modbus inverter
+# classes (DT and ET families). create() answers None for anything else, then every poll reads the complete runtime data.
+class FastReader:
+
+    # Per inverter class: the read commands of its runtime data blocks and the attributes with the sensors of each block.
+    BLOCKS = (
+        ("ET", (("_READ_RUNNING_DATA", "_sensors"), ("_READ_METER_DATA", "_sensors_meter"))),
+        ("DT", (("_READ_DEVICE_RUNNING_DATA", "_sensors"),)),
+    )
+
+    def __init__(self, inverter, blocks):
+        self.inverter = inverter
+        self.blocks = blocks # (command, sensors) to read and decode
+        self.registers = sum(int.from_bytes(command.request[4:6], "big") for command, sensors in blocks)
+
+    @staticmethod
+    def create(inverter, modbusnames):
+        family = inverterFamily(inverter)
+        candidates = next((blocks for blockFamily, blocks in FastReader.BLOCKS if blockFamily==family), None)
+        if candidates == None:
+            return None
+        blocks = []
+        for commandName, sensorsName in candidates:
+            command = getattr(inverter, commandName, None)
+            sensors = getattr(inverter, sensorsName, None)
+            if not isinstance(command, goodwe.protocol.ModbusReadCommand) or sensors == None:
+                return None
+            fastSensors = tuple(sensor for sensor in sensors if sensor.id_ in modbusnames)
+            if not fastSensors:
+                continue
+            offset = int.from_bytes(command.request[2:4], "big")
+            count = int.from_bytes(command.request[4:6], "big")
+            # Calculated sensors read from other offsets than their own, so decode all of them once from
+            # an empty block and see how far they read.
+            tracker = ReadTracker(count * 2)
+            try:
+                for sensor in fastSensors:
+                    sensor.read(tracker)
+            except Exception:
+                return None
+            registers = min(count, (tracker.end + 1) // 2)
+            blocks.append((goodwe.protocol.ModbusReadCommand(inverter.comm_addr, offset, registers), fastSensors))
+        return FastReader(inverter, blocks) if blocks else None
+
+    async def read(self):
+        data = {}
+        for command, sensors in self.blocks:
+            raw_data = await self.inverter._read_from_socket(command)
+            data.update(self.inverter._map_response(raw_data[5:-2], sensors))
+        return data
+
+# The Domoticz type, subtype and update policy of the names allowed in the extra registers file.
+EXTRA_TYPES = {"general": DType.General, "usage": DType.Usage}
+EXTRA_SUBTYPES = {
+    "temperature": (DGeneralSubType.Temperature, Policy.Temperature),
+    "percentage":  (DGeneralSubType.Percentage,  Policy.Always),
+    "voltage":     (DGeneralSubType.Voltage,     Policy.Voltage),
+    "text":        (DGeneralSubType.Text,        Policy.Always),
+    "current":     (DGeneralSubType.Current,     Policy.Current),
+    "custom":      (DGeneralSubType.CustomSensor,Policy.Always),
+    "electric":    (DUsageSubType.Electric,      Policy.Power), # with type usage: a power meter in W
+}
+EXTRA_POLLCLASSES = {"fast": PollClass.Fast, "normal": PollClass.Normal, "slow": PollClass.Slow, "static": PollClass.Static}
+
+# One value defined in the extra registers file: an integer of one or more holding registers, big endian, times scale.
+# It has the id_, name and unit of a goodwe sensor, so DeviceMapping can use it as one.
+class ExtraRegister:
+    __slots__ = ("id_", "name", "unit", "address", "length", "scale", "signed", "family", "pollClass", "params")
+
+    def __init__(self, definition):
+        self.id_ = str(definition["id"])
+        self.name = str(definition.get("name", self.id_))
+        self.unit = str(definition.get("unit", ""))
+        self.address = int(definition["address"])
+        self.length = int(definition.get("length", 1))
+        self.scale = float(definition.get("scale", 1))
+        self.signed = bool(definition.get("signed", False))
+        self.family = str(definition.get("family", "")).upper() # read from inverters of this family only, or from all
+        if not 0 <= self.address <= 0xffff or not 1 <= self.length <= 4:
+            raise ValueError(f"{self.id_}: the address must be 0-65535 and the length 1-4 registers")
+        self.pollClass = EXTRA_POLLCLASSES[str(definition.get("poll", "normal")).lower()]
+        dtype = definition.get("type", "general")
+        dtype = dtype if isinstance(dtype, int) else EXTRA_TYPES[dtype.lower()]
+        subtype = definition.get("subtype", "custom")
+        if isinstance(subtype, int):
+            policy = Policy.Always
+        else:
+            subtype, policy = EXTRA_SUBTYPES[subtype.lower()]
+        options = {"Custom": f"1;{self.unit}"} if subtype==DGeneralSubType.CustomSensor and dtype==DType.General else {}
+        valueFormat = str(definition.get("format", "{}" if subtype==DGeneralSubType.Text else "{:.2f}"))
+        # An INVERTER_PARAMS row, the IDNUM (the Unit number) is filled in for every inverter, see BasePlugin.extraParams().
+        self.params = [self.id_, self.name, dtype, subtype, int(definition.get("switchtype", DSwitchType.General)), options,
+                       valueFormat, None, False, False, 0, self.pollClass, policy]
+
+    def decode(self, payload, offset):
+        return int.from_bytes(payload[offset:offset + 2 * self.length], "big", signed=self.signed) * self.scale
+
+# Read the extra registers file: a JSON list with an object per value, see the README. Raises ValueError when not valid.
+def loadExtraRegisters(path):
+    with open(path) as file:
+        definitions = json.load(file)
+    registers = []
+    for index, definition in enumerate(definitions):
+        try:
+            registers.append(ExtraRegister(definition))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"entry {index + 1}: {e!r}")
+    ids = [register.id_ for register in registers]
+    duplicates = sorted(set(id_ for id_ in ids if ids.count(id_) > 1))
+    if duplicates:
+        raise ValueError(f"duplicate ids: {', '.join(duplicates)}")
+    return registers
+
+# Merge registers into as few blocks of (first address, register count, registers) as possible: a register joins the
+# current block when at most maxGap unused registers lie in between and the block stays within maxBlock registers.
+def coalesceRegisters(registers, maxGap=8, maxBlock=64):
+    blocks = []
+    for register in sorted(registers, key=lambda register: register.address):
+        end = register.address + register.length
+        if blocks:
+            start, count, members = blocks[-1]
+            if register.address - (start + count) <= maxGap and end - start <= maxBlock:
+                blocks[-1] = (start, max(count, end - start), members + [register])
+                continue
+        blocks.append((register.address, register.length, [register]))
+    return blocks
+
+# Reads the extra registers of one inverter, with one Modbus request per block of coalesceRegisters().
+# Only the modbus families (DT and ET) can be read, create() answers None for the others.
+class ExtraReader:
+
+    def __init__(self, inverter, blocks):
+        self.inverter = inverter
+        self.blocks = blocks # (command, first address, registers, PollClass flags of the registers)
+
+    @staticmethod
+    def create(inverter, registers, maxGap=8, maxBlock=64):
+        family = inverterFamily(inverter)
+        registers = [register for register in registers if register.family in ("", family)]
+        if family not in ("DT", "ET") or not registers:
+            return None
+        blocks = []
+        for start, count, members in coalesceRegisters(registers, maxGap, maxBlock):
+            classes = PollClass(0)
+            for register in members:
+                classes |= register.pollClass
+            blocks.append((goodwe.protocol.ModbusReadCommand(inverter.comm_addr, start, count), start, members, classes))
+        return ExtraReader(inverter, blocks)
+
+    # The values of the registers of the PollClass flags in classes. A block the inverter rejects is left out from
+    # then on, a block that times out is left out of this poll only.
+    async def read(self, classes, log):
+        data = {}
+        for block in list(self.blocks):
+            command, start, members, blockClasses = block
+            if not blockClasses & classes:
+                continue
+            try:
+                raw_data = await self.inverter._read_from_socket(command)
+            except goodwe.exceptions.RequestRejectedException as e:
+                log(f"Inverter rejected the read of the extra registers {', '.join(register.id_ for register in members)} ({e.message}), they are not read anymore.")
+                self.blocks.remove(block)
+                continue
+            except goodwe.exceptions.RequestFailedException:
+                continue
+            payload = raw_data[5:-2]
+            for register in members:
+                if register.pollClass & classes:
+                    data[register.id_] = register.decode(payload, (register.address - start) * 2)
+        return data
+
+# Is the change from the last written value to value too small to write, according to the deadband of policy?
+def withinDeadband(policy, lastValue, value):
+    if not isinstance(value, (int, float)) or not isinstance(lastValue, (int, float)):
+        return False
+    if (value == 0) != (lastValue == 0):
+        return False
+    return abs(value - lastValue) <= max(policy.absolute, policy.relative * abs(lastValue))
+
+# Sunrise and sunset of the day of the Unix time `when`, as Unix times, at latitude/longitude in degrees (east and north positive).
+# Uses the sunrise equation, which is a few minutes off at most. During a polar night sunrise equals sunset, during a polar day
+# they are 24 hours apart.
+def sunTimes(latitude, longitude, when):
+    # Days since 2000-01-01 12:00 UTC of the solar noon closest to when.
+    day = round(when / 86400.0 + 2440587.5 - 2451545.0 + longitude / 360.0) - longitude / 360.0
+    anomaly = math.radians((357.5291 + 0.98560028 * day) % 360)
+    center = 1.9148 * math.sin(anomaly) + 0.0200 * math.sin(2 * anomaly) + 0.0003 * math.sin(3 * anomaly)
+    ecliptic = math.radians((math.degrees(anomaly) + center + 180.0 + 102.9372) % 360)
+    transit = 2451545.0 + day + 0.0053 * math.sin(anomaly) - 0.0069 * math.sin(2 * ecliptic)
+    declination = math.asin(math.sin(ecliptic) * math.sin(math.radians(23.4397)))
+    phi = math.radians(latitude)
+    cosHourAngle = (math.sin(math.radians(-0.833)) - math.sin(phi) * math.sin(declination)) / (math.cos(phi) * math.cos(declination))
+    hourAngle = math.degrees(math.acos(min(1.0, max(-1.0, cosHourAngle))))
+    toUnix = lambda julian: (julian - 2440587.5) * 86400.0
+    return toUnix(transit - hourAngle / 360.0), toUnix(transit + hourAngle / 360.0)
+
+class ReconnectScheduler:
+    # Decides how long to wait before the next connect attempt after a failed one.
+    #
+    # GoodWe inverters switch off (including their Wifi) when the sun is gone, so at night a failure is expected and
+    # retrying every 30 seconds until the morning only fills the log. During the day a failure is more likely a Wifi hiccup.
+    # - Every consecutive failure doubles the delay, starting at baseDelay and capped at maxDelay. A random part of the
+    #   delay (jitter) keeps several inverters, or plugins, from retrying in step.
+    # - The first failure while the inverter was producing in daylight is retried right away.
+    # - With a location configured, the night is spent waiting maxDelay between attempts, but the inverter is tried every
+    #   baseDelay seconds within sunriseWindow seconds of sunrise, to pick it up as soon as it wakes up.
+    # - Without a location the last work_mode tells what is going on: when the inverter was in wait mode (0) before it got
+    #   unavailable it is most likely shutting down for the night, so the delay ramps up faster.
+
+    def __init__(self, baseDelay=30, maxDelay=1800, maxFailures=5, latitude=None, longitude=None, sunriseWindow=3600):
+        self.baseDelay = baseDelay # seconds
+        self.maxDelay = max(maxDelay, baseDelay)
+        self.maxFailures = maxFailures # failed polls in a row before the connection is dropped
+        self.latitude = latitude
+        self.longitude = longitude
+        self.sunriseWindow = sunriseWindow
+        self.jitter = 0.5 # part of the delay which is random
+        self.failures = 0 # failed connect attempts in a row, in the current phase
+        self.phase = None # "night", "sunrise" or "day" of the last failure
+        self.lastWorkMode = None # work_mode of the last successful poll, 0 is wait mode
+        self.random = random.random
+
+    def hasLocation(self):
+        return self.latitude!=None and self.longitude!=None
+
+    def connected(self):
+        self.failures = 0
+        self.phase = None
+
+    # Where the sun is at Unix time now: ("night", next sunrise), ("sunrise", sunrise) or ("day", sunset).
+    def sunPhase(self, now):
+        sunrise, sunset = sunTimes(self.latitude, self.longitude, now)
+        if now > sunset:
+            sunrise, sunset = sunTimes(self.latitude, self.longitude, now + 86400)
+        if abs(now - sunrise) <= self.sunriseWindow and sunset > sunrise:
+            return "sunrise", sunrise
+        if sunrise - self.sunriseWindow < now < sunset:
+            return "day", sunset
+        return "night", sunrise
+
+    # The number of failed polls in a row after which the connection is dropped and the inverter is connected again.
+    # Expect less of an inverter which is shutting down.
+    def maxPollFailures(self, now=None):
+        if self.lastWorkMode==0 or (self.hasLocation() and self.sunPhase(time.time() if now==None else now)[0]=="night"):
+            return min(2, self.maxFailures)
+        return self.maxFailures
+
+    # Register a failed connect attempt and answer (seconds to wait, reason for the log).
+    def nextDelay(self, now=None):
+        now = time.time() if now==None else now
+        phase, sunEvent = self.sunPhase(now) if self.hasLocation() else ("day" if self.lastWorkMode!=0 else "wait mode", None)
+        if phase!=self.phase:
+            self.failures = 0
+            self.phase = phase
+        self.failures += 1
+
+        if phase=="night":
+            # Do not sleep past the start of the sunrise window.
+            delay = min(self.maxDelay, max(self.baseDelay, sunEvent - self.sunriseWindow - now))
+            return delay, "night, sunrise at {}".format(time.strftime("%H:%M", time.localtime(sunEvent)))
+        if phase=="sunrise":
+            return self.jittered(self.baseDelay), "around sunrise"
+        producing = phase=="day" and self.lastWorkMode not in (None, 0)
+        if producing and self.failures==1:
+            return 0, "transient failure while producing"
+        # In wait mode the inverter is most likely shutting down, start 8 times higher.
+        exponent = self.failures - (2 if producing else 1) + (3 if phase=="wait mode" else 0)
+        return self.jittered(min(self.maxDelay, self.baseDelay * 2 ** min(exponent, 16))), f"attempt {self.failures}, {phase}"
+
+    def jittered(self, delay):
+        return delay * (1.0 - self.jitter * self.random())
+
+# Log levels of the messages the poller thread hands over to the plugin thread.
+class LogLevel(IntEnum):
+    DEBUG = 0
+    LOG   = 1
+    ERROR = 2
+
+# The Domoticz log of the plugin. A message is a str.format() template with its arguments, it is only formatted when
+# it is written: debug messages cost no formatting when debugging is off. The same text written again within
+# repeatInterval seconds is not written but counted, flush() writes the count once the interval has passed. Debug
+# messages are always written, they trace every step.
+# Only used from the plugin thread, the poller thread hands its messages over through InverterPoller.messages.
+class PluginLog:
+    MAX_RECENT = 1000 # texts remembered, the ones without repeats are forgotten first
+
+    def __init__(self, repeatInterval=300):
+        self.debugging = False # read by the poller thread too, to not even queue its debug messages
+        self.repeatInterval = repeatInterval # seconds, 0 writes every message
+        self.recent = {} # (LogLevel, text) -> [time.monotonic() written, repeats since]
+        self.repeated = 0 # texts in recent with repeats to write
+
+    def debug(self, message, *args):
+        if self.debugging:
+            self.write(LogLevel.DEBUG, message, args)
+
+    def log(self, message, *args):
+        self.write(LogLevel.LOG, message, args)
+
+    def error(self, message, *args):
+        self.write(LogLevel.ERROR, message, args)
+
+    def write(self, level, message, args=()):
+        text = message.format(*args) if args else message
+        if self.repeatInterval and level != LogLevel.DEBUG:
+            key = (level, text)
+            recent = self.recent.get(key)
+            now = time.monotonic()
+            if recent:
+                if now - recent[0] < self.repeatInterval:
+                    if recent[1] == 0:
+                        self.repeated += 1
+                    recent[1] += 1
+                    return
+                if recent[1]:
+                    self.emit(level, f"{text} (repeated {recent[1]} times in {now - recent[0]:.0f} sec.)")
+                    self.repeated -= 1
+                    recent[:] = [now, 0]
+                    return
+            elif len(self.recent) >= self.MAX_RECENT:
+                self.recent = {key: recent for key, recent in self.recent.items() if recent[1]}
+            self.recent[key] = [now, 0]
+        self.emit(level, text)
+
+    # Write the counts of the repeated messages of which the interval has passed, or of all with everything.
+    def flush(self, everything=False):
+        if not self.repeated:
+            return
+        now = time.monotonic()
+        for key, recent in list(self.recent.items()):
+            if recent[1] and (everything or now - recent[0] >= self.repeatInterval):
+                self.emit(key[0], f"{key[1]} (repeated {recent[1]} times in {now - recent[0]:.0f} sec.)")
+                self.repeated -= 1
+                del self.recent[key]
+
+    def emit(self, level, text):
+        if level == LogLevel.ERROR:
+            Domoticz.Error(text)
+        elif level == LogLevel.LOG:
+            Domoticz.Log(text)
+        else:
+            Domoticz.Debug(text)
+
+pluginLog = PluginLog()
+
+# The Modbus values of every poll, written with the Extra log filter to a file in the Domoticz home folder instead of
+# the Domoticz log. The file is rotated when it grows over maxBytes, backupCount older files are kept.
+class ModbusDump:
+
+    def __init__(self, path, maxBytes=1048576, backupCount=3):
+        self.path = path
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8", delay=True)
+
+    def write(self, logPrefix, sensors, runtime_data):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        lines = "\n".join(f"{stamp} {logPrefix}{sensor.id_}\t{sensor.name} = {runtime_data[sensor.id_]} {sensor.unit}" for sensor in sensors if sensor.id_ in runtime_data)
+        if lines:
+            self.handler.handle(logging.makeLogRecord({"msg": lines}))
+
+    def close(self):
+        self.handler.close()
+
+# The increase of a cumulative counter between two readings. A counter of a known width (modulus) which goes down a
+# lot has wrapped. Any other decrease is only believed when the next reading confirms it: a single low reading is a
+# glitch and is skipped, two in a row mean the counter was reset and counting starts again from the new value.
+class CounterTracker:
+    __slots__ = ("modulus", "last", "suspect")
+
+    def __init__(self, modulus=None, last=None):
+        self.modulus = modulus
+        self.last = last # last accepted reading
+        self.suspect = None # a lower reading waiting for confirmation
+
+    def delta(self, value):
+        last = self.last
+        if last == None:
+            self.last = value
+            return 0.0
+        if value >= last:
+            self.suspect = None
+            self.last = value
+            return value - last
+        if self.modulus and last - value > self.modulus / 2:
+            self.suspect = None
+            self.last = value
+            return value + self.modulus - last
+        if self.suspect != None and value >= self.suspect:
+            # Confirmed reset: what was counted since the reset is new.
+            delta = value - self.suspect
+            self.suspect = None
+            self.last = value
+            return delta
+        self.suspect = value
+        return 0.0
+
+# Energy values derived from the powers and counters of all inverters, updated in O(1) per poll:
+# - the house load: PV + battery discharge - grid export, and its energy since the start
+# - the energy of the PV power today, this hour and the previous hour
+# - the self-consumption ratio today: the part of today's PV energy which was not exported
+# Powers are integrated with the trapezoidal rule. A segment which crosses the start of an hour is split at the hour,
+# with the power there interpolated. No energy is added over gaps longer than maxGap seconds, the plugin or the
+# inverters were down. The export and import come from the meter counters, see CounterTracker.
+# The state is a dictionary of numbers, saved to a JSON file so partial day totals survive a restart.
+class DerivedEnergy:
+    STATE = ("time", "hour", "day", "pv", "house", "houseWh", "pvDayWh", "pvHourWh", "pvLastHourWh", "exportDayWh", "importDayWh", "exportCounter", "importCounter")
+
+    def __init__(self, maxGap=300):
+        self.maxGap = maxGap
+        self.time = None # Unix time of the last sample
+        self.hour = None # Unix time of the start of the local hour of the last sample
+        self.day = None # Unix time of the start of the local day of the last sample
+        self.pv = 0.0 # W at the last sample
+        self.house = None # W at the last sample, None without a meter
+        self.houseWh = 0.0
+        self.pvDayWh = 0.0
+        self.pvHourWh = 0.0
+        self.pvLastHourWh = 0.0
+        self.exportDayWh = 0.0
+        self.importDayWh = 0.0
+        self.exportCounter = CounterTracker()
+        self.importCounter = CounterTracker()
+
+    @staticmethod
+    def hourStart(when):
+        local = time.localtime(when)
+        return time.mktime((local.tm_year, local.tm_mon, local.tm_mday, local.tm_hour, 0, 0, 0, 0, -1))
+
+    @staticmethod
+    def dayStart(when):
+        local = time.localtime(when)
+        return time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+
+    # Add one sample: the total PV power, the house load (None without a meter) in W and the meter counters in kWh (or None).
+    def sample(self, when, pv, house, exportKWh=None, importKWh=None):
+        if self.time != None and 0 < when - self.time <= self.maxGap:
+            hour = self.hourStart(when)
+            if hour > self.time:
+                # Split at the start of the hour.
+                fraction = (hour - self.time) / (when - self.time)
+                pvAtHour = self.pv + (pv - self.pv) * fraction
+                houseAtHour = self.house + (house - self.house) * fraction if self.house != None and house != None else None
+                self.integrate(hour, pvAtHour, houseAtHour)
+                self.rollOver(hour)
+            self.integrate(when, pv, house)
+        else:
+            self.time = when
+            self.pv = pv
+            self.house = house
+            if self.hour != self.hourStart(when):
+                self.rollOver(self.hourStart(when))
+        if exportKWh != None:
+            self.exportDayWh += self.exportCounter.delta(exportKWh) * 1000.0
+        if importKWh != None:
+            self.importDayWh += self.importCounter.delta(importKWh) * 1000.0
+
+    # The inverters are gone: no energy is added between the last sample and the next one.
+    def interrupt(self):
+        self.time = None
+
+    def integrate(self, when, pv, house):
+        hours = (when - self.time) / 3600.0
+        pvWh = (self.pv + pv) / 2 * hours
+        self.pvDayWh += pvWh
+        self.pvHourWh += pvWh
+        if self.house != None and house != None:
+            self.houseWh += (self.house + house) / 2 * hours
+        self.time = when
+        self.pv = pv
+        self.house = house
+
+    # Start a new hour, and a new day when the hour is in another day.
+    def rollOver(self, hour):
+        self.pvLastHourWh = self.pvHourWh if self.hour != None and hour - self.hour <= 3600 else 0.0
+        self.pvHourWh = 0.0
+        self.hour = hour
+        day = self.dayStart(hour)
+        if day != self.day:
+            self.day = day
+            self.pvDayWh = 0.0
+            self.exportDayWh = 0.0
+            self.importDayWh = 0.0
+
+    # The derived values, by the MODBUSNAME of DERIVED_PARAMS. The house load values only when there is a meter.
+    def values(self):
+        values = {
+            "yield_day": self.pvDayWh / 1000.0,
+            "yield_hour": self.pvHourWh / 1000.0,
+            "yield_last_hour": self.pvLastHourWh / 1000.0,
+        }
+        if self.house != None:
+            values["house_load"] = (self.house, self.houseWh)
+        if self.exportCounter.last != None and self.pvDayWh > 0:
+            values["self_consumption"] = min(100.0, max(0.0, 100.0 * (1.0 - self.exportDayWh / self.pvDayWh)))
+        return values
+
+    def state(self):
+        state = {name: getattr(self, name) for name in self.STATE}
+        state["exportCounter"] = state["exportCounter"].last
+        state["importCounter"] = state["importCounter"].last
+        return state
+
+    def restore(self, state):
+        for name in self.STATE:
+            if name in state:
+                setattr(self, name, state[name])
+        self.exportCounter = CounterTracker(last=state.get("exportCounter"))
+        self.importCounter = CounterTracker(last=state.get("importCounter"))
+
+    def load(self, path):
+        try:
+            with open(path, "r") as file:
+                self.restore(json.load(file))
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def save(self, path):
+        try:
+            tmpPath = f"{path}.{os.getpid()}.tmp"
+            with open(tmpPath, "w") as file:
+                json.dump(self.state(), file)
+            os.replace(tmpPath, path)
+        except OSError:
+            pass
+
+# Round trip time estimator of the requests to one inverter, which sets the timeout and retries of its requests.
+# The timeout follows the retransmission timeout of TCP (RFC 6298): the smoothed round trip time plus four times its
+# mean deviation. Requests which needed a retry give no RTT sample (Karn's algorithm), and a request without any
+# answer doubles the timeout until the next clean sample.
+# The loss is a moving average of the part of the attempts which got no answer. The retries are chosen so that all
+# attempts of a request are lost with a chance of at most 1 in 1000, within a time budget, and the poll interval is
+# stretched up to 4 times while the loss is above 10%, to give the Wifi of the inverter some air.
+class RttEstimator:
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    LOSS_GAIN = 1 / 16
+
+    def __init__(self, minTimeout=0.2, maxTimeout=5.0, budget=3.0, log=None):
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.budget = budget # seconds of retries per request
+        self.log = log # function to log changes of the settings with, or None
+        self.srtt = None # seconds
+        self.rttvar = None
+        self.rto = 1.0 # the timeout of a request, 1 second before the first sample like goodwe
+        self.loss = 0.0 # part of the attempts without answer
+        self.retries = 3
+        self.intervalFactor = 1.0
+        self.samples = 0
+        self.logged = None
+
+    # Make the requests of inverter report their round trip time, and use the current timeout and retries.
+    def attach(self, inverter):
+        read = inverter._read_from_socket
+        async def timedRead(command):
+            # Time spent waiting for the lock of another request (of the proxy) is no round trip time.
+            clean = not inverter._ensure_lock().locked()
+            timeout = inverter.timeout
+            started = time.monotonic()
+            try:
+                response = await read(command)
+            except goodwe.exceptions.RequestFailedException:
+                self.lost()
+                self.apply(inverter)
+                raise
+            self.sample(time.monotonic() - started, timeout, clean)
+            self.apply(inverter)
+            return response
+        inverter._read_from_socket = timedRead
+        self.apply(inverter)
+
+    def sample(self, elapsed, timeout, clean=True):
+        attempts = int(elapsed // timeout) + 1 if timeout > 0 else 1
+        self.loss += self.LOSS_GAIN * ((attempts - 1) / attempts - self.loss)
+        if attempts > 1 or not clean:
+            return
+        self.samples += 1
+        if self.srtt == None:
+            self.srtt = elapsed
+            self.rttvar = elapsed / 2
+        else:
+            self.rttvar += self.BETA * (abs(self.srtt - elapsed) - self.rttvar)
+            self.srtt += self.ALPHA * (elapsed - self.srtt)
+        self.rto = min(self.maxTimeout, max(self.minTimeout, self.srtt + max(0.01, 4 * self.rttvar)))
+        self.update()
+
+    # A request without any answer.
+    def lost(self):
+        self.loss += self.LOSS_GAIN * (1.0 - self.loss)
+        self.rto = min(self.maxTimeout, self.rto * 2)
+        self.update()
+
+    def update(self):
+        attempts = math.ceil(math.log(0.001) / math.log(self.loss)) if 0 < self.loss < 1 else 1
+        self.retries = max(2, min(8, attempts - 1, int(self.budget / self.rto)))
+        self.intervalFactor = min(4.0, 1.0 + max(0.0, self.loss - 0.1) * 10)
+
+    def apply(self, inverter):
+        inverter.timeout = self.rto
+        inverter.retries = self.retries
+        settings = (round(self.rto, 2), self.retries, round(self.intervalFactor, 1))
+        if self.log and (settings != self.logged or self.samples % 100 == 0):
+            self.logged = settings
+            self.log(self.describe())
+
+    def describe(self):
+        rtt = f"RTT {self.srtt * 1000:.1f} ms +/- {self.rttvar * 1000:.1f} ms" if self.srtt != None else "no RTT yet"
+        return f"{rtt}, loss {self.loss * 100:.1f}%: timeout {self.rto:.2f} sec., {self.retries} retries, poll interval x{self.intervalFactor:.1f}"
+
+# A rolling window with the last durations (in seconds) of one phase, for the p50/p95/max statistics.
+class RollingTimer:
+    __slots__ = ("samples", "index", "count", "total", "last")
+
+    def __init__(self, size=256):
+        self.samples = [0.0] * size
+        self.index = 0
+        self.count = 0 # all samples since the start, not only the window
+        self.total = 0.0
+        self.last = 0.0
+
+    def add(self, seconds):
+        self.samples[self.index] = seconds
+        self.index = (self.index + 1) % len(self.samples)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def summary(self):
+        window = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not window:
+            return {"count": 0, "sum": 0.0, "last": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        quantile = lambda fraction: window[min(len(window) - 1, int(fraction * len(window)))]
+        return {"count": self.count, "sum": self.total, "last": self.last, "p50": quantile(0.50), "p95": quantile(0.95), "max": window[-1]}
+
+# The phases that are timed and the events that are counted, see PluginStats.
+STAT_TIMERS = ("connect", "read", "mapping", "write", "heartbeat")
+STAT_COUNTERS = ("polls", "timeouts", "failed_polls", "retries", "reconnects", "updates", "suppressed", "overruns", "deferred", "update_overruns", "exported", "dropped")
+
+class PluginStats:
+    # Timings and counters of the hot paths, only created when the diagnostics or stats_file option is set.
+    # Otherwise BasePlugin.stats and InverterConnection.stats are None and nothing is measured.
+    # The poller thread (connect, read, polls, timeouts, failed_polls, retries, reconnects) and the plugin thread (mapping, write,
+    # heartbeat, updates, suppressed, overruns, deferred, update_overruns) each have their own timers and counters, so they need no lock.
+
+    def __init__(self, size=256):
+        self.timers = {name: RollingTimer(size) for name in STAT_TIMERS}
+        self.counters = dict.fromkeys(STAT_COUNTERS, 0)
+        self.startup = {} # seconds from the start of onStart() to its end ("onStart") and to the first device update ("firstUpdate")
+        self.started = time.time()
+
+    def time(self, name, seconds):
+        self.timers[name].add(seconds)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def summary(self):
+        return {
+            "time": round(time.time()),
+            "uptime": round(time.time() - self.started),
+            "timers": {name: timer.summary() for name, timer in self.timers.items()},
+            "counters": dict(self.counters),
+            "startup": dict(self.startup),
+        }
+
+    # The summary in the Prometheus text format, for the textfile collector of the node exporter.
+    def prometheus(self, summary):
+        lines = ["# HELP goodwe_plugin_phase_seconds Duration of the plugin phases, over the last samples.",
+                 "# TYPE goodwe_plugin_phase_seconds summary"]
+        for name, timer in summary["timers"].items():
+            for quantile in ("p50", "p95"):
+                lines.append(f'goodwe_plugin_phase_seconds{{phase="{name}",quantile="0.{quantile[1:]}"}} {timer[quantile]:.6f}')
+            lines.append(f'goodwe_plugin_phase_seconds_sum{{phase="{name}"}} {timer["sum"]:.6f}')
+            lines.append(f'goodwe_plugin_phase_seconds_count{{phase="{name}"}} {timer["count"]}')
+        lines.append("# TYPE goodwe_plugin_phase_seconds_max gauge")
+        for name, timer in summary["timers"].items():
+            lines.append(f'goodwe_plugin_phase_seconds_max{{phase="{name}"}} {timer["max"]:.6f}')
+        for name, value in summary["counters"].items():
+            lines.append(f"# TYPE goodwe_plugin_{name}_total counter")
+            lines.append(f"goodwe_plugin_{name}_total {value}")
+        lines.append("# TYPE goodwe_plugin_startup_seconds gauge")
+        for name, value in summary["startup"].items():
+            lines.append(f'goodwe_plugin_startup_seconds{{phase="{name}"}} {value:.6f}')
+        return "\n".join(lines) + "\n"
+
+    # Write the summary to path, as Prometheus text when the name ends with .prom and as JSON otherwise.
+    def write(self, path, summary):
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as file:
+            if path.endswith(".prom"):
+                file.write(self.prometheus(summary))
+            else:
+                json.dump(summary, file, indent=2)
+        os.replace(tmpPath, path)
+
+class InverterConnection:
+    # The connection to one inverter. It is only used from the poller thread, except for the snapshot.
+    #
+    # Every successful poll is published by replacing self.snapshot with a new (sequence, inverter, runtime_data) tuple.
+    # Replacing a reference is atomic in Python, so onHeartbeat can pick up the latest snapshot without taking a lock.
+
+    def __init__(self, host, family, interval, messages, cache=None, logPrefix="", scheduler=None):
+        self.host = host
+        self.family = family
+        self.interval = interval # Seconds between two polls
+        self.messages = messages # queue of the poller, the Domoticz API may only be used from the plugin thread
+        self.logPrefix = logPrefix
+        self.cache = cache # InverterCache with what we learned about the inverter on an earlier connect, or None
+        self.familySource = None # Where the family of the last connect came from: "configured", "cache" or "auto-detect"
+        self.cachedFamilyFailures = 0
+        self.cachedFamilyMaxFailures = 3
+        self.connectStarted = None
         self.inverter = None # holds the inverter communication class
-        self.inverterIs3PhaseModel = True # Is the inverter singlephase or 3 phase?
-        self.add_devices = False # Add devices automaticly
+        self.snapshot = None # (sequence, inverter, runtime_data, PollClass flags of the fresh values) of the last successful poll
+        self.runtimeData = {} # all values read since the connect, the Fast polls only replace part of them
+        self.fastReader = None # FastReader for the current inverter, or None to read everything on every poll
+        self.extraRegisters = [] # ExtraRegister definitions to read besides the runtime data
+        self.extraGap = 8 # registers, see coalesceRegisters()
+        self.extraBlock = 64
+        self.extraReader = None # ExtraReader for the current inverter, None when there are no extra registers to read
+        self.cycle = 0 # number of polls since the connect
+        self.normalEvery = 1 # read Normal values every normalEvery polls
+        self.slowEvery = 1 # read Slow values every slowEvery polls, a multiple of normalEvery
 
         # GoodWe inverters are likely to completely shutdown when the sun is gone. They will become unavailable after that.
-        # We would like to retry to connect every now and then. lastconnectfailuretime holds the last known time when the connection was lost.
-        # retrydelay (in msec) is the time we wait before retrying to connect to the inverter.
+        # We would like to retry to connect every now and then. retryAt holds the time (time.monotonic()) of the next attempt,
+        # the scheduler decides how long to wait, see ReconnectScheduler.
         # This also applies when the connection to the inverter is lost due to networking problems, such as the Wifi connection being unstable.
         # (GoodWe inverters are known to have a unstable Wifi plug)
-        self.lastconnectfailuretime=None
-        self.retrydelay=30000 # 30 seconds.
-        self.connectionFailureCountOnHeartbeat=0
-        self.connectionFailureMaxCountOnHeartbeat=5
+        self.scheduler = scheduler if scheduler else ReconnectScheduler()
+        self.retryAt=None
+        self.connectionFailureCount=0
+        self.connects = 0 # successful connects since the start
 
-    def onStart(self):
-        self.add_devices = bool(Parameters["Mode1"])
-        Domoticz.Heartbeat(int(Parameters["Mode2"]))
-        if Parameters["Mode5"] == "Debug":
-            Domoticz.Debugging(1)
-        else:
-            Domoticz.Debugging(0)
-        Domoticz.Debug(
-            "onStart Address: {} Port: {}".format(
-                Parameters["Address"],
-                Parameters["Port"]
-            )
-        )
+        self.stats = None # PluginStats to record the timings and counters in, None when disabled
+        self.history = None # history.HistoryStore to append every poll to, None when disabled
+        self.exporter = None # export.LineProtocolExporter to hand every poll to, None when disabled
+        self.proxySettings = None # (bind address, UDP port, TCP port, max age) of the Modbus proxy, None for no proxy
+        self.proxy = None # proxy.ModbusProxy, created by the poller thread from proxySettings
+        self.rtt = None # RttEstimator which sets the timeout and retries of the requests, None for the goodwe defaults
+        self.capture = None # capture.CaptureWriter to mark the start of every poll in, set by the poller thread
+        self.failed = False # the poller thread could not start, e.g. the goodwe library is missing or broken
+
+        self._sequence = 0
+
+    # The messages are formatted by the plugin thread, see PluginLog.
+    def log(self, message, *args):
+        self.messages.put((LogLevel.LOG, self.logPrefix + message, args))
+
+    def debug(self, message, *args):
+        if pluginLog.debugging:
+            self.messages.put((LogLevel.DEBUG, self.logPrefix + message, args))
 
-        self.connectToInverter()
-        self.readFromInverter()
+    def error(self, message, *args):
+        self.messages.put((LogLevel.ERROR, self.logPrefix + message, args))
 
-    def connectToInverter(self):
+    # Hand the runtime data over to the plugin thread. values are the ones read by this poll, runtime_data also holds
+    # those of earlier polls: only values go to the history, the others were not measured now.
+    def publish(self, runtime_data, classes=PollClass.All, values=None):
+        if runtime_data.get("work_mode")!=None:
+            self.scheduler.lastWorkMode = runtime_data["work_mode"]
+        self._sequence += 1
+        self.snapshot = (self._sequence, self.inverter, runtime_data, classes)
+        if self.history:
+            try:
+                self.history.append(time.time(), runtime_data if values == None else values)
+            except (OSError, ValueError) as e:
+                self.error(f"Cannot write the history, history disabled: {e}")
+                self.history = None
+        if self.exporter:
+            self.exporter.add({"host": self.host, "serial": getattr(self.inverter, "serial_number", None)}, exportValues(runtime_data, classes), time.time())
+
+    # Set how often the Normal and Slow values are read, in seconds. The Fast values are read every poll interval.
+    def setPollIntervals(self, normalInterval, slowInterval):
+        self.normalEvery = max(1, round(normalInterval / self.interval))
+        self.slowEvery = max(1, round(slowInterval / self.interval / self.normalEvery)) * self.normalEvery
+
+    # The PollClass flags of the values to read in a poll. Static values are only read by the first poll after a connect.
+    def pollClasses(self, cycle):
+        classes = PollClass.Fast
+        if cycle % self.normalEvery == 0:
+            classes |= PollClass.Normal
+            if cycle % self.slowEvery == 0:
+                classes |= PollClass.Slow
+        return classes
+
+    # One poll: read the runtime data, or (re)connect when there is no connection.
+    async def poll(self):
+        if self.capture:
+            self.capture.poll(self.host)
+        try:
+            if self.inverter:
+                await self.pollInverter()
+            else:
+                await self.readFromInverter()
+        except Exception as e:
+            # Never let the poller thread die, start over with a fresh connection after the retry delay.
+            self.error(f"Unexpected error while communicating with the inverter: {e!r}")
+            self.inverter = None
+            self.scheduleRetry()
+
+    async def connectToInverter(self):
         self.inverter = None
-        try:    
-            famStr=Parameters["Mode3"]
-            host=Parameters["Address"]
+        self.connectStarted = time.monotonic()
+
+        # Without a configured family goodwe probes every family in turn, which takes many seconds and a burst of UDP traffic.
+        # Try the family we detected before at this address first, and only fall back to auto detection when it does not match.
+        family = self.family
+        self.familySource = "configured" if family!="" else "auto-detect"
+        cached = self.cache.get(self.host) if self.cache and family=="" else None
+        if cached and cached.get("family"):
+            family = cached["family"]
+            self.familySource = "cache"
+
+        try:
+            famStr=family
             if famStr=="":
                 famStr="Auto. (Setting family to your inverters family spec, speeds up the wait time to connect)"
-            Domoticz.Log(f"Connecting to inverter. Host: {host}, Port: 8899, Family: {famStr}.")
-            self.inverter =  asyncio.run( goodwe.connect(host=host, family=Parameters["Mode3"], retries=3) )
+            elif self.familySource=="cache":
+                famStr=f"{family} (detected earlier)"
+            self.log(f"Connecting to inverter. Host: {self.host}, Port: 8899, Family: {famStr}.")
+            try:
+                self.inverter = await goodwe.connect(host=self.host, family=family, **self.requestSettings())
+            except goodwe.exceptions.RequestRejectedException:
+                if self.familySource!="cache":
+                    raise
+                self.forgetCachedFamily(f"The inverter rejected the requests of the cached family {family}")
+            if self.inverter and self.familySource=="cache" and cached.get("serial_number") not in (None, self.inverter.serial_number):
+                self.inverter = None
+                self.forgetCachedFamily(f"The serial number does not match the cached inverter {cached.get('model_name')}")
+            if self.inverter==None and self.familySource=="auto-detect":
+                self.inverter = await goodwe.connect(host=self.host, family="", **self.requestSettings())
         except goodwe.RequestFailedException as e:
-            Domoticz.Error(f"Request failed: Cannot connect to inverter: {e.message}") 
-            famStr=Parameters["Mode3"]
-            if Parameters["Mode3"]!="":
-                Domoticz.Error(f"If this problem persists, please check if your family model ({famStr}) is correct for your inverter and check your network connections.") 
+            if self.stats:
+                self.stats.count("timeouts")
+            self.error(f"Request failed: Cannot connect to inverter: {e.message}")
+            if self.familySource=="configured":
+                self.error(f"If this problem persists, please check if your family model ({self.family}) is correct for your inverter and check your network connections.")
+            elif self.familySource=="cache":
+                # No answer at all is most likely a sleeping inverter, so keep the cached family for a while.
+                self.cachedFamilyFailures += 1
+                if self.cachedFamilyFailures >= self.cachedFamilyMaxFailures:
+                    self.forgetCachedFamily(f"{self.cachedFamilyFailures} connection attempts with the cached family {family} failed")
+
+        except goodwe.InverterError as e:
+            self.error(f"Cannot connect to inverter: {e}")
 
         except ConnectionException as e:
-            Domoticz.Error(f"Cannot connect to inverter: {e.string}") 
-        
-        if self.inverter!=None: 
-            Domoticz.Log(f"Connected to inverter model: {self.inverter.model_name}")
+            self.error(f"Cannot connect to inverter: {e.string}")
+
+        if self.inverter!=None:
+            self.log(f"Connected to inverter model: {self.inverter.model_name}")
+            if self.rtt:
+                self.rtt.attach(self.inverter)
+            self.cachedFamilyFailures = 0
+            if self.cache:
+                self.cache.update(self.host,
+                    family=inverterFamily(self.inverter),
+                    model_name=self.inverter.model_name,
+                    serial_number=self.inverter.serial_number)
         return self.inverter!=None
 
-    def onHeartbeat(self):
-        Domoticz.Debug("Heartbeat")
-        if self.inverter:
-            runtime_data = None
-            try:
-                runtime_data = asyncio.run( self.inverter.read_runtime_data() )
-                self.connectionFailureCountOnHeartbeat=0
-            except (ConnectionException, goodwe.exceptions.RequestFailedException) as e:
-                runtime_data = None
-                self.connectionFailureCountOnHeartbeat=self.connectionFailureCountOnHeartbeat+1
-                Domoticz.Log(f"Connection failure #{self.connectionFailureCountOnHeartbeat}/{self.connectionFailureMaxCountOnHeartbeat}")
-                if self.connectionFailureCountOnHeartbeat>=self.connectionFailureMaxCountOnHeartbeat:
-                    # We have 5 connection failure's in a row. Lets forget the inverter connection completely, this will
-                    # cause a reconnect in the next call to onHeartbeat and start its own retry mechanism if needed.
-                    Domoticz.Error(f"{self.connectionFailureCountOnHeartbeat} connection failures have occured. Disconnecting from inverter and try to reconnect in a moment.")
-                    self.connectionFailureCountOnHeartbeat=0
-                    self.inverter=None
-            else:
-                # Yaay! We have a working connection with the GoodWe inverter and have read some data from it.    
-                if runtime_data:
-                    updated = 0
-                    device_count = 0
-                    # Log all modbus values when enabled:
-                    if "Mode5" in Parameters and Parameters["Mode5"] == "Extra":
-                        for sensor in self.inverter.sensors():
-                            if sensor.id_ in runtime_data:                        
-                                Domoticz.Log(f"Modbus sensor '{sensor.id_}': \t\t {sensor.name} = {runtime_data[sensor.id_]} {sensor.unit}")
-
-                    
-                    for unit in INVERTER_PARAMS: # Iterate through our lookup table INVERTER_PARAMS
-                        if unit[Column.IDNUM] in Devices: # Find the device in the Domoticz devices list
-                            for sensor in self.inverter.sensors(): # Iterate and find the modbusname in the inverter.sensors
-                                if sensor.id_==unit[Column.MODBUSNAME]:                        
-                                    # Now we read the value and debuglog it.
-                                    value = runtime_data[unit[Column.MODBUSNAME]]
-                                    Domoticz.Debug(f"Processing '{sensor.id_}': Value {sensor.name} = {format(value)} {sensor.unit}.")
-                                    
-                                    if unit[Column.SWITCHTYPE]==DSwitchType.EnergyGenerated: # The value has been returned by the GoodWe library in kWh, but needs to be Wh for Domoticz
-                                        value=value*1000.0
-                                    
-                                    if unit[Column.RST0WAIT]==True and value!=0 and runtime_data["work_mode"]==0: # 0=Wait mode, 1=Normal: ppv, ppv1, ppv2,.... and more values looks nice to be reset to 0 instead of leaving the last known value.
-                                        # if wait mode, then force al current power generated 'DType.Usage' numbers to 0
-                                        Domoticz.Debug(f"Wait mode is engaged, enforcing {sensor.name} from {format(value)} to 0 {sensor.unit}.")
-                                        value=0
-
-                                    # Store the value in Domoticz.
-                                    # Some devices need multiple values, we will supply them.
-                                    if unit[Column.PREPEND_IDNUM]:
-                                        prepend = Devices[unit[Column.PREPEND_IDNUM]].sValue
-                                        sValue = unit[Column.FORMAT].format(prepend, value)
-                                    else:
-                                        sValue = unit[Column.FORMAT].format(value)
-                                    Domoticz.Debug("Update value = {}".format(sValue))
-
-                                    # Store the value when changed.
-                                    if sValue != Devices[unit[Column.IDNUM]].sValue:
-                                        Devices[unit[Column.IDNUM]].Update(nValue=0, sValue=str(sValue), TimedOut=0)
-                                        updated += 1
-
-                                    device_count += 1
-                        else:
-                            # Suppress device not found logs for singlephase model, as these are expected to be not present
-                            if unit[Column.FOR3PHASEMODEL]==False or self.inverterIs3PhaseModel==True:
-                                Domoticz.Debug(f"Device '{unit[Column.MODBUSNAME]}' not found.")
-
-                    Domoticz.Log("Updated {} values out of {}".format(updated, device_count))
-                else:
-                    Domoticz.Log("Inverter returned no information")
+    # The timeout and retries for goodwe.connect().
+    def requestSettings(self):
+        if self.rtt:
+            return {"timeout": self.rtt.rto, "retries": self.rtt.retries}
+        return {"timeout": 1, "retries": 3}
 
-        # Try to contact the inverter
-        else:
-            self.readFromInverter()
+    # The cached family does not fit the inverter (anymore), remove it so auto detection is used.
+    def forgetCachedFamily(self, reason):
+        self.log(f"{reason}. Detecting the inverter family again.")
+        self.cache.update(self.host, family=None)
+        self.familySource = "auto-detect"
+        self.cachedFamilyFailures = 0
 
+    async def pollInverter(self):
+        self.cycle += 1
+        classes = self.pollClasses(self.cycle)
+        stats = self.stats
+        if stats:
+            started = time.perf_counter()
+        try:
+            if classes==PollClass.Fast and self.fastReader:
+                try:
+                    values = await self.fastReader.read()
+                except goodwe.exceptions.RequestRejectedException as e:
+                    self.log(f"Inverter rejected the read of the fast values ({e.message}), reading all values on every poll.")
+                    self.fastReader = None
+                    values = await self.inverter.read_runtime_data()
+            else:
+                values = await self.inverter.read_runtime_data()
+            if self.extraReader:
+                values.update(await self.extraReader.read(classes, self.log))
+            self.connectionFailureCount=0
+        except (ConnectionException, goodwe.exceptions.RequestFailedException) as e:
+            self.connectionFailureCount=self.connectionFailureCount+1
+            connectionFailureMaxCount = self.scheduler.maxPollFailures()
+            self.log(f"Connection failure #{self.connectionFailureCount}/{connectionFailureMaxCount}")
+            if stats and isinstance(e, goodwe.exceptions.RequestFailedException):
+                stats.count("timeouts")
+            if self.connectionFailureCount>=connectionFailureMaxCount:
+                # Too many connection failure's in a row. Lets forget the inverter connection completely, this will
+                # cause a reconnect in the next poll and start its own retry mechanism if needed.
+                self.error(f"{self.connectionFailureCount} connection failures have occured. Disconnecting from inverter and try to reconnect in a moment.")
+                self.connectionFailureCount=0
+                self.inverter=None
+            elif stats:
+                stats.count("failed_polls")
+        else:
+            if stats:
+                stats.time("read", time.perf_counter() - started)
+                stats.count("polls")
+            if values:
+                # Never change a published dictionary, the plugin thread may be reading it.
+                runtime_data = dict(self.runtimeData)
+                runtime_data.update(values)
+                self.runtimeData = runtime_data
+                self.publish(runtime_data, classes, values)
+            else:
+                self.log("Inverter returned no information")
 
-    
-    # Contact the inverter and find out if its a 3 phase or singlephase inverter    
-    def readFromInverter(self):
+    # Contact the inverter, (re)connecting when needed, and publish the first runtime data.
+    async def readFromInverter(self):
         # Backoff from the inverter when it did not respond in the previous attempt to contact it.
-        if self.lastconnectfailuretime==None or millis() - self.lastconnectfailuretime>self.retrydelay:
+        if self.retryAt==None or time.monotonic()>=self.retryAt:
             runtime_data = None
+            stats = self.stats
             try:
                 if self.inverter==None:
-                    if self.connectToInverter()==False:
+                    if stats:
+                        started = time.perf_counter()
+                    connected = await self.connectToInverter()
+                    if stats:
+                        stats.time("connect", time.perf_counter() - started)
+                    if connected==False:
                          raise ConnectionException("Unable to contact inverter")
-                runtime_data=asyncio.run( self.inverter.read_runtime_data() )
+                    if self.proxy:
+                        self.proxy.attach(self.inverter)
+                if stats:
+                    started = time.perf_counter()
+                runtime_data=await self.inverter.read_runtime_data()
+                if stats:
+                    stats.time("read", time.perf_counter() - started)
                 if runtime_data==None:
                     raise ConnectionException("Unable read data from inverter")
-                self.lastconnectfailuretime=None
-            except ConnectionException as e:
+                self.retryAt=None
+            except (ConnectionException, goodwe.exceptions.RequestFailedException) as e:
                 # There are multiple reasons why this may fail.
                 # - The inverter is in sleepmode
                 # - Perhaps the ip address or port are incorrect.
                 # - The inverter may not be connected to the network,
                 # - The inverter may be turned off.
-                # - The inverter has a bad dhcpday.                
+                # - The inverter has a bad dhcpday.
                 # Try again in the future. Remember the time of the faillure.
 
-                self.lastconnectfailuretime=millis()
-                runtime_data = None
+                self.inverter = None
+                if stats and isinstance(e, goodwe.exceptions.RequestFailedException):
+                    stats.count("timeouts")
 
-                Domoticz.Log("Connection Exception \"{}\" when trying to contact: {}:{}".format(e.string, Parameters["Address"], Parameters["Port"]))
-                Domoticz.Log("Retrying to communicate with inverter after: {} sec.".format(self.retrydelay/1000.0))
+                reason = e.string if isinstance(e, ConnectionException) else e.message
+                self.log("Connection Exception \"{}\" when trying to contact: {}:8899".format(reason, self.host))
+                self.scheduleRetry()
 
             else:
                 if runtime_data:
-                    Domoticz.Log("Connection established with: {}:{}".format(Parameters["Address"], Parameters["Port"]))
- 
-                    # Find out if its a 3 phase or single phase model.
-                    if self.inverter:
-                        self.inverterIs3PhaseModel=False
-                        # We have 2 ways of 3 phase determination: 
-                        # 1: A fixed series list, named: THREEPHASE_SERIES 
-                        # 2: Look into the modbus data for known 3 phase values and decide on that
-                        # In the future we might add a 3rd way, by model name, if needed.
-                        for iSerie in THREEPHASE_SERIES: # Iterate through our lookup table THREEPHASE_SERIES and see if the model name ends with our known 3 phase serie names
-                            if self.inverter.model_name.endswith(f"-{iSerie}"):
-                                self.inverterIs3PhaseModel=True
-                                break
-                        if self.inverterIs3PhaseModel==False:
-                            for unit in INVERTER_PARAMS:
-                                if unit[Column.FOR3PHASEMODEL]==True:
-                                    if unit[Column.MODBUSNAME] in runtime_data.keys() and abs(runtime_data[unit[Column.MODBUSNAME]])>0.1:
-                                        self.inverterIs3PhaseModel=True
-                                        break
-
-                        # Add devices if enabled and if needed.
-                        if self.add_devices:
-                            for sensor in self.inverter.sensors():
-                                if sensor.id_ in runtime_data:                        
-                                    if sensor.id_ not in Devices:
-                                        for unit in INVERTER_PARAMS:
-                                            if unit[Column.MODBUSNAME]==sensor.id_:
-                                                value = runtime_data[unit[Column.MODBUSNAME]]
-
-                                                # If the value is for the 3 phase model only and the inverter is single phase, then do not add the value to Domoticz as that would be useless and take up space that is just waste.
-                                                if self.inverterIs3PhaseModel==False and unit[Column.FOR3PHASEMODEL]==True:
-                                                    Domoticz.Debug(f"Single phase model detected. Not creating Domoticz device for {sensor.name} value {format(value)} {sensor.unit}.")
-                                                    continue
-
-                                                Domoticz.Device(
-                                                    Unit=unit[Column.IDNUM],
-                                                    Name=unit[Column.DISPLAYNAME],
-                                                    Type=unit[Column.TYPE],
-                                                    Subtype=unit[Column.SUBTYPE],
-                                                    Switchtype=unit[Column.SWITCHTYPE],
-                                                    Options=unit[Column.OPTIONS],
-                                                    Used=1,
-                                                ).Create()
-
+                    self.scheduler.connected()
+                    self.connects += 1
+                    if stats:
+                        stats.count("polls")
+                        if self.connects > 1:
+                            stats.count("reconnects")
+                    self.log("Connection established with: {}:8899".format(self.host))
+                    self.log("Time to first data: {:.2f} sec. (Inverter family: {})".format(time.monotonic() - self.connectStarted, self.familySource))
+                    self.runtimeData = runtime_data
+                    self.cycle = 0
+                    self.fastReader = FastReader.create(self.inverter, FAST_MODBUSNAMES) if self.normalEvery > 1 else None
+                    if self.fastReader:
+                        self.debug("Fast values are read with {} registers per poll.", self.fastReader.registers)
+                    self.extraReader = ExtraReader.create(self.inverter, self.extraRegisters, self.extraGap, self.extraBlock)
+                    if self.extraReader:
+                        self.debug("Extra registers are read with {} requests.", len(self.extraReader.blocks))
+                        runtime_data.update(await self.extraReader.read(PollClass.All, self.log))
+                    self.publish(runtime_data)
                 else:
-                    Domoticz.Log("Connection established with: {}:{}. Inverter returned no information".format(Parameters["Address"], Parameters["Port"]))
-                    Domoticz.Log("Retrying to communicate with inverter after: {}".format(millis() - self.lastconnectfailuretime + self.retrydelay))
+                    self.log("Connection established with: {}:8899. Inverter returned no information".format(self.host))
+                    self.scheduleRetry()
+        else:
+            self.debug("Retrying to communicate with inverter after: {:.1f} sec.", self.retryAt - time.monotonic())
+
+    # Backoff from the inverter after a failed attempt to contact it, for as long as the scheduler tells.
+    def scheduleRetry(self):
+        delay, reason = self.scheduler.nextDelay()
+        self.retryAt = time.monotonic() + delay
+        self.log("Retrying to communicate with inverter after: {:.1f} sec. ({})".format(delay, reason))
+
+    # Seconds to wait before the next poll, given the time the last poll started.
+    def pollDelay(self, started):
+        if self.inverter==None and self.retryAt!=None:
+            return self.retryAt - time.monotonic()
+        interval = self.interval * self.rtt.intervalFactor if self.rtt else self.interval
+        return interval - (time.monotonic() - started)
+
+
+class InverterPoller:
+    # The poller owns the inverter connections and runs a single, long lived asyncio event loop on its own thread.
+    # It polls the inverters on its own schedule, so the Domoticz plugin thread never has to wait on the network (or on the goodwe retries).
+    # Every inverter is polled by its own task on that loop, all tasks run concurrently (asyncio.gather), so a slow or
+    # sleeping inverter does not delay the polls of the others.
+    # The Domoticz API may only be used from the plugin thread, so log messages are queued in self.messages and written by the plugin.
+
+    def __init__(self):
+        self.connections = []
+        self.messages = queue.SimpleQueue() # (LogLevel, message, args) tuples, see PluginLog.write(),, to be logged by the plugin thread
+        self._loop = None
+        self._stopEvent = None
+        self._thread = None
+        self.captureSettings = None # (path, plugin parameters) of the capture file, None for no capture
+        self.recorder = None # capture.CaptureRecorder, created by the poller thread from captureSettings
+        self.stats = None # PluginStats to count the retransmissions of goodwe in, or None
+        self.retransmissions = None # the goodwe method replaced to count them, restored at the end
+
+    def addInverter(self, host, family, interval, cache=None, logPrefix="", scheduler=None):
+        connection = InverterConnection(host, family, interval, self.messages, cache, logPrefix, scheduler)
+        self.connections.append(connection)
+        return connection
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="GoodWePoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Wake up the poll loops and wait for them to finish. A pending goodwe request is cancelled by the loop shutdown.
+        if self._loop and self._stopEvent:
+            self._loop.call_soon_threadsafe(self._stopEvent.set)
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self):
+        try:
+            importInverterLibraries()
+        except Exception as e:
+            # Without the libraries there is nothing to poll, tell it in the Domoticz log instead of only on stderr.
+            for connection in self.connections:
+                connection.failed = True
+            self.messages.put((LogLevel.ERROR, f"Cannot load the goodwe and pymodbus libraries, no inverter will be read: {e!r}", ()))
+            return
+        self._countRetransmissions()
+        self._startCapture()
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._stopEvent = asyncio.Event()
+            self._loop.run_until_complete(self._startProxies())
+            self._loop.run_until_complete(asyncio.gather(*(self._pollLoop(connection) for connection in self.connections)))
+        finally:
+            for connection in self.connections:
+                if connection.proxy:
+                    connection.proxy.close()
+                    connection.proxy = None
+                connection.capture = None
+            if self.recorder:
+                self.recorder.close()
+                self.recorder = None
+            if self.retransmissions:
+                goodwe.protocol.UdpInverterProtocol._send_request = self.retransmissions
+                self.retransmissions = None
+            self._loop.close()
+
+    # Count every request goodwe sends again, after a timeout or an invalid response, as a retry.
+    def _countRetransmissions(self):
+        if self.stats:
+            send = self.retransmissions = goodwe.protocol.UdpInverterProtocol._send_request
+            stats = self.stats
+            def countingSend(protocol):
+                if protocol._retries:
+                    stats.count("retries")
+                send(protocol)
+            goodwe.protocol.UdpInverterProtocol._send_request = countingSend
+
+    # Record the frames of all requests to the capture file, see capture.py.
+    def _startCapture(self):
+        if self.captureSettings:
+            import capture
+            path, parameters = self.captureSettings
+            try:
+                self.recorder = capture.CaptureRecorder(capture.CaptureWriter(path, parameters))
+            except (OSError, capture.CaptureError) as e:
+                self.messages.put((LogLevel.ERROR, f"Cannot write the capture file {path}: {e}", ()))
+                return
+            self.recorder.install()
+            for connection in self.connections:
+                connection.capture = self.recorder.writer
+            self.messages.put((LogLevel.LOG, f"Capturing the inverter traffic to {path}", ()))
+
+    # The Modbus proxies run on the loop of the poller, so their reads are serialized with the polls.
+    async def _startProxies(self):
+        for connection in self.connections:
+            if connection.proxySettings:
+                import proxy
+                bind, udpPort, tcpPort, maxAge = connection.proxySettings
+                connection.proxy = proxy.ModbusProxy(connection, bind, udpPort, tcpPort, maxAge, connection.log)
+                try:
+                    await connection.proxy.start()
+                except OSError as e:
+                    connection.error(f"Cannot start the Modbus proxy on {bind}: {e}")
+                    connection.proxy = None
+
+    async def _sleep(self, seconds):
+        # Sleep, but return early when the poller is asked to stop.
+        try:
+            await asyncio.wait_for(self._stopEvent.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _pollLoop(self, connection):
+        while not self._stopEvent.is_set():
+            started = time.monotonic()
+            await connection.poll()
+            await self._sleep(connection.pollDelay(started))
+
+
+class InverterSlot:
+    # The Domoticz side of one inverter: what we found out about it and the devices of its values.
+    # Only used from the plugin thread.
+
+    def __init__(self, connection, index):
+        self.connection = connection
+        self.host = connection.host
+        self.index = index # position in the Address parameter, the first inverter has the IDNUMs as Unit numbers
+        self.inverter = None # the inverter of the last applied snapshot
+        self.inverterIs3PhaseModel = True # Is the inverter singlephase or 3 phase?
+        self.lastSnapshotSequence = 0 # sequence number of the last applied snapshot
+        self.deviceMappings = [] # compiled DeviceMapping entries of the existing devices, see compileDeviceMappings()
+        self.aggregateValues = {} # last values of the AGGREGATE_PARAMS modbus names, as written to the devices
+        self.warmValues = {} # values written before the last restart, from the cache, see BasePlugin.applyWarmValues()
+        self.runtimeData = None # runtime data of the last applied snapshot, None while the poller has no connection
+        self.runtimeDataAt = None # BasePlugin.now when runtimeData was applied
+
+
+class BasePlugin:
+
+    def __init__(self):
+        self.poller = None # holds the inverter poller, which talks to the inverters on its own thread
+        self.slots = [] # InverterSlot of every configured inverter
+        self.add_devices = False # Add devices automaticly
+        self.aggregates = False # Add devices with the totals of all inverters
+        self.aggregateMappings = [] # compiled DeviceMapping entries of the existing aggregate devices
+        self.cache = None # InverterCache, shared with the poller
+        self.options = PluginOptions()
+        self.policies = {} # the UpdatePolicy to use for each Policy preset, with the Options applied
+        self.now = time.monotonic() # time of the current heartbeat
+        self.updatesIssued = 0 # device writes since the start
+        self.updatesSuppressed = 0 # changes not written because of the update policies since the start
+        self.stats = None # PluginStats, when the diagnostics or stats_file option is set
+        self.statsPath = None # file to write the stats to
+        self.statsInterval = 60 # seconds between two writes of the stats file and diagnostic devices
+        self.statsFlushAt = 0.0 # time.monotonic() of the next write
+        self.heartbeatBudget = 0.1 # seconds, a longer heartbeat counts as an overrun
+        self.diagnosticMappings = [] # compiled DeviceMapping entries of the existing diagnostic devices
+        self.pendingUpdates = {} # Unit -> [sequence, DeviceMapping, sValue, heartbeat] of the updates not written yet, see flushUpdates()
+        self.updateSequence = 0 # sequence number of the next new pending update
+        self.heartbeatCount = 0 # heartbeats since the start
+        self.updateBudget = 0.05 # seconds per heartbeat for the device writes, 0 for no limit
+        self.updateMax = 0 # device writes per heartbeat, 0 for no limit
+        self.updatesDeferred = 0 # pending updates carried over to a next heartbeat since the start
+        self.updateOverruns = 0 # heartbeats that ran out of the update budget since the start
+        self.startTime = None # time.monotonic() at the start of onStart(), until the first device update
+        self.exporter = None # export.LineProtocolExporter, when the export option is set
+        self.derived = None # DerivedEnergy, unless the derived option is off
+        self.derivedPath = None # file with the state of self.derived
+        self.derivedSaveAt = 0.0 # time.monotonic() of the next save of the state
+        self.derivedMappings = [] # compiled DeviceMapping entries of the existing derived devices
+        self.dump = None # ModbusDump, with the Extra log filter
+
+    def onStart(self):
+        self.startTime = time.monotonic()
+        self.add_devices = bool(Parameters["Mode1"])
+        Domoticz.Heartbeat(int(Parameters["Mode2"]))
+        if Parameters["Mode5"] == "Debug":
+            Domoticz.Debugging(1)
         else:
-            Domoticz.Log("Retrying to communicate with inverter after: {} sec.".format( (self.retrydelay - (millis() - self.lastconnectfailuretime)) / 1000.0))
+            Domoticz.Debugging(0)
+        pluginLog.debugging = Parameters["Mode5"] == "Debug"
+        pluginLog.debug(
+            "onStart Address: {} Port: {}",
+            Parameters["Address"],
+            Parameters["Port"]
+        )
+        self.options = PluginOptions(Parameters.get("Mode6", ""))
+        pluginLog.repeatInterval = max(0, self.options.get("log_repeat", 300))
+
+        inverters = parseInverterAddresses(Parameters["Address"], Parameters["Mode3"])
+        self.aggregates = len(inverters) > 1 and self.options.get("aggregates", True)
+        self.compilePolicies()
+
+        homeFolder = Parameters.get("HomeFolder", os.path.dirname(os.path.abspath(__file__)))
+        self.cache = InverterCache(os.path.join(homeFolder, "inverter_cache.json"))
+        self.setupStats(homeFolder)
+        if Parameters["Mode5"] == "Extra":
+            self.dump = ModbusDump(os.path.join(homeFolder, self.options.get("dump_file", "goodwe_modbus.log")),
+                maxBytes=self.options.get("dump_size", 1024) * 1024, backupCount=self.options.get("dump_count", 3))
+            pluginLog.log("The Modbus values are written to {}", self.dump.path)
+        self.poller = InverterPoller()
+        self.poller.stats = self.stats
+        if self.options.get("capture", ""):
+            # With the inverter cache entries, a replay connects the same way: with the cached family or by detecting it.
+            parameters = {key: Parameters.get(key, "") for key in ("Address", "Mode2", "Mode3", "Mode6")}
+            parameters["cache"] = {host: self.cache.get(host) for host, family in inverters}
+            self.poller.captureSettings = (os.path.join(homeFolder, self.options.get("capture", "")), parameters)
+        self.slots = []
+        self.exporter = self.openExporter(homeFolder) if self.options.get("export", "") else None
+        latitude, longitude = self.location()
+        extraRegisters = self.loadExtraRegisters(homeFolder)
+        for index, (host, family) in enumerate(inverters):
+            scheduler = ReconnectScheduler(
+                baseDelay=self.options.get("retry_delay", 30),
+                maxDelay=self.options.get("retry_max", 1800),
+                maxFailures=self.options.get("max_failures", 5),
+                latitude=latitude, longitude=longitude,
+                sunriseWindow=self.options.get("sunrise_window", 3600))
+            connection = self.poller.addInverter(host, family, int(Parameters["Mode2"]), self.cache, f"{host}: " if len(inverters) > 1 else "", scheduler)
+            connection.stats = self.stats
+            connection.exporter = self.exporter
+            connection.extraRegisters = extraRegisters
+            connection.extraGap = self.options.get("registers_gap", 8)
+            connection.extraBlock = min(125, self.options.get("registers_block", 64))
+            udpPort, tcpPort = self.options.get("proxy_udp", 0), self.options.get("proxy_tcp", 0)
+            if udpPort or tcpPort:
+                # Every inverter gets its own ports: the configured ones plus its index.
+                connection.proxySettings = (self.options.get("proxy_bind", "127.0.0.1"), udpPort and udpPort + index, tcpPort and tcpPort + index,
+                    self.options.get("proxy_max_age", max(5, connection.interval)))
+            connection.setPollIntervals(self.options.get("normal_interval", 5), self.options.get("slow_interval", 300))
+            if self.options.get("adaptive_timeout", True):
+                connection.rtt = RttEstimator(
+                    minTimeout=self.options.get("min_timeout", 0.2),
+                    maxTimeout=self.options.get("max_timeout", 5.0),
+                    budget=max(2.0, connection.interval / 2),
+                    log=connection.debug)
+            slot = InverterSlot(connection, index)
+            slot.warmValues = self.cache.get(host).get("values", {})
+            self.slots.append(slot)
+            if self.options.get("history", False):
+                connection.history = self.openHistory(homeFolder, host, connection.interval)
+        self.compileAggregates()
+        self.compileDiagnostics()
+        if self.options.get("derived", True):
+            self.derived = DerivedEnergy(maxGap=max(300, 5 * int(Parameters["Mode2"])))
+            self.derivedPath = os.path.join(homeFolder, "derived_energy.json")
+            self.derived.load(self.derivedPath)
+            self.derivedSaveAt = self.startTime + 300
+        self.compileDerived()
+        self.poller.start()
+
+        # Connecting, detecting the family and the first read are done by the poller, the devices are created and
+        # updated by the first heartbeat after that. Nothing here waits for the inverter.
+        started = time.monotonic() - self.startTime
+        pluginLog.debug("onStart took {:.1f} ms", started * 1000.0)
+        if self.stats:
+            self.stats.startup["onStart"] = started
+
+    # Measure the timings and counters when the diagnostics devices or a stats file are asked for.
+    def setupStats(self, homeFolder):
+        statsFile = self.options.get("stats_file", "")
+        self.statsPath = os.path.join(homeFolder, statsFile) if statsFile else None
+        self.stats = PluginStats() if self.statsPath or self.options.get("diagnostics", False) else None
+        self.statsInterval = max(1, self.options.get("stats_interval", 60))
+        self.statsFlushAt = time.monotonic() + self.statsInterval
+        self.heartbeatBudget = self.options.get("heartbeat_budget", 100) / 1000.0
+        self.updateBudget = max(0, self.options.get("update_budget", 50)) / 1000.0
+        self.updateMax = max(0, self.options.get("update_max", 0))
+
+    # The definitions of the registers file option, see loadExtraRegisters(). An empty list when not set or not valid.
+    def loadExtraRegisters(self, homeFolder):
+        registersFile = self.options.get("registers", "")
+        if not registersFile:
+            return []
+        path = os.path.join(homeFolder, registersFile)
+        try:
+            registers = loadExtraRegisters(path)
+        except (OSError, ValueError) as e:
+            pluginLog.error(f"Cannot read the extra registers from {path}: {e}")
+            return []
+        pluginLog.debug("{} extra registers, read with {} requests.", len(registers), len(coalesceRegisters(registers, self.options.get("registers_gap", 8), min(125, self.options.get("registers_block", 64)))))
+        return registers
+
+    # The DeviceID of the device of the INVERTER_PARAMS row params of slot, for the inverters after the first. The
+    # IDNUM tells the rows apart, two rows can have the same modbus name.
+    def inverterDeviceID(self, slot, params):
+        return f"{INVERTER_DEVICEID}{slot.host}:{params[Column.IDNUM]}"
+
+    # The Unit numbers of the existing devices of the inverter of slot, by INVERTER_PARAMS IDNUM. The first inverter
+    # has the IDNUMs as Unit numbers, the devices of the others are found by their DeviceID, see inverterDeviceID().
+    # The devices of a second inverter of before keep the IDNUMs plus LEGACY_UNIT_OFFSET, when of the same type.
+    def inverterUnits(self, slot):
+        if slot.index == 0:
+            return {params[Column.IDNUM]: params[Column.IDNUM] for params in INVERTER_PARAMS if params[Column.IDNUM] in Devices}
+        deviceUnits = deviceIDUnits(Devices)
+        units = {}
+        for params in INVERTER_PARAMS:
+            unit = deviceUnits.get(self.inverterDeviceID(slot, params))
+            if unit == None and slot.index == 1:
+                device = Devices.get(LEGACY_UNIT_OFFSET + params[Column.IDNUM])
+                if (device != None and not str(getattr(device, "DeviceID", "")).startswith((INVERTER_DEVICEID, EXTRA_DEVICEID))
+                        and device.Type == params[Column.TYPE] and device.SubType == params[Column.SUBTYPE]):
+                    unit = LEGACY_UNIT_OFFSET + params[Column.IDNUM]
+            if unit != None:
+                units[params[Column.IDNUM]] = unit
+        return units
+
+    # The DeviceID of the device of an extra register of slot. The first inverter keeps the plain register id.
+    def extraDeviceID(self, slot, register):
+        return EXTRA_DEVICEID + (f"{slot.host}:" if slot.index else "") + register.id_
+
+    # The INVERTER_PARAMS rows of the extra registers of slot, with the Unit number of their device as IDNUM, 0 for
+    # none. A device belongs to a register by its DeviceID, whatever its Unit number, so the order of the registers
+    # file does not matter. A device of another type than its register is left alone.
+    def extraParams(self, slot):
+        deviceUnits = deviceIDUnits(Devices)
+        rows = []
+        for register in slot.connection.extraRegisters:
+            unit = deviceUnits.get(self.extraDeviceID(slot, register), 0)
+            device = Devices.get(unit)
+            if device != None and (device.Type != register.params[Column.TYPE] or device.SubType != register.params[Column.SUBTYPE]):
+                pluginLog.error(f"{slot.connection.logPrefix}The device '{device.Name}' of the extra register {register.id_} has another type than the register. Remove it to read this register.")
+                unit = 0
+            rows.append(register.params[:Column.IDNUM] + [unit] + register.params[Column.IDNUM + 1:])
+        return rows
+
+    # The history file of the inverter at host, see history.py. None when it cannot be created.
+    def openHistory(self, homeFolder, host, interval):
+        import history
+        columnOption = self.options.get("history_columns", "")
+        if columnOption == "all":
+            columns = HISTORY_ALL_COLUMNS
+        elif columnOption:
+            columns = tuple(column.strip() for column in columnOption.split(","))
+        else:
+            columns = HISTORY_COLUMNS
+        retention = {tier: self.options.get(f"history_{tier}", seconds) for tier, seconds in history.RETENTION.items()}
+        path = os.path.join(homeFolder, f"history_{host}.bin")
+        try:
+            return history.HistoryStore(path, columns, interval, retention)
+        except (OSError, ValueError) as e:
+            pluginLog.error(f"Cannot open the history file {path}: {e}")
+            return None
+
+    # The exporter to the target of the export option, see export.py. None when the target is not valid.
+    def openExporter(self, homeFolder):
+        import export
+        messages = self.poller.messages
+        try:
+            sink = export.openSink(self.options.get("export", ""), homeFolder)
+        except ValueError as e:
+            pluginLog.error(str(e))
+            return None
+        return export.LineProtocolExporter(sink,
+            measurement=self.options.get("export_measurement", "goodwe"),
+            batchSize=self.options.get("export_batch", 500),
+            flushInterval=self.options.get("export_interval", 10),
+            queueSize=self.options.get("export_queue", 10000),
+            retryDelay=self.options.get("retry_delay", 30),
+            log=lambda message: messages.put((LogLevel.LOG, message, ())),
+            error=lambda message: messages.put((LogLevel.ERROR, message, ())))
+
+    # The location for the sunrise and sunset times of the reconnect scheduler: the latitude and longitude options,
+    # or else the location in the Domoticz settings. (None, None) when neither is set.
+    def location(self):
+        latitude, longitude = self.options.get("latitude", ""), self.options.get("longitude", "")
+        if latitude=="" and longitude=="":
+            latitude, _, longitude = str(globals().get("Settings", {}).get("Location", "")).partition(";")
+        try:
+            return float(latitude), float(longitude)
+        except ValueError:
+            return None, None
+
+    def onStop(self):
+        if self.poller:
+            self.poller.stop()
+        self.flushUpdates(budget=False)
+        if self.exporter:
+            self.exporter.close()
+            self.exporter = None
+        self.writePollerMessages()
+        pluginLog.flush(everything=True)
+        self.poller = None
+        if self.dump:
+            self.dump.close()
+            self.dump = None
+        for slot in self.slots:
+            if slot.connection.history:
+                slot.connection.history.close()
+                slot.connection.history = None
+
+        if self.derived:
+            self.derived.save(self.derivedPath)
+
+        # Remember the values written to the devices, for applyWarmValues() after the restart.
+        if self.cache:
+            for slot in self.slots:
+                values = {entry.modbusname: entry.lastValue for entry in slot.deviceMappings if isinstance(entry.lastValue, (int, float, str))}
+                if values:
+                    self.cache.update(slot.host, values=values)
+
+    # Write the log messages queued by the poller thread to the Domoticz log.
+    def writePollerMessages(self):
+        if self.poller:
+            messages = self.poller.messages
+            while not messages.empty():
+                level, message, args = messages.get_nowait()
+                pluginLog.write(level, message, args)
+
+    def onHeartbeat(self):
+        pluginLog.debug("Heartbeat")
+        self.now = time.monotonic()
+        self.heartbeatCount += 1
+        self.writePollerMessages()
+        pluginLog.flush()
+        if self.poller == None:
+            return
+
+        if self.stats:
+            self.updateDevicesTimed()
+            if self.now >= self.statsFlushAt:
+                self.flushStats()
+        else:
+            self.updateAllDevices()
+
+    # updateAllDevices() with the heartbeat time and overruns recorded.
+    def updateDevicesTimed(self):
+        started = time.perf_counter()
+        self.updateAllDevices()
+        elapsed = time.perf_counter() - started
+        self.stats.time("heartbeat", elapsed)
+        if elapsed > self.heartbeatBudget:
+            self.stats.count("overruns")
+
+    # Apply the latest poll results of all inverters to the devices.
+    def updateAllDevices(self):
+        updated = False
+        dropped = False
+        for slot in self.slots:
+            if slot.runtimeData != None and slot.connection.inverter == None:
+                # The poller dropped the connection, the last values of the inverter are stale.
+                slot.runtimeData = None
+                dropped = True
+            # Pick up the latest poll result. The poller replaces the snapshot as a whole, we never wait for it.
+            snapshot = slot.connection.snapshot
+            if snapshot == None or snapshot[0] == slot.lastSnapshotSequence:
+                continue
+            sequence, inverter, runtime_data, classes = snapshot
+            # runtime_data holds the latest of all values. When polls were missed, their classes have to be applied too.
+            if sequence != slot.lastSnapshotSequence + 1:
+                classes = PollClass.All
+            slot.lastSnapshotSequence = sequence
+
+            # A new inverter instance means the poller has (re)connected. Find out what we are talking to.
+            if inverter is not slot.inverter:
+                slot.inverter = inverter
+                self.discoverDevices(slot, runtime_data)
+                classes = PollClass.All
+
+            self.updateDevices(slot, runtime_data, classes)
+            slot.runtimeData = runtime_data
+            slot.runtimeDataAt = self.now
+            updated = True
+
+        if updated and self.aggregates:
+            self.updateAggregates()
+
+        if (updated or dropped) and self.derived:
+            self.updateDerived()
+
+        self.flushUpdates()
+
+        if updated and self.startTime != None:
+            started = time.monotonic() - self.startTime
+            pluginLog.log("Time from start to the first device update: {:.2f} sec.", started)
+            if self.stats:
+                self.stats.startup["firstUpdate"] = started
+            self.startTime = None
+
+    def updateDevices(self, slot, runtime_data, classes=PollClass.All):
+        updated = 0
+        device_count = 0
+        suppressed = self.updatesSuppressed
+        if self.stats:
+            started = time.perf_counter()
+        # Write all modbus values to the dump file when enabled:
+        if self.dump:
+            self.dump.write(slot.connection.logPrefix, slot.inverter.sensors(), runtime_data)
+
+        waitMode = runtime_data["work_mode"]==0 # 0=Wait mode, 1=Normal
+        for entry in slot.deviceMappings:
+            # Only apply the values which have been read in this poll.
+            if not entry.pollClass & classes:
+                continue
+            device_count += 1
+
+            # Now we read the value and debuglog it. An extra register may not have been read (yet).
+            value = runtime_data.get(entry.modbusname)
+            if value == None:
+                continue
+            pluginLog.debug("Processing '{}': Value {} = {} {}.", entry.modbusname, entry.name, value, entry.sensorUnit)
+
+            if entry.scale:
+                value=value*entry.scale
+
+            if entry.rst0wait and value!=0 and waitMode: # ppv, ppv1, ppv2,.... and more values looks nice to be reset to 0 instead of leaving the last known value.
+                # if wait mode, then force al current power generated 'DType.Usage' numbers to 0
+                pluginLog.debug("Wait mode is engaged, enforcing {} from {} to 0 {}.", entry.name, value, entry.sensorUnit)
+                value=0
+
+            if self.updateDevice(entry, value):
+                updated += 1
+
+        if self.stats:
+            self.stats.time("mapping", time.perf_counter() - started)
+
+        if self.aggregates:
+            for params in AGGREGATE_PARAMS:
+                modbusname = params[Column.MODBUSNAME]
+                if modbusname in runtime_data:
+                    value = runtime_data[modbusname]
+                    if params[Column.SWITCHTYPE]==DSwitchType.EnergyGenerated:
+                        value=value*1000.0
+                    if modbusname=="ppv" and waitMode:
+                        value=0
+                    slot.aggregateValues[modbusname] = value
+
+        if self.policies:
+            pluginLog.log("{}Updated {} values out of {}, {} changes suppressed (since start: {} updates, {} suppressed, {} deferred)",
+                slot.connection.logPrefix, updated, device_count, self.updatesSuppressed - suppressed, self.updatesIssued, self.updatesSuppressed, self.updatesDeferred)
+        else:
+            pluginLog.log("{}Updated {} values out of {}", slot.connection.logPrefix, updated, device_count)
+
+    # Queue the value of a compiled device mapping for Domoticz, when changed and allowed by its update policy.
+    # A value queued before and not written yet is replaced, flushUpdates() writes the latest value of every Unit.
+    # Returns True when the device will be updated.
+    def updateDevice(self, entry, value):
+        # Some devices need multiple values, we will supply them. The value of the other device may still be queued.
+        if entry.prependUnit:
+            pending = self.pendingUpdates.get(entry.prependUnit)
+            sValue = entry.format(pending[2] if pending else Devices[entry.prependUnit].sValue, value)
+        else:
+            sValue = entry.format(value)
+        pluginLog.debug("Update value of Unit {} ({}) = {}", entry.unit, entry.name, sValue)
+
+        device = Devices[entry.unit]
+        pending = self.pendingUpdates.get(entry.unit)
+        if sValue == (pending[2] if pending else device.sValue):
+            return False
+        if pending and sValue == device.sValue:
+            # Changed back before it was written, nothing to write anymore.
+            del self.pendingUpdates[entry.unit]
+            entry.lastValue = value
+            return False
+
+        # Every write is a write to the Domoticz database, skip the noise.
+        policy = entry.policy
+        if policy and entry.lastUpdate != None:
+            elapsed = self.now - entry.lastUpdate
+            if elapsed < policy.minInterval or (elapsed < policy.maxInterval and withinDeadband(policy, entry.lastValue, value)):
+                self.updatesSuppressed += 1
+                return False
+
+        if pending:
+            pending[2] = sValue # keeps its place in the queue
+        else:
+            self.pendingUpdates[entry.unit] = [self.updateSequence, entry, sValue, self.heartbeatCount]
+            self.updateSequence += 1
+        entry.lastValue = value
+        entry.lastUpdate = self.now
+        return True
+
+    # Write the pending updates to the devices, within the update_budget milliseconds and update_max writes of one
+    # heartbeat. Power rows go first and the diagnostic devices last, in the order they were queued. What does not fit
+    # is carried over to the next heartbeat; an update moves up one priority for every heartbeat it waited, so the
+    # power rows cannot hold back the others for long. At least one update is written every heartbeat.
+    def flushUpdates(self, budget=True):
+        pending = self.pendingUpdates
+        if not pending:
+            return
+        heartbeat = self.heartbeatCount
+        order = sorted(pending.values(), key=lambda update: (update[1].priority - (heartbeat - update[3]), update[0]))
+        deadline = time.perf_counter() + self.updateBudget
+        written = 0
+        for sequence, entry, sValue, queuedAt in order:
+            if budget and written and ((self.updateMax and written >= self.updateMax) or (self.updateBudget and time.perf_counter() >= deadline)):
+                self.updateOverruns += 1
+                self.updatesDeferred += len(pending)
+                if self.stats:
+                    self.stats.count("update_overruns")
+                    self.stats.count("deferred", len(pending))
+                break
+            del pending[entry.unit]
+            device = Devices.get(entry.unit)
+            if device == None:
+                continue
+            if self.stats:
+                started = time.perf_counter()
+                device.Update(nValue=0, sValue=sValue, TimedOut=0)
+                self.stats.time("write", time.perf_counter() - started)
+            else:
+                device.Update(nValue=0, sValue=sValue, TimedOut=0)
+            written += 1
+            self.updatesIssued += 1
+
+    # Apply the deadband and update interval Options to the Policy presets.
+    def compilePolicies(self):
+        self.policies = {}
+        scale = self.options.get("deadband_scale", 1.0) if self.options.get("deadband", True) else 0.0
+        minInterval = self.options.get("min_update_interval", -1)
+        maxInterval = self.options.get("max_update_interval", -1)
+        for preset in (getattr(Policy, name) for name in dir(Policy) if not name.startswith("_")):
+            policy = UpdatePolicy(
+                absolute=preset.absolute * scale,
+                relative=preset.relative * scale,
+                minInterval=minInterval if minInterval >= 0 else preset.minInterval,
+                maxInterval=maxInterval if maxInterval >= 0 else preset.maxInterval)
+            if policy.absolute or policy.relative or policy.minInterval:
+                self.policies[id(preset)] = policy
+
+    def resolvePolicy(self, preset):
+        return self.policies.get(id(preset))
+
+    # Update the devices with the totals of all inverters.
+    # Only when every inverter has reported a value since the start, otherwise the totals would jump down and up again.
+    def updateAggregates(self):
+        for entry in self.aggregateMappings:
+            values = [slot.aggregateValues.get(entry.modbusname) for slot in self.slots]
+            if None not in values:
+                self.updateDevice(entry, sum(values))
+
+    # Feed the latest values of all inverters to the DerivedEnergy engine and update the derived devices.
+    def updateDerived(self):
+        pv = 0.0
+        battery = 0.0
+        grid = exportKWh = importKWh = None
+        current = 0
+        for slot in self.slots:
+            data = slot.runtimeData
+            # Skip the inverters without a connection or without a poll for longer than the gap the engine bridges.
+            if not data or self.now - slot.runtimeDataAt > self.derived.maxGap:
+                continue
+            current += 1
+            if data.get("work_mode") != 0: # the power of the last poll before wait mode is stale
+                pv += data.get("ppv", 0)
+            battery += data.get("pbattery1", 0) # W, discharging is positive
+            if "active_power_total" in data: # W, export is positive
+                grid = (grid or 0) + data["active_power_total"]
+            if "meter_e_total_exp" in data:
+                exportKWh = (exportKWh or 0) + data["meter_e_total_exp"]
+                importKWh = (importKWh or 0) + data.get("meter_e_total_imp", 0)
+        if current:
+            self.derived.sample(time.time(), pv, pv + battery - grid if grid != None else None, exportKWh, importKWh)
+        else:
+            self.derived.interrupt()
+        values = self.derived.values()
+
+        if self.add_devices and any(params[Column.MODBUSNAME] in values and params[Column.IDNUM] not in Devices for params in DERIVED_PARAMS):
+            for params in DERIVED_PARAMS:
+                if params[Column.MODBUSNAME] in values and params[Column.IDNUM] not in Devices:
+                    self.createDevice(params, params[Column.IDNUM], params[Column.DISPLAYNAME])
+            self.compileDerived()
+        for entry in self.derivedMappings:
+            value = values.get(entry.modbusname)
+            if value != None:
+                self.updateDevice(entry, value)
+
+        if self.now >= self.derivedSaveAt:
+            self.derivedSaveAt = self.now + 300
+            self.derived.save(self.derivedPath)
+
+    # Compile the sensor to device mapping, this needs to be redone when the inverter or the set of devices changes.
+    def compileDevices(self, slot):
+        slot.deviceMappings, missing = compileDeviceMappings(slot.inverter.sensors(), Devices, slot.inverterIs3PhaseModel, self.inverterUnits(slot), self.resolvePolicy)
+        if slot.connection.extraRegisters:
+            extraMappings, extraMissing = compileDeviceMappings(slot.connection.extraRegisters, Devices, slot.inverterIs3PhaseModel, None, self.resolvePolicy, self.extraParams(slot))
+            slot.deviceMappings += extraMappings
+            missing += extraMissing
+        for modbusname in missing:
+            pluginLog.debug("{}Device '{}' not found.", slot.connection.logPrefix, modbusname)
+        if slot.warmValues:
+            self.applyWarmValues(slot)
+
+    # The devices still show the values written before the restart. Start the update policies from those values,
+    # so the first poll after a restart only writes what really changed instead of every device.
+    def applyWarmValues(self, slot):
+        for entry in slot.deviceMappings:
+            value = slot.warmValues.get(entry.modbusname)
+            if value != None and entry.lastValue == None and Devices[entry.unit].sValue != "":
+                entry.lastValue = value
+                entry.lastUpdate = self.now
+        slot.warmValues = {}
+
+    def compileAggregates(self):
+        self.aggregateMappings = []
+        if not self.aggregates:
+            return
+        for params in AGGREGATE_PARAMS:
+            if params[Column.IDNUM] not in Devices and self.add_devices:
+                self.createDevice(params, params[Column.IDNUM], params[Column.DISPLAYNAME])
+            if params[Column.IDNUM] in Devices and (params[Column.PREPEND_IDNUM]==None or params[Column.PREPEND_IDNUM] in Devices):
+                self.aggregateMappings.append(DeviceMapping(PlantSensor(params), params, None, self.resolvePolicy(params[Column.UPDATEPOLICY])))
+
+    def compileDerived(self):
+        self.derivedMappings = []
+        if not self.derived:
+            return
+        for params in DERIVED_PARAMS:
+            if params[Column.IDNUM] in Devices:
+                self.derivedMappings.append(DeviceMapping(PlantSensor(params), params, None, self.resolvePolicy(params[Column.UPDATEPOLICY])))
+
+    def compileDiagnostics(self):
+        self.diagnosticMappings = []
+        if not self.stats or not self.options.get("diagnostics", False):
+            return
+        for params in DIAGNOSTIC_PARAMS:
+            if params[Column.IDNUM] not in Devices and self.add_devices:
+                self.createDevice(params, params[Column.IDNUM], params[Column.DISPLAYNAME])
+            if params[Column.IDNUM] in Devices:
+                entry = DeviceMapping(PlantSensor(params), params)
+                entry.priority = UpdatePriority.Diagnostic
+                self.diagnosticMappings.append(entry)
+
+    # Write the stats file and the diagnostic devices.
+    def flushStats(self):
+        self.statsFlushAt = self.now + self.statsInterval
+        self.stats.counters["updates"] = self.updatesIssued
+        self.stats.counters["suppressed"] = self.updatesSuppressed
+        if self.exporter:
+            self.stats.counters["exported"] = self.exporter.sent
+            self.stats.counters["dropped"] = self.exporter.dropped
+        summary = self.stats.summary()
+        if self.statsPath:
+            try:
+                self.stats.write(self.statsPath, summary)
+            except OSError as e:
+                pluginLog.error(f"Cannot write the stats file {self.statsPath}: {e}")
+                self.statsPath = None
+        for entry in self.diagnosticMappings:
+            timer, _, statistic = entry.modbusname.partition(".")
+            if statistic:
+                self.updateDevice(entry, summary["timers"][timer][statistic] * 1000.0)
+            else:
+                self.updateDevice(entry, ", ".join(f"{name}: {value}" for name, value in summary["counters"].items()))
+
+    def onDeviceRemoved(self, Unit):
+        self.pendingUpdates.pop(Unit, None)
+        for slot in self.slots:
+            if slot.inverter:
+                self.compileDevices(slot)
+        self.compileAggregates()
+        self.compileDiagnostics()
+        self.compileDerived()
+
+    def createDevice(self, params, unit, name, deviceID=""):
+        Domoticz.Device(
+            Unit=unit,
+            Name=name,
+            Type=params[Column.TYPE],
+            Subtype=params[Column.SUBTYPE],
+            Switchtype=params[Column.SWITCHTYPE],
+            Options=params[Column.OPTIONS],
+            Used=1,
+            DeviceID=deviceID,
+        ).Create()
+
+    # Find out if its a 3 phase or singlephase inverter and add the missing devices.
+    def discoverDevices(self, slot, runtime_data):
+        # Find out if its a 3 phase or single phase model.
+        slot.inverterIs3PhaseModel=False
+        # We have 2 ways of 3 phase determination:
+        # 1: A fixed series list, named: THREEPHASE_SERIES
+        # 2: Look into the modbus data for known 3 phase values and decide on that
+        # In the future we might add a 3rd way, by model name, if needed.
+        for iSerie in THREEPHASE_SERIES: # Iterate through our lookup table THREEPHASE_SERIES and see if the model name ends with our known 3 phase serie names
+            if slot.inverter.model_name.endswith(f"-{iSerie}"):
+                slot.inverterIs3PhaseModel=True
+                break
+        if slot.inverterIs3PhaseModel==False:
+            for unit in INVERTER_PARAMS:
+                if unit[Column.FOR3PHASEMODEL]==True:
+                    if unit[Column.MODBUSNAME] in runtime_data.keys() and abs(runtime_data[unit[Column.MODBUSNAME]])>0.1:
+                        slot.inverterIs3PhaseModel=True
+                        break
+        # The 3 phase values are all 0 while the inverter is not producing, so once detected we remember it for this inverter.
+        if self.cache:
+            cached = self.cache.get(slot.host)
+            if slot.inverterIs3PhaseModel==False and cached.get("serial_number")==slot.inverter.serial_number and cached.get("inverterIs3PhaseModel")==True:
+                slot.inverterIs3PhaseModel=True
+            self.cache.update(slot.host, inverterIs3PhaseModel=slot.inverterIs3PhaseModel)
+
+        # Add devices if enabled and if needed.
+        if self.add_devices:
+            sensorsById = {sensor.id_: sensor for sensor in slot.inverter.sensors()}
+            units = self.inverterUnits(slot)
+            unitsLeft = True
+            for unit in INVERTER_PARAMS:
+                sensor = sensorsById.get(unit[Column.MODBUSNAME])
+                if sensor and sensor.id_ in runtime_data:
+                    if unit[Column.IDNUM] not in units:
+                        value = runtime_data[unit[Column.MODBUSNAME]]
+
+                        # If the value is for the 3 phase model only and the inverter is single phase, then do not add the value to Domoticz as that would be useless and take up space that is just waste.
+                        if slot.inverterIs3PhaseModel==False and unit[Column.FOR3PHASEMODEL]==True:
+                            pluginLog.debug("Single phase model detected. Not creating Domoticz device for {} value {} {}.", sensor.name, value, sensor.unit)
+                            continue
+
+                        # With more than one inverter, tell the devices apart by the inverter address.
+                        name = unit[Column.DISPLAYNAME]
+                        if len(self.slots) > 1:
+                            name = f"{name} ({slot.host})"
+                        if slot.index == 0:
+                            self.createDevice(unit, unit[Column.IDNUM], name)
+                            continue
+                        freeUnitNumber = freeUnit(Devices)
+                        if freeUnitNumber == None:
+                            if unitsLeft:
+                                pluginLog.error(f"{slot.connection.logPrefix}No Unit number left for the device '{name}' and the ones after it, the devices of all inverters share the 255 Unit numbers of the hardware.")
+                                unitsLeft = False
+                            continue
+                        self.createDevice(unit, freeUnitNumber, name, self.inverterDeviceID(slot, unit))
+            deviceUnits = deviceIDUnits(Devices)
+            for register in slot.connection.extraRegisters:
+                deviceID = self.extraDeviceID(slot, register)
+                if register.id_ in runtime_data and deviceID not in deviceUnits:
+                    unit = freeUnit(Devices)
+                    if unit == None:
+                        pluginLog.error(f"{slot.connection.logPrefix}No Unit number left for the device of the extra register {register.id_}.")
+                        break
+                    name = register.name
+                    if len(self.slots) > 1:
+                        name = f"{name} ({slot.host})"
+                    self.createDevice(register.params, unit, name, deviceID)
+
+        self.compileDevices(slot)
+
+
+# The aggregate devices have no sensor of an inverter, this provides the metadata DeviceMapping needs.
+class PlantSensor:
+    def __init__(self, params):
+        self.id_ = params[Column.MODBUSNAME]
+        self.name = params[Column.DISPLAYNAME]
+        self.unit = ""
 
 
 # Instantiate the plugin and register the supported callbacks.
@@ -460,10 +2378,18 @@ def onStart():
     global _plugin
     _plugin.onStart()
 
+def onStop():
+    global _plugin
+    _plugin.onStop()
+
 def onHeartbeat():
     global _plugin
     _plugin.onHeartbeat()
 
+def onDeviceRemoved(Unit):
+    global _plugin
+    _plugin.onDeviceRemoved(Unit)
+
 
 
 
@@ -473,4 +2399,3 @@ if __name__ == '__main__':
     while (1):
         time.sleep(1)
         onHeartbeat()
-
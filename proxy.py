@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Local Modbus proxy for the inverter, so other programs (Home Assistant, scripts) do not talk to the Wifi dongle
+# themselves. GoodWe dongles handle several clients badly, with the proxy the plugin is the only one.
+#
+# The proxy listens for:
+# - UDP: the GoodWe protocol of port 8899, a Modbus RTU read request (addr, 0x03, offset, count, crc) answered with
+#   AA55 and the Modbus RTU response. AA55 read requests (control code 01) of the older families are passed through
+#   as they are, the other AA55 commands (settings, control) are not answered.
+# - TCP: Modbus TCP, function 0x03 (read holding registers).
+# Only reads are accepted, the inverter settings cannot be changed through the proxy.
+#
+# Every response of the inverter, to the polls of the plugin and to forwarded requests, is kept for maxAge seconds.
+# A read of registers within a kept response is answered from it. Other reads are forwarded to the inverter, one at
+# a time through the lock of the goodwe inverter, and a read which is already on its way is not sent again.
+#
+# The proxy runs on the event loop of the poller thread, see InverterPoller in plugin.py.
+
+import asyncio
+import time
+
+import goodwe.exceptions
+import goodwe.modbus
+import goodwe.protocol
+
+MODBUS_READ = 0x03
+# The Modbus exception codes by the message of goodwe.exceptions.RequestRejectedException.
+EXCEPTION_CODES = {message: code for code, message in goodwe.modbus.FAILURE_CODES.items()}
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+GATEWAY_PATH_UNAVAILABLE = 10
+GATEWAY_TARGET_FAILED = 11
+MAX_CACHED = 64 # responses
+AA55_HEADER = b"\xaa\x55\xc0\x7f"
+AA55_READ = 0x01 # control code of the AA55 reads and queries, 02 and 03 change settings or control the inverter
+
+class ProxyError(Exception):
+    def __init__(self, code):
+        self.code = code
+
+# The AA55 framed Modbus RTU response, as sent by the dongle.
+def modbusFrame(data):
+    checksum = goodwe.modbus._modbus_checksum(data)
+    return b"\xaa\x55" + data + bytes((checksum & 0xff, checksum >> 8))
+
+# True for a complete AA55 request with the read control code: header, control code, function, length, payload and
+# the plain sum of all of that.
+def isAa55Read(request):
+    return (len(request) >= 9 and request.startswith(AA55_HEADER) and request[4] == AA55_READ and len(request) == request[6] + 9
+            and sum(request[:-2]) == int.from_bytes(request[-2:], "big"))
+
+class ModbusProxy:
+
+    def __init__(self, connection, bind="127.0.0.1", udpPort=0, tcpPort=0, maxAge=10, log=print):
+        self.connection = connection # the InverterConnection of the inverter, for its current goodwe inverter instance
+        self.bind = bind
+        self.udpPort = udpPort
+        self.tcpPort = tcpPort
+        self.maxAge = maxAge
+        self.log = log
+        self.responses = {} # (comm addr, offset) -> (time.monotonic(), count, payload) of Modbus read responses
+        self.rawResponses = {} # request -> (time.monotonic(), response) of other requests
+        self.pending = {} # (comm addr, offset, count) or request -> asyncio.Future of a forwarded request
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refused = 0
+        self.udpTransport = None
+        self.tcpServer = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self.udpPort:
+            self.udpTransport, _ = await loop.create_datagram_endpoint(lambda: UdpProxyProtocol(self), local_addr=(self.bind, self.udpPort))
+        if self.tcpPort:
+            self.tcpServer = await asyncio.start_server(self.serveTcp, self.bind, self.tcpPort)
+        self.log(f"Modbus proxy listening on {self.bind}" + (f" UDP {self.udpPort}" if self.udpPort else "") + (f" TCP {self.tcpPort}" if self.tcpPort else ""))
+
+    def close(self):
+        if self.udpTransport:
+            self.udpTransport.close()
+        if self.tcpServer:
+            self.tcpServer.close()
+        self.log(f"Modbus proxy answered {self.hits} requests from the cache, forwarded {self.misses}, combined {self.coalesced} and refused {self.refused}.")
+
+    # Make every read of inverter pass its response to the proxy. Called after every (re)connect.
+    def attach(self, inverter):
+        read = inverter._read_from_socket
+        async def recordingRead(command):
+            response = await read(command)
+            self.record(command.request, response)
+            return response
+        inverter._read_from_socket = recordingRead
+
+    # Keep the response to a read, the responses to writes and control commands are not kept.
+    def record(self, request, response):
+        now = time.monotonic()
+        if len(request) == 8 and request[1] == MODBUS_READ and len(response) >= 7 and response[3] == MODBUS_READ:
+            if len(self.responses) >= MAX_CACHED:
+                self.expire(self.responses, now)
+            self.responses[(request[0], int.from_bytes(request[2:4], "big"))] = (now, int.from_bytes(request[4:6], "big"), bytes(response[5:-2]))
+        elif isAa55Read(request):
+            if len(self.rawResponses) >= MAX_CACHED:
+                self.expire(self.rawResponses, now)
+            self.rawResponses[bytes(request)] = (now, response)
+
+    def expire(self, cache, now):
+        for key in [key for key, entry in cache.items() if now - entry[0] > self.maxAge]:
+            del cache[key]
+        if len(cache) >= MAX_CACHED:
+            cache.clear()
+
+    # The payload of count registers from offset, from a kept response which holds them. None when there is none.
+    def lookup(self, addr, offset, count, now):
+        entry = self.responses.get((addr, offset))
+        if entry and entry[1] >= count and now - entry[0] <= self.maxAge:
+            return entry[2][:count * 2]
+        for (entryAddr, entryOffset), (received, entryCount, payload) in self.responses.items():
+            if entryAddr == addr and entryOffset <= offset and offset + count <= entryOffset + entryCount and now - received <= self.maxAge:
+                start = (offset - entryOffset) * 2
+                return payload[start:start + count * 2]
+        return None
+
+    # The payload of a Modbus read, from the cache or from the inverter. Raises ProxyError.
+    async def read(self, addr, offset, count):
+        payload = self.lookup(addr, offset, count, time.monotonic())
+        if payload != None:
+            self.hits += 1
+            return payload
+        key = (addr, offset, count)
+        await self.forward(key, goodwe.protocol.ModbusReadCommand(addr, offset, count))
+        payload = self.lookup(addr, offset, count, time.monotonic())
+        if payload == None:
+            raise ProxyError(GATEWAY_TARGET_FAILED)
+        return payload
+
+    # Send command to the inverter, or wait for the same request already on its way.
+    async def forward(self, key, command):
+        future = self.pending.get(key)
+        if future:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        inverter = self.connection.inverter
+        if inverter == None:
+            raise ProxyError(GATEWAY_PATH_UNAVAILABLE)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            # The reads of the plugin and of the proxy wait for each other on the lock of the goodwe inverter.
+            response = await inverter._read_from_socket(command)
+            self.record(command.request, response)
+            future.set_result(response)
+            return response
+        except goodwe.exceptions.RequestRejectedException as e:
+            error = ProxyError(EXCEPTION_CODES.get(e.message, ILLEGAL_DATA_ADDRESS))
+        except (goodwe.exceptions.RequestFailedException, OSError, asyncio.TimeoutError):
+            error = ProxyError(GATEWAY_TARGET_FAILED)
+        except Exception as e:
+            self.log(f"Modbus proxy request {command.request.hex()} failed: {e!r}")
+            error = ProxyError(GATEWAY_TARGET_FAILED)
+        except BaseException:
+            future.cancel() # cancelled, the requests waiting for it end too
+            raise
+        finally:
+            del self.pending[key]
+        future.set_exception(error)
+        future.exception() # retrieved, also when no other request waits for it
+        raise error
+
+    # The response to a UDP request, None to not answer.
+    async def answerUdp(self, request):
+        if len(request) == 8 and goodwe.modbus._modbus_checksum(request[:6]) == int.from_bytes(request[6:8], "little"):
+            addr, function = request[0], request[1]
+            if function != MODBUS_READ:
+                self.refused += 1
+                return modbusFrame(bytes((addr, function | 0x80, ILLEGAL_FUNCTION)))
+            count = int.from_bytes(request[4:6], "big")
+            try:
+                payload = await self.read(addr, int.from_bytes(request[2:4], "big"), count)
+            except ProxyError as e:
+                # Like the dongle, do not answer when the inverter does not.
+                return None if e.code in (GATEWAY_TARGET_FAILED, GATEWAY_PATH_UNAVAILABLE) else modbusFrame(bytes((addr, function | 0x80, e.code)))
+            return modbusFrame(bytes((addr, MODBUS_READ, len(payload))) + payload)
+        if not isAa55Read(request):
+            # Writes and control commands of the older families, and anything else, are not answered.
+            if request.startswith(AA55_HEADER):
+                self.refused += 1
+            return None
+        # An AA55 read of the older families, passed through as it is.
+        entry = self.rawResponses.get(request)
+        if entry and time.monotonic() - entry[0] <= self.maxAge:
+            self.hits += 1
+            return entry[1]
+        try:
+            return await self.forward(request, goodwe.protocol.ProtocolCommand(request, lambda response: goodwe.protocol.Aa55ProtocolCommand._validate_response(response, "")))
+        except ProxyError:
+            return None
+
+    # Modbus TCP: MBAP header (transaction, protocol, length, unit) and a read holding registers request.
+    async def serveTcp(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                length = int.from_bytes(header[4:6], "big")
+                pdu = await reader.readexactly(length - 1) if length > 1 else b""
+                function = pdu[0] if pdu else 0
+                if function != MODBUS_READ or len(pdu) != 5:
+                    self.refused += 1
+                    response = bytes((function | 0x80, ILLEGAL_FUNCTION))
+                else:
+                    inverter = self.connection.inverter
+                    try:
+                        if inverter == None:
+                            raise ProxyError(GATEWAY_PATH_UNAVAILABLE)
+                        payload = await self.read(inverter.comm_addr, int.from_bytes(pdu[1:3], "big"), int.from_bytes(pdu[3:5], "big"))
+                        response = bytes((MODBUS_READ, len(payload))) + payload
+                    except ProxyError as e:
+                        response = bytes((function | 0x80, e.code))
+                writer.write(header[:4] + (len(response) + 1).to_bytes(2, "big") + header[6:7] + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+class UdpProxyProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.ensure_future(self.answer(data, addr))
+
+    async def answer(self, data, addr):
+        try:
+            response = await self.proxy.answerUdp(data)
+        except Exception as e:
+            self.proxy.log(f"Modbus proxy cannot answer {data.hex()} from {addr[0]}: {e!r}")
+            return
+        if response and not self.transport.is_closing():
+            self.transport.sendto(response, addr)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# In-memory stand-in for the Domoticz plugin framework: the Domoticz module with Parameters, Devices and Settings.
+#
+# plugin.py imports it when it runs as __main__ (python plugin.py), the benchmarks import it before importing plugin.
+# Devices only live in memory. Every Update() call is counted, see updateCount and Device.updates.
+#
+# The Parameters can be set with environment variables for a quick run of python plugin.py against the simulator:
+#   GOODWE_ADDRESS (127.0.0.1), GOODWE_FAMILY (auto detect), GOODWE_INTERVAL (5), GOODWE_LOG (Debug), GOODWE_OPTIONS
+
+import os
+import sys
+import tempfile
+import time
+
+# The plugin uses "Domoticz.Log(...)" after "from Domoticz import *", so the module exports itself.
+Domoticz = sys.modules[__name__]
+
+Parameters = {}
+Devices = {}
+Settings = {}
+
+echo = True # print the log messages
+debugging = False
+heartbeat = None # seconds, as set by the plugin
+messages = [] # (level, message) of every log call, when keepMessages is set
+keepMessages = False
+updateCount = 0 # Device.Update() calls since configure()
+
+def configure(**parameters):
+    # Start over with no devices and the default Parameters, updated with parameters.
+    global updateCount
+    Devices.clear()
+    Settings.clear()
+    del messages[:]
+    updateCount = 0
+    Parameters.clear()
+    Parameters.update(
+        Address=os.environ.get("GOODWE_ADDRESS", "127.0.0.1"),
+        Port="8899",
+        Mode1="Yes",
+        Mode2=os.environ.get("GOODWE_INTERVAL", "5"),
+        Mode3=os.environ.get("GOODWE_FAMILY", ""),
+        Mode5=os.environ.get("GOODWE_LOG", "Debug"),
+        Mode6=os.environ.get("GOODWE_OPTIONS", ""),
+        HomeFolder=tempfile.gettempdir() + os.sep,
+        Name="GoodWe",
+        Key="GoodWeModbusUDP",
+    )
+    Parameters.update(parameters)
+
+def _log(level, message):
+    if keepMessages:
+        messages.append((level, message))
+    if echo:
+        print(f"{time.strftime('%H:%M:%S')} {level:<6} {message}")
+
+def Log(message):
+    _log("Log", message)
+
+def Status(message):
+    _log("Status", message)
+
+def Error(message):
+    _log("Error", message)
+
+def Debug(message):
+    if debugging:
+        _log("Debug", message)
+
+def Debugging(value):
+    global debugging
+    debugging = bool(value)
+
+def Heartbeat(value):
+    global heartbeat
+    heartbeat = value
+
+class Device:
+    def __init__(self, Name="", Unit=0, Type=0, Subtype=0, Switchtype=0, Options=None, Used=0, Image=0, Description="", TypeName="", DeviceID=""):
+        self.Name = Name
+        self.Unit = Unit
+        self.Type = Type
+        self.SubType = Subtype
+        self.SwitchType = Switchtype
+        self.Options = Options or {}
+        self.Used = Used
+        self.Image = Image
+        self.Description = Description
+        self.DeviceID = DeviceID
+        self.nValue = 0
+        self.sValue = ""
+        self.TimedOut = 0
+        self.LastUpdate = None
+        self.updates = 0
+
+    def Create(self):
+        Devices[self.Unit] = self
+        _log("Status", f"Device created: {self.Unit} - {self.Name}")
+
+    def Update(self, nValue=0, sValue="", TimedOut=0, **kwargs):
+        global updateCount
+        self.nValue = nValue
+        self.sValue = sValue
+        self.TimedOut = TimedOut
+        self.LastUpdate = time.time()
+        self.updates += 1
+        updateCount += 1
+
+    def Delete(self):
+        Devices.pop(self.Unit, None)
+
+    def __repr__(self):
+        return f"Device({self.Unit}, {self.Name!r}, sValue={self.sValue!r})"
+
+configure()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Micro-benchmark of the per-heartbeat device update loop.
+#
+# Compares the original nested INVERTER_PARAMS x inverter.sensors() scan with the compiled DeviceMapping loop
+# of BasePlugin.updateDevices(), using a fake inverter that has every sensor and a Domoticz device for every row.
+# Nothing talks to the network.
+#
+# Usage: python tester/bench_mapping.py [heartbeats]
+
+import os
+import sys
+import time
+from collections import namedtuple
+
+TESTER = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [TESTER, os.path.join(TESTER, "..")]
+
+# The in-memory Domoticz module of tester/Domoticz.py, silenced.
+import Domoticz
+Domoticz.echo = False
+
+import plugin
+from plugin import INVERTER_PARAMS, Column, DSwitchType, DGeneralSubType
+
+Sensor = namedtuple("Sensor", "id_ name unit")
+
+def FakeDevice(unit):
+    return Domoticz.Device(Unit=unit)
+
+class FakeInverter:
+    model_name = "GW10K-ET"
+
+    def __init__(self):
+        self._sensors = tuple(Sensor(row[Column.MODBUSNAME], row[Column.DISPLAYNAME], "") for row in INVERTER_PARAMS)
+
+    def sensors(self):
+        # goodwe builds a new tuple on every call for most families, do the same.
+        return tuple(self._sensors)
+
+def runtimeData(poll):
+    data = {"work_mode": 1}
+    for row in INVERTER_PARAMS:
+        if row[Column.SUBTYPE] == DGeneralSubType.Text:
+            data[row[Column.MODBUSNAME]] = "Normal"
+        elif row[Column.MODBUSNAME] != "work_mode":
+            data[row[Column.MODBUSNAME]] = 100.0 + (poll % 7) * 0.37 + row[Column.IDNUM]
+    return data
+
+# The update loop as it was before the mapping was compiled, kept here as the baseline.
+def legacyUpdateDevices(inverter, runtime_data, Devices):
+    updated = 0
+    device_count = 0
+    for unit in INVERTER_PARAMS:
+        if unit[Column.IDNUM] in Devices:
+            for sensor in inverter.sensors():
+                if sensor.id_==unit[Column.MODBUSNAME]:
+                    value = runtime_data[unit[Column.MODBUSNAME]]
+                    Domoticz.Debug(f"Processing '{sensor.id_}': Value {sensor.name} = {format(value)} {sensor.unit}.")
+                    if unit[Column.SWITCHTYPE]==DSwitchType.EnergyGenerated:
+                        value=value*1000.0
+                    if unit[Column.RST0WAIT]==True and value!=0 and runtime_data["work_mode"]==0:
+                        Domoticz.Debug(f"Wait mode is engaged, enforcing {sensor.name} from {format(value)} to 0 {sensor.unit}.")
+                        value=0
+                    if unit[Column.PREPEND_IDNUM]:
+                        prepend = Devices[unit[Column.PREPEND_IDNUM]].sValue
+                        sValue = unit[Column.FORMAT].format(prepend, value)
+                    else:
+                        sValue = unit[Column.FORMAT].format(value)
+                    Domoticz.Debug("Update value = {}".format(sValue))
+                    if sValue != Devices[unit[Column.IDNUM]].sValue:
+                        Devices[unit[Column.IDNUM]].Update(nValue=0, sValue=str(sValue), TimedOut=0)
+                        updated += 1
+                    device_count += 1
+    Domoticz.Log("Updated {} values out of {}".format(updated, device_count))
+
+def bench(label, update, heartbeats):
+    snapshots = [runtimeData(poll) for poll in range(heartbeats)]
+    started = time.process_time()
+    for runtime_data in snapshots:
+        update(runtime_data)
+    elapsed = time.process_time() - started
+    print(f"{label:<10} {elapsed / heartbeats * 1e6:10.1f} us CPU per heartbeat")
+    return elapsed
+
+def main():
+    heartbeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    inverter = FakeInverter()
+    print(f"{len(INVERTER_PARAMS)} INVERTER_PARAMS rows, {len(inverter.sensors())} sensors, {heartbeats} heartbeats")
+
+    legacyDevices = {row[Column.IDNUM]: FakeDevice(row[Column.IDNUM]) for row in INVERTER_PARAMS}
+    before = bench("before", lambda data: legacyUpdateDevices(inverter, data, legacyDevices), heartbeats)
+
+    basePlugin = plugin.BasePlugin()
+    plugin.Devices = {row[Column.IDNUM]: FakeDevice(row[Column.IDNUM]) for row in INVERTER_PARAMS}
+    plugin.Parameters = {"Mode5": "Normal"}
+    slot = plugin.InverterSlot(plugin.InverterConnection("localhost", "", 1, None), 0)
+    slot.inverter = inverter
+    basePlugin.compileDevices(slot)
+    def update(data):
+        basePlugin.updateDevices(slot, data)
+        basePlugin.flushUpdates(budget=False)
+    after = bench("after", update, heartbeats)
+
+    print(f"speedup    {before / after:10.1f} x")
+
+if __name__ == "__main__":
+    main()
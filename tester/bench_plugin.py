@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# End-to-end benchmark of BasePlugin against the inverter simulator, fully offline.
+#
+# Starts tester/inverter_simulator.py in a separate process (so its CPU time is not counted), runs the plugin with the
+# in-memory Domoticz module of tester/Domoticz.py and measures:
+# - startup: the time to import plugin.py and the time onStart() takes to return
+# - connect time: from onStart() until the first runtime data is available and until the first device update, with an
+#   empty and with a filled inverter cache
+# - heartbeat latency: p50, p99 and max wall time of onHeartbeat()
+# - poll latency: p50, p99 and max wall time of a poll of the inverter, including its retries
+# - CPU per poll: CPU time of this process (plugin and poller thread) divided by the number of successful polls
+# - Update() calls per minute of the Domoticz devices, and the updates deferred to a next heartbeat by the update budget
+# - the derived PV yield against the PV energy of the polls, it must not grow while the inverter is offline
+#
+# Usage: python tester/bench_plugin.py [--family XS] [--duration 60] [--interval 1] [--latency MS] [--loss PERCENT] [--options "..."] [--log-filter Extra]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTER = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [TESTER, os.path.join(TESTER, "..")]
+
+import Domoticz
+importStarted = time.perf_counter()
+import plugin
+importSeconds = time.perf_counter() - importStarted
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+def startSimulator(args):
+    command = [sys.executable, os.path.join(TESTER, "inverter_simulator.py"), f"{args.host}:{args.simulate}",
+               "--latency", str(args.latency), "--jitter", str(args.jitter), "--loss", str(args.loss), "--seed", "1"]
+    if args.schedule:
+        command += ["--schedule", args.schedule]
+    simulator = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    for line in simulator.stdout:
+        if line.strip() == "ready":
+            return simulator
+    simulator.wait()
+    sys.exit(f"The simulator did not start, is UDP port {args.host}:8899 in use?")
+
+def newPlugin(args, homeFolder):
+    Domoticz.configure(Address=args.host, Mode2=str(args.interval), Mode3=args.family, Mode5=args.log_filter, Mode6=args.options, HomeFolder=homeFolder)
+    plugin.Parameters = Domoticz.Parameters
+    plugin.Devices = Domoticz.Devices
+    return plugin.BasePlugin()
+
+# Seconds from the start of onStart() until it returns, until the poller has published the first runtime data and
+# until the first device update. The heartbeat is called every few milliseconds for the latter.
+def measureConnect(args, homeFolder):
+    basePlugin = newPlugin(args, homeFolder)
+    started = time.perf_counter()
+    basePlugin.onStart()
+    onStart = time.perf_counter() - started
+    slot = basePlugin.slots[0]
+    firstData = float("nan")
+    while slot.lastSnapshotSequence == 0 and time.perf_counter() - started < args.timeout:
+        if slot.connection.snapshot and firstData != firstData:
+            firstData = time.perf_counter() - started
+            basePlugin.onHeartbeat()
+        else:
+            time.sleep(0.002)
+    firstUpdate = time.perf_counter() - started if slot.lastSnapshotSequence else float("nan")
+    basePlugin.onStop()
+    return onStart, firstData, firstUpdate, slot.connection.familySource
+
+def measureRun(args, homeFolder):
+    basePlugin = newPlugin(args, homeFolder)
+    basePlugin.onStart()
+    connection = basePlugin.slots[0].connection
+    started = time.perf_counter()
+    while connection.snapshot == None and time.perf_counter() - started < args.timeout:
+        time.sleep(0.01)
+    basePlugin.onHeartbeat() # creates the devices, not part of the measurement
+
+    # Time every poll on the poller thread.
+    polls = []
+    poll = connection.poll
+    async def timedPoll():
+        started = time.perf_counter()
+        await poll()
+        polls.append(time.perf_counter() - started)
+    connection.poll = timedPoll
+    heartbeats = []
+    firstSequence = connection.snapshot[0] if connection.snapshot else 0
+    firstUpdates = Domoticz.updateCount
+    firstSuppressed = basePlugin.updatesSuppressed
+    firstDeferred = basePlugin.updatesDeferred
+    # The PV energy of the polls themselves, not across a lost connection, to check the derived yield against.
+    slot = basePlugin.slots[0]
+    derivedStart = basePlugin.derived.pvDayWh if basePlugin.derived else 0.0
+    polledWh = 0.0
+    lastSequence = slot.lastSnapshotSequence
+    lastSample = None # (Unix time, W) of the last applied poll
+    if slot.runtimeData and basePlugin.derived and basePlugin.derived.time != None:
+        lastSample = (basePlugin.derived.time, basePlugin.derived.pv)
+    firstOverruns = basePlugin.updateOverruns
+    cpuStarted = time.process_time()
+    started = time.perf_counter()
+    nextHeartbeat = started
+    while True:
+        nextHeartbeat += args.interval
+        remaining = nextHeartbeat - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        if time.perf_counter() - started > args.duration:
+            break
+        beat = time.perf_counter()
+        basePlugin.onHeartbeat()
+        heartbeats.append(time.perf_counter() - beat)
+        if connection.inverter == None:
+            lastSample = None
+        elif slot.lastSnapshotSequence != lastSequence and slot.runtimeData:
+            lastSequence = slot.lastSnapshotSequence
+            power = slot.runtimeData.get("ppv", 0) if slot.runtimeData.get("work_mode") != 0 else 0
+            if lastSample:
+                polledWh += (lastSample[1] + power) / 2 * (time.time() - lastSample[0]) / 3600.0
+            lastSample = (time.time(), power)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpuStarted
+    pollCount = (connection.snapshot[0] if connection.snapshot else 0) - firstSequence
+    updates = Domoticz.updateCount - firstUpdates
+    rtt = connection.rtt.describe() if connection.rtt else "fixed timeout and retries"
+    derivedWh = basePlugin.derived.pvDayWh - derivedStart if basePlugin.derived else float("nan")
+    basePlugin.onStop()
+    return {
+        "devices": len(Domoticz.Devices),
+        "heartbeats": len(heartbeats),
+        "p50": percentile(heartbeats, 0.50),
+        "p99": percentile(heartbeats, 0.99),
+        "max": max(heartbeats) if heartbeats else float("nan"),
+        "polls": pollCount,
+        "pollP50": percentile(polls, 0.50),
+        "pollP99": percentile(polls, 0.99),
+        "pollMax": max(polls) if polls else float("nan"),
+        "failedPolls": len(polls) - pollCount,
+        "rtt": rtt,
+        "cpuPerPoll": cpu / pollCount if pollCount else float("nan"),
+        "updatesPerMinute": updates / elapsed * 60.0,
+        "suppressedPerMinute": (basePlugin.updatesSuppressed - firstSuppressed) / elapsed * 60.0,
+        "deferredPerMinute": (basePlugin.updatesDeferred - firstDeferred) / elapsed * 60.0,
+        "updateOverruns": basePlugin.updateOverruns - firstOverruns,
+        "derivedWh": derivedWh,
+        "polledWh": polledWh,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plugin against the inverter simulator.")
+    parser.add_argument("--family", default="", help="inverter family to configure, empty for auto detection")
+    parser.add_argument("--simulate", default="XS", help="family of the simulated inverter: XS, DT or ET")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of heartbeats to measure")
+    parser.add_argument("--interval", type=int, default=1, help="poll and heartbeat interval in seconds")
+    parser.add_argument("--latency", type=float, default=0, help="simulator latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0, help="simulator latency jitter in milliseconds")
+    parser.add_argument("--loss", type=float, default=0, help="simulator packet loss percentage")
+    parser.add_argument("--schedule", default="", help="simulator schedule, e.g. online:600,offline:60")
+    parser.add_argument("--options", default="", help="the Options parameter of the plugin")
+    parser.add_argument("--log-filter", default="Normal", help="the Log filter parameter of the plugin: Normal, Extra or Debug")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the first data")
+    args = parser.parse_args()
+
+    Domoticz.echo = False
+    simulator = startSimulator(args)
+    try:
+        with tempfile.TemporaryDirectory() as homeFolder:
+            print(f"Simulated {args.simulate} at {args.host}, latency {args.latency} ms, loss {args.loss}%, family {args.family or 'auto'}, options {args.options!r}")
+            print(f"import plugin            {importSeconds * 1000:10.1f} ms")
+            for label in ("cold", "warm"): # with an empty and with a filled inverter cache
+                onStart, firstData, firstUpdate, source = measureConnect(args, homeFolder)
+                print(f"{'onStart (' + label + ')':<24} {onStart * 1000:10.1f} ms")
+                print(f"{'first data (' + label + ')':<24} {firstData * 1000:10.1f} ms  (family: {source})")
+                print(f"{'first update (' + label + ')':<24} {firstUpdate * 1000:10.1f} ms")
+            result = measureRun(args, homeFolder)
+    finally:
+        simulator.terminate()
+        simulator.wait()
+
+    print(f"devices                  {result['devices']:10d}")
+    print(f"heartbeats               {result['heartbeats']:10d}")
+    print(f"heartbeat p50            {result['p50'] * 1e6:10.1f} us")
+    print(f"heartbeat p99            {result['p99'] * 1e6:10.1f} us")
+    print(f"heartbeat max            {result['max'] * 1e6:10.1f} us")
+    print(f"polls                    {result['polls']:10d}")
+    print(f"failed polls             {result['failedPolls']:10d}")
+    print(f"poll p50                 {result['pollP50'] * 1e3:10.1f} ms")
+    print(f"poll p99                 {result['pollP99'] * 1e3:10.1f} ms")
+    print(f"poll max                 {result['pollMax'] * 1e3:10.1f} ms")
+    print(f"requests                 {result['rtt']}")
+    print(f"CPU per poll             {result['cpuPerPoll'] * 1e3:10.2f} ms")
+    print(f"Update() per minute      {result['updatesPerMinute']:10.1f}")
+    print(f"suppressed per minute    {result['suppressedPerMinute']:10.1f}")
+    print(f"deferred per minute      {result['deferredPerMinute']:10.1f}")
+    print(f"update overruns          {result['updateOverruns']:10d}")
+    # With a --schedule that takes the inverter offline, the derived yield must not grow while it is gone.
+    ratio = result["derivedWh"] / result["polledWh"] * 100.0 if result["polledWh"] else float("nan")
+    print(f"derived PV yield         {result['derivedWh']:10.2f} Wh  ({ratio:.0f}% of the polled PV energy{', TOO HIGH' if ratio > 105 else ''})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Stand-in listener for the export option of the plugin (see export.py), instead of InfluxDB or Telegraf.
+#
+# Listens on a Unix stream socket, a Unix datagram socket or an HTTP port, checks every received line of line
+# protocol and prints the lines (--quiet for a count per batch only). --delay makes it a slow sink, --status makes the
+# HTTP listener reject the batches, to see the backpressure of the exporter at work.
+#
+# Usage: python tester/export_listener.py unix:///tmp/goodwe.sock [--delay 2] [--quiet]
+#        python tester/export_listener.py http://127.0.0.1:8186/write [--status 503]
+
+import argparse
+import http.server
+import os
+import re
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+# measurement[,tag=value...] field=value[,field=value...] timestamp, with escaped spaces, commas and equal signs.
+LINE = re.compile(r'^(?:[^ ,\\]|\\.)+(?:,(?:[^ ,=\\]|\\.)+=(?:[^ ,\\]|\\.)+)* (?:[^ ,=\\]|\\.)+=(?:"(?:[^"\\]|\\.)*"|[^ ,"]+)(?:,(?:[^ ,=\\]|\\.)+=(?:"(?:[^"\\]|\\.)*"|[^ ,"]+))* \d+$')
+
+class Listener:
+    # Counts and checks the received lines, shared by all listener kinds.
+
+    def __init__(self, delay=0, quiet=False):
+        self.delay = delay
+        self.quiet = quiet
+        self.lines = 0
+        self.batches = 0
+        self.invalid = 0
+        self.lock = threading.Lock()
+
+    def receive(self, data):
+        lines = [line for line in data.decode("utf-8").split("\n") if line]
+        with self.lock:
+            self.batches += 1
+            self.lines += len(lines)
+            for line in lines:
+                if not LINE.match(line):
+                    self.invalid += 1
+                    print(f"INVALID: {line}", flush=True)
+                elif not self.quiet:
+                    print(line, flush=True)
+            if self.quiet:
+                print(f"{time.strftime('%H:%M:%S')} batch of {len(lines)} lines, {self.lines} lines, {self.invalid} invalid", flush=True)
+        if self.delay:
+            time.sleep(self.delay)
+
+def serveUnix(listener, path, datagram):
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM if datagram else socket.SOCK_STREAM)
+    server.bind(path)
+    print("ready", flush=True)
+    if datagram:
+        while True:
+            listener.receive(server.recv(65536))
+    server.listen()
+    while True:
+        connection, _ = server.accept()
+        threading.Thread(target=readStream, args=(listener, connection), daemon=True).start()
+
+def readStream(listener, connection):
+    pending = b""
+    with connection:
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                return
+            pending += data
+            end = pending.rfind(b"\n") + 1
+            if end:
+                listener.receive(pending[:end])
+                pending = pending[end:]
+
+def serveHttp(listener, url, status):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if status < 300:
+                listener.receive(data)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    socketserver.TCPServer.allow_reuse_address = True
+    server = http.server.ThreadingHTTPServer((url.hostname, url.port or 80), Handler)
+    print("ready", flush=True)
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in listener for the line protocol export of the plugin.")
+    parser.add_argument("target", help="unix:///path, unixgram:///path or http://host:port/path")
+    parser.add_argument("--delay", type=float, default=0, help="seconds to wait after every batch, a slow sink")
+    parser.add_argument("--status", type=int, default=204, help="HTTP status to answer")
+    parser.add_argument("--quiet", action="store_true", help="print a count per batch instead of the lines")
+    args = parser.parse_args()
+
+    listener = Listener(args.delay, args.quiet)
+    url = urllib.parse.urlsplit(args.target)
+    try:
+        if url.scheme in ("unix", "unixgram"):
+            serveUnix(listener, url.netloc + url.path, url.scheme == "unixgram")
+        elif url.scheme == "http":
+            serveHttp(listener, url, args.status)
+        else:
+            sys.exit(f"Unknown target {args.target}, use unix:, unixgram: or http:")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{listener.lines} lines in {listener.batches} batches, {listener.invalid} invalid", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Simulates GoodWe inverters on UDP port 8899, so the plugin can be run and measured without an inverter.
+#
+# Answers the modbus read requests of the goodwe library for the XS, DT and ET families and the AA55 probe of the
+# auto detection. The register maps are taken from the sensor definitions of the installed goodwe library, so every
+# sensor the library knows gets a plausible value: a PV power curve, grid values, and energy counters that follow
+# the power.
+# Every simulated inverter can have a latency, a packet loss and a schedule of online, wait mode and offline phases.
+#
+# goodwe always talks to port 8899, so more than one inverter needs more than one address. On Linux all of 127.0.0.0/8
+# is the loopback interface, use e.g. 127.0.0.1 and 127.0.0.2.
+#
+# Usage: python tester/inverter_simulator.py [--latency MS] [--loss PERCENT] [--schedule online:600,wait:60,offline:300]
+#                                            [--work-mode 0|1] [host:FAMILY ...]
+#   e.g. python tester/inverter_simulator.py 127.0.0.1:XS 127.0.0.2:ET --latency 40 --loss 2
+
+import argparse
+import asyncio
+import datetime
+import math
+import random
+import struct
+import sys
+import threading
+import time
+
+import goodwe
+from goodwe.modbus import _modbus_checksum
+
+PORT = 8899
+
+# Per simulated family: the goodwe class, communication address, model name, serial number (its tag tells goodwe the
+# inverter type and phase count), device info request and the runtime data blocks as (register, count, sensors attribute).
+FAMILIES = {
+    "XS": (goodwe.DT, 0x7f, "GW1000-XS", "1000XSN000DSN001", 0x7531, 0x28, ((0x7594, 0x49, "_sensors"),)),
+    "DT": (goodwe.DT, 0x7f, "GW10K-DT",  "10000DTU000W0001", 0x7531, 0x28, ((0x7594, 0x49, "_sensors"),)),
+    "ET": (goodwe.ET, 0xf7, "GW10K-ET",  "10000ETU000W0001", 0x88b8, 0x21, ((0x891c, 0x7d, "_sensors"),
+                                                                            (0x8ca0, 0x2d, "_sensors_meter"),
+                                                                            (0x9088, 0x18, "_sensors_battery"))),
+}
+RATED_POWER = {"XS": 1000, "DT": 10000, "ET": 10000}
+
+# Scale of the raw register value per goodwe sensor class, the classes not listed are not scaled.
+SCALES = {"Voltage": 10, "Current": 10, "Frequency": 100, "Energy": 10, "Energy4": 10, "Temp": 10}
+# Sensor classes without registers of their own: calculated, or labels of a code which is encoded already.
+SKIPPED = ("Calculated", "Enum", "Enum2", "EcoMode")
+
+# Parse "online:600,wait:60,offline:300" into ((state, seconds), ...).
+def parseSchedule(text):
+    schedule = []
+    for item in (text or "").split(","):
+        if item:
+            state, _, seconds = item.partition(":")
+            if state not in ("online", "wait", "offline"):
+                raise ValueError(f"Unknown state in schedule: {state}")
+            schedule.append((state, float(seconds or 0)))
+    return tuple(schedule)
+
+class SimulatedInverter:
+
+    def __init__(self, family="XS", host="127.0.0.1", latency=0.0, jitter=0.0, loss=0.0, schedule=(), workMode=1, peak=None, noise=0.02, seed=None):
+        self.family = family.upper()
+        cls, self.commAddr, self.modelName, self.serialNumber, self.infoRegister, self.infoCount, blocks = FAMILIES[self.family]
+        self.host = host
+        self.latency = latency # seconds before a response is sent
+        self.jitter = jitter # random extra latency, up to this many seconds
+        self.loss = loss # part of the requests that are never answered, 0..1
+        self.schedule = schedule # ((state, seconds), ...) repeated, empty for always online
+        self.workMode = workMode # work_mode while online, 0 is wait mode, 1 is normal
+        self.peak = peak if peak else RATED_POWER[self.family]
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.started = time.monotonic()
+
+        inverter = cls(host)
+        self.blocks = tuple((register, count, getattr(inverter, attribute)) for register, count, attribute in blocks)
+
+        self.eTotal = 1234.5 # kWh
+        self.eDay = 0.0
+        self.lastUpdate = None
+        self.ppv = 0.0
+        self.currentWorkMode = workMode
+        self.requests = 0
+        self.dropped = 0
+
+    # The state of the schedule at monotonic time now: "online", "wait" or "offline".
+    def state(self, now=None):
+        if not self.schedule:
+            return "online"
+        elapsed = ((time.monotonic() if now==None else now) - self.started) % sum(seconds for state, seconds in self.schedule)
+        for state, seconds in self.schedule:
+            if elapsed < seconds:
+                return state
+            elapsed -= seconds
+        return self.schedule[-1][0]
+
+    def update(self, now):
+        workMode = self.workMode if self.state(now)=="online" else 0
+        if workMode:
+            # A slow swing between 20% and 90% of the peak power, plus noise.
+            swing = 0.55 + 0.35 * math.sin(2 * math.pi * (now - self.started) / 600.0)
+            self.ppv = max(0.0, self.peak * swing * (1.0 + self.random.gauss(0, self.noise)))
+        else:
+            self.ppv = 0.0
+        if self.lastUpdate != None:
+            produced = self.ppv * (now - self.lastUpdate) / 3600000.0
+            self.eTotal += produced
+            self.eDay += produced
+        self.lastUpdate = now
+        self.currentWorkMode = workMode
+
+    # The value of a goodwe sensor in the current state, by its name.
+    def value(self, sensor):
+        name = sensor.id_
+        kind = type(sensor).__name__
+        pac = self.ppv * 0.97
+        phases = 1 if self.family=="XS" else 3
+        wobble = lambda value, spread: value + self.random.uniform(-spread, spread)
+        if kind=="Timestamp":
+            return datetime.datetime.now().replace(microsecond=0)
+        if name=="work_mode":
+            return self.currentWorkMode
+        if kind=="Voltage":
+            if "pv" in name:
+                return wobble(360.0, 2.0) if self.ppv else 0.0
+            if "battery" in name:
+                return wobble(52.0, 0.2)
+            if "bus" in name:
+                return wobble(380.0, 1.0)
+            if "line" in name:
+                return wobble(400.0, 1.0)
+            return wobble(230.0, 1.0)
+        if kind=="Current":
+            if "pv" in name:
+                return self.ppv / 2 / 360.0
+            return pac / phases / 230.0
+        if kind=="Frequency":
+            return wobble(50.0, 0.02)
+        if kind=="Temp":
+            return 30.0 + 15.0 * self.ppv / self.peak
+        if kind in ("Energy", "Energy4", "Float"):
+            return self.eDay if "day" in name else self.eTotal
+        if kind=="Decimal":
+            return 0.99
+        if kind in ("Power", "Power4", "Long", "Integer") and ("power" in name or name.startswith(("ppv", "pgrid"))):
+            if name.startswith("ppv"):
+                return round(self.ppv / 2)
+            if "reactive" in name or "apparent" in name or "battery" in name:
+                return 0
+            # Values of one phase end with the phase number.
+            return round(pac / phases) if name[-1].isdigit() else round(pac)
+        if name=="rssi":
+            return 80
+        if name in ("grid_mode", "meter_comm_status"):
+            return 1
+        if name=="h_total":
+            return round(self.eTotal)
+        return 0
+
+    # The payload of the registers [register, register + count), or None when this inverter does not have them.
+    def registers(self, register, count, now):
+        if register >= self.infoRegister and register + count <= self.infoRegister + self.infoCount:
+            payload = bytearray(self.infoCount * 2)
+            payload[2:4] = (self.peak // 10).to_bytes(2, "big")
+            payload[6:22] = self.serialNumber.encode("ascii")
+            payload[22:32] = self.modelName.ljust(10).encode("ascii")
+            start = (register - self.infoRegister) * 2
+            return bytes(payload[start:start + count * 2])
+        for blockRegister, blockCount, sensors in self.blocks:
+            if register >= blockRegister and register + count <= blockRegister + blockCount:
+                self.update(now)
+                payload = bytearray(blockCount * 2)
+                for sensor in sensors:
+                    if type(sensor).__name__ not in SKIPPED:
+                        payload[sensor.offset:sensor.offset + sensor.size_] = self.encode(sensor, self.value(sensor))
+                start = (register - blockRegister) * 2
+                return bytes(payload[start:start + count * 2])
+        return None
+
+    @staticmethod
+    def encode(sensor, value):
+        kind = type(sensor).__name__
+        if kind=="Timestamp":
+            return bytes((value.year - 2000, value.month, value.day, value.hour, value.minute, value.second))
+        if kind=="Float":
+            return struct.pack(">f", value * sensor.scale)
+        scale = sensor.scale if kind=="Decimal" else SCALES.get(kind, 1)
+        mask = (1 << (8 * sensor.size_)) - 1
+        return (int(round(value * scale)) & mask).to_bytes(sensor.size_, "big")
+
+    # The response to a request, or None to not answer.
+    def respond(self, request, now=None):
+        now = time.monotonic() if now==None else now
+        self.requests += 1
+        if self.state(now)=="offline" or self.random.random() < self.loss:
+            self.dropped += 1
+            return None
+        if request.startswith(b"\xaa\x55\xc0\x7f\x01\x02\x00"):
+            return self.probeResponse()
+        if len(request) != 8 or request[0] != self.commAddr:
+            self.dropped += 1
+            return None
+        if _modbus_checksum(request[:6]) != int.from_bytes(request[6:8], "little"):
+            self.dropped += 1
+            return None
+        if request[1] != 0x03:
+            return self.exceptionResponse(request[1], 1) # ILLEGAL FUNCTION
+        register = int.from_bytes(request[2:4], "big")
+        count = int.from_bytes(request[4:6], "big")
+        payload = self.registers(register, count, now)
+        if payload == None:
+            return self.exceptionResponse(request[1], 2) # ILLEGAL DATA ADDRESS
+        return self.frame(bytes((self.commAddr, 0x03, len(payload))) + payload)
+
+    @staticmethod
+    def frame(data):
+        checksum = _modbus_checksum(data)
+        return b"\xaa\x55" + data + bytes((checksum & 0xff, checksum >> 8))
+
+    def exceptionResponse(self, command, code):
+        return self.frame(bytes((self.commAddr, command | 0x80, code)))
+
+    # The answer to the AA55 probe of the goodwe auto detection, with the model name and serial number.
+    def probeResponse(self):
+        payload = bytearray(64)
+        payload[5:15] = self.modelName.ljust(10).encode("ascii")
+        payload[31:47] = self.serialNumber.encode("ascii")
+        data = b"\xaa\x55\x7f\xc0\x01\x82" + bytes((len(payload),)) + bytes(payload)
+        return data + (sum(data) & 0xffff).to_bytes(2, "big")
+
+class SimulatorProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, inverter):
+        self.inverter = inverter
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = self.inverter.respond(data)
+        if response == None:
+            return
+        delay = self.inverter.latency + self.inverter.random.uniform(0, self.inverter.jitter)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+async def serve(inverters):
+    loop = asyncio.get_running_loop()
+    transports = []
+    for inverter in inverters:
+        transport, _ = await loop.create_datagram_endpoint(lambda inverter=inverter: SimulatorProtocol(inverter), local_addr=(inverter.host, PORT))
+        transports.append(transport)
+    return transports
+
+class Simulator:
+    # Runs simulated inverters on an event loop of their own thread, for use within another program.
+
+    def __init__(self, inverters):
+        self.inverters = inverters
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="InverterSimulator", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            transports = self._loop.run_until_complete(serve(self.inverters))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for transport in transports:
+                transport.close()
+            self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate GoodWe inverters on UDP port 8899.")
+    parser.add_argument("inverters", nargs="*", default=["127.0.0.1:XS"], help="host:FAMILY, FAMILY is one of " + ", ".join(FAMILIES))
+    parser.add_argument("--latency", type=float, default=0, help="milliseconds before an answer is sent")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra milliseconds of latency")
+    parser.add_argument("--loss", type=float, default=0, help="percentage of the requests that are not answered")
+    parser.add_argument("--schedule", default="", help="repeated phases, e.g. online:600,wait:60,offline:300")
+    parser.add_argument("--work-mode", type=int, default=1, choices=(0, 1), help="work_mode while online")
+    parser.add_argument("--peak", type=int, default=None, help="peak PV power in W")
+    parser.add_argument("--noise", type=float, default=0.02, help="relative noise on the PV power")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    inverters = []
+    for item in args.inverters:
+        host, _, family = item.partition(":")
+        inverters.append(SimulatedInverter(family or "XS", host, args.latency / 1000.0, args.jitter / 1000.0, args.loss / 100.0,
+                                           parseSchedule(args.schedule), args.work_mode, args.peak, args.noise, args.seed))
+
+    async def run():
+        await serve(inverters)
+        for inverter in inverters:
+            print(f"Simulating {inverter.modelName} ({inverter.family}) at {inverter.host}:{PORT}", flush=True)
+        print("ready", flush=True)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    for inverter in inverters:
+        print(f"{inverter.host}: {inverter.requests} requests, {inverter.dropped} not answered", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
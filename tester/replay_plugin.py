@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Replay of a capture file (see capture.py and the capture option) through BasePlugin, with no network.
+#
+# Runs the plugin with the parameters of the captured session and the in-memory Domoticz module of tester/Domoticz.py.
+# The poller thread is not started: every captured poll is replayed on this thread, InverterConnection.poll() with
+# the captured frames as the answers of the inverter, followed by a heartbeat. So the full path of a poll runs as it
+# did: the goodwe decoding, the mapping of the values and the device updates. The inverter cache of the captured
+# session is put in place first, so the inverters connect with the same family, or detect it, as they did. Per poll it
+# measures:
+# - CPU time of the poll (goodwe request, validation and decoding) and of the heartbeat (mapping and device updates)
+# - with --allocations: the peak of the memory allocated during the poll and heartbeat, by tracemalloc
+# --speed 1 replays at the captured pace, 0 (the default) as fast as possible. --save writes the results to a JSON
+# file, --compare checks against such a file and exits with 1 when the CPU or memory per poll grew by more than
+# --tolerance percent.
+#
+# Usage: python tester/replay_plugin.py CAPTURE [--session -1] [--speed 0] [--repeat 5] [--allocations]
+#                                               [--save results.json] [--compare results.json] [--tolerance 20]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+TESTER = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [TESTER, os.path.join(TESTER, "..")]
+
+import Domoticz
+import plugin
+import capture
+
+# Options of the captured session which would talk to other programs or write files, left out of the replay.
+SKIPPED_OPTIONS = ("capture", "export", "history", "stats_file", "proxy_udp", "proxy_tcp")
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+def replayOptions(options):
+    return ";".join(item for item in options.split(";") if item and item.partition("=")[0].strip() not in SKIPPED_OPTIONS)
+
+# Replay the polls of session once, returns the per poll measurements.
+def replaySession(session, args, homeFolder):
+    parameters = json.loads(session[0][3]) if session[0][1] == capture.START else {}
+    Domoticz.configure(Address=parameters.get("Address", "127.0.0.1"), Mode2=parameters.get("Mode2", "5"), Mode3=parameters.get("Mode3", ""),
+                       Mode5="Normal", Mode6=replayOptions(parameters.get("Mode6", "")), HomeFolder=homeFolder)
+    plugin.Parameters = Domoticz.Parameters
+    plugin.Devices = Domoticz.Devices
+    with open(os.path.join(homeFolder, "inverter_cache.json"), "w") as file:
+        json.dump(parameters.get("cache", {}), file)
+    replayer = capture.Replayer(session, args.speed)
+    replayer.install()
+    basePlugin = plugin.BasePlugin()
+    try:
+        basePlugin.onStart()
+        connections = {slot.host: slot.connection for slot in basePlugin.slots}
+        polls = sorted((timestamp, host) for host, times in replayer.polls.items() for timestamp in times if host in connections)
+        results = asyncio.run(replayPolls(basePlugin, connections, polls, args))
+    finally:
+        basePlugin.onStop()
+        replayer.close()
+    results["unanswered"] = replayer.unanswered
+    results["frames"] = replayer.received
+    return results
+
+async def replayPolls(basePlugin, connections, polls, args):
+    pollCpu, heartbeatCpu, peaks = [], [], []
+    firstUpdates = Domoticz.updateCount
+    if args.allocations:
+        tracemalloc.start()
+    started = time.monotonic()
+    for timestamp, host in polls:
+        if args.speed:
+            delay = (timestamp - polls[0][0]) / args.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        connection = connections[host]
+        connection.retryAt = None # the capture decides when the inverter answers again
+        if args.allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        cpu = time.process_time()
+        await connection.poll()
+        polled = time.process_time()
+        basePlugin.onHeartbeat()
+        heartbeatCpu.append(time.process_time() - polled)
+        pollCpu.append(polled - cpu)
+        if args.allocations:
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    if args.allocations:
+        tracemalloc.stop()
+    return {"pollCpu": pollCpu, "heartbeatCpu": heartbeatCpu, "peaks": peaks, "updates": Domoticz.updateCount - firstUpdates,
+            "published": sum(connection.snapshot[0] for connection in connections.values() if connection.snapshot)}
+
+def summary(runs):
+    total = [poll + heartbeat for run in runs for poll, heartbeat in zip(run["pollCpu"], run["heartbeatCpu"])]
+    peaks = [peak for run in runs for peak in run["peaks"]]
+    return {
+        "polls": len(total),
+        "published": sum(run["published"] for run in runs),
+        "updates": sum(run["updates"] for run in runs),
+        "frames": sum(run["frames"] for run in runs),
+        "unanswered": sum(run["unanswered"] for run in runs),
+        "pollCpuP50": percentile([cpu for run in runs for cpu in run["pollCpu"]], 0.50),
+        "heartbeatCpuP50": percentile([cpu for run in runs for cpu in run["heartbeatCpu"]], 0.50),
+        "cpuMean": sum(total) / len(total) if total else float("nan"),
+        "cpuP50": percentile(total, 0.50),
+        "cpuP99": percentile(total, 0.99),
+        "peakP50": percentile(peaks, 0.50) if peaks else None,
+        "peakMax": max(peaks) if peaks else None,
+        "allocations": bool(peaks), # tracemalloc slows down the CPU times
+    }
+
+# The measurements which grew by more than tolerance percent compared to baseline.
+def regressions(result, baseline, tolerance):
+    found = []
+    keys = ("cpuMean", "cpuP50", "peakP50") if result["allocations"] == baseline.get("allocations", False) else ("peakP50",)
+    for key in keys:
+        if result.get(key) != None and baseline.get(key):
+            growth = (result[key] / baseline[key] - 1.0) * 100.0
+            if growth > tolerance:
+                found.append(f"{key} {baseline[key]:.6g} -> {result[key]:.6g} (+{growth:.0f}%)")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a capture file through the plugin and measure the CPU time per poll.")
+    parser.add_argument("capture", help="capture file, written with the capture option")
+    parser.add_argument("--session", type=int, default=-1, help="session of the capture to replay, 1 for the first, -1 for the last")
+    parser.add_argument("--speed", type=float, default=0, help="1 for the captured pace, 10 for 10 times faster, 0 for as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1, help="number of times to replay the session")
+    parser.add_argument("--allocations", action="store_true", help="measure the peak memory allocated per poll")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier --save to compare with")
+    parser.add_argument("--tolerance", type=float, default=20, help="percent the CPU or memory per poll may grow with --compare")
+    args = parser.parse_args()
+
+    try:
+        sessions = capture.captureSessions(capture.readCapture(args.capture))
+    except (OSError, capture.CaptureError) as e:
+        sys.exit(str(e))
+    if not sessions:
+        sys.exit(f"{args.capture} holds no sessions")
+    session = sessions[args.session - 1 if args.session > 0 else args.session]
+
+    Domoticz.echo = False
+    plugin.importInverterLibraries()
+    plugin.InverterPoller.start = lambda poller: None # the polls are replayed on this thread
+    runs = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as homeFolder:
+            runs.append(replaySession(session, args, homeFolder))
+    result = summary(runs)
+
+    print(f"polls                    {result['polls']:10d}  ({result['published']} published, {result['frames']} frames, {result['unanswered']} requests not in the capture)")
+    print(f"Update() calls           {result['updates']:10d}")
+    print(f"poll CPU p50             {result['pollCpuP50'] * 1e3:10.3f} ms")
+    print(f"heartbeat CPU p50        {result['heartbeatCpuP50'] * 1e3:10.3f} ms")
+    print(f"CPU per poll mean        {result['cpuMean'] * 1e3:10.3f} ms")
+    print(f"CPU per poll p50         {result['cpuP50'] * 1e3:10.3f} ms")
+    print(f"CPU per poll p99         {result['cpuP99'] * 1e3:10.3f} ms")
+    if result["peakP50"] != None:
+        print(f"memory peak p50          {result['peakP50'] / 1024:10.1f} KB")
+        print(f"memory peak max          {result['peakMax'] / 1024:10.1f} KB")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(result, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            found = regressions(result, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"no regression against {args.compare}")
+
+if __name__ == "__main__":
+    main()